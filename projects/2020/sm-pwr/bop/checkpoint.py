@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Checkpoint/restart support for the BOP modules.
+
+   A checkpoint is a binary (pickle) file with the instance attributes of a
+   module at a time step boundary: configuration, phase histories, and the
+   private state its `run()` carries from step to step. Restarting from it
+   continues the run at the checkpoint time; several scenarios can branch from
+   the same checkpoint by changing attributes after `load_checkpoint()`.
+
+   A module adopting the interface derives from `Checkpoint`, lists the
+   attributes that must not be saved (e.g. objects holding callables) in
+   `checkpoint_exclude`, calls `save_checkpoint()` in its `run()` loop, and on
+   `restarted` skips the initialisation of its run state.
+"""
+
+import pickle
+
+class Checkpoint:
+    """Checkpoint/restart mixin of a Cortix module.
+
+    Attributes
+    ----------
+    checkpoint_exclude: tuple(str)
+        Names of the instance attributes not saved; the Cortix runtime
+        attributes by default.
+    restarted: bool
+        True after `load_checkpoint()` until the module resumes its run.
+    """
+
+    checkpoint_exclude = ('ports', 'log', 'id', 'state', 'use_mpi',
+                          'use_multiprocessing', '_Module__network')
+
+    restarted = False
+
+    def save_checkpoint(self, filename, time):
+        """Write the module state at `time` to `filename`.
+        """
+
+        attributes = {name: value for (name, value) in vars(self).items()
+                      if name not in self.checkpoint_exclude}
+
+        checkpoint = {'module': type(self).__name__, 'time': time,
+                      'attributes': attributes}
+
+        with open(filename, 'wb') as fout:
+            pickle.dump(checkpoint, fout, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load_checkpoint(self, filename):
+        """Restore the module state from `filename`; the next `run()` starts at
+           the checkpoint time.
+
+        Returns
+        -------
+        time: float
+            Checkpoint time.
+        """
+
+        with open(filename, 'rb') as fin:
+            checkpoint = pickle.load(fin)
+
+        assert checkpoint['module'] == type(self).__name__, \
+               'checkpoint of a %s module'%checkpoint['module']
+
+        vars(self).update(checkpoint['attributes'])
+
+        self.initial_time = checkpoint['time']
+        self.restarted = True
+
+        return checkpoint['time']
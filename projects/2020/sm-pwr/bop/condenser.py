@@ -4,23 +4,49 @@
 # https://cortix.org
 """Cortix module"""
 
+import bisect
 import logging
+import math
+
+import numpy as np
 
 import unit
 
 from iapws import IAPWS97 as steam_table
 
+from saturation import saturation_cache
+from integrator import Integrator
+
 from cortix import Module
-from cortix.support.phase_new import PhaseNew as Phase
+from history import PhaseHistory as Phase
+from history import reserve_histories
+from history import flush_histories
 from cortix import Quantity
 
 class Condenser(Module):
-    """Steam generator.
+    """Condenser.
+
+    The turbine exhaust condenses on a cooling water tube bundle (effectiveness
+    `1 - exp(-NTU)`, the shell side being at saturation) and drains to the hot
+    well. The shell pressure follows the vapor inventory (ideal gas) and the
+    cooling water returns from a cooling tower to the condenser in a closed loop.
+    State: shell pressure, hot well temperature, cooling water inflow
+    temperature (see `condenser_rhs()`).
+
+    With `steady_fast_path` on, a step is skipped (no solve and no phase rows)
+    while the inflow conditions have changed by less than a relative tolerance
+    and the state is within absolute tolerances (Pa, K, K) of the equilibrium
+    at these conditions; the last state is held and sent downstream, and the
+    phase histories are piecewise constant between their rows. The distance to
+    the equilibrium is the Newton step `J^-1 f` of `condenser_rhs()`: a state
+    that still drifts slowly (e.g. the cooling water loop) has a small rate of
+    change but not a small distance. Off by default: in the plant transient the
+    turbine exhaust changes at every step and no step is skipped.
 
     Notes
     -----
     These are the `port` names available in this module to connect to respective
-    modules: reactor, turbine.
+    modules: turbine, water heater.
     See instance attribute `port_names_expected`.
 
     """
@@ -53,18 +79,44 @@ class Condenser(Module):
         # Domain attributes
 
         # Configuration parameters
+        self.shell_volume = 300*unit.meter**3
+        self.hotwell_mass = 20e3*unit.kg
+        self.heat_transfer_coeff_area = 8*unit.mega*unit.watt/unit.K # UA
 
-        # Initialization
+        self.cooling_water_mass_flowrate = 3000*unit.kg/unit.second
+        self.cooling_water_mass = 2*unit.mega*unit.kg # cooling loop inventory
+        self.cooling_tower_conductance = 25*unit.mega*unit.watt/unit.K
+        self.ambient_temp = (15+273.15)*unit.K
+
+        self.ode_method = 'odeint'
 
+        # Skip steps at steady state: (on/off, inflow relative tolerance,
+        # state absolute tolerances to the equilibrium)
+        self.steady_fast_path = (False, 1e-6, (1.0*unit.pascal, 1e-3*unit.K, 1e-3*unit.K))
+        self.n_skipped_steps = 0
+
+        # Initialization
         self.inflow_temp = (20+273)*unit.K
         #self.inflow_pressure = 34*unit.bar
         self.inflow_pressure = 0.008066866*unit.mega*unit.pascal
         self.inflow_mass_flowrate = 67*unit.kg/unit.second
+        self.inflow_quality = 0.0
+
+        self.shell_pressure = 0.008066866*unit.mega*unit.pascal
+        self.cooling_water_temp = (20+273.15)*unit.K
+        self.heat_rejection_pwr = 0.0*unit.watt
 
         self.outflow_temp = 50 + 273.15
         self.outflow_pressure = 34.0*unit.bar
         self.outflow_mass_flowrate = self.inflow_mass_flowrate
 
+        self.integrator = None
+
+        self.__params = None
+        self.__inflow = None # inflow conditions of the last solved step
+        self.__settled = False # state at equilibrium after the last solved step
+        self.__write_time = self.initial_time # time of the last phase rows
+
         # Inflow phase history
         quantities = list()
 
@@ -117,12 +169,51 @@ class Condenser(Module):
         self.outflow_phase = Phase(time_stamp=self.initial_time,
                                    time_unit='s', quantities=quantities)
 
+        # Condenser phase history
+        quantities = list()
+
+        press = Quantity(name='pressure',
+                         formal_name='P_c', unit='Pa',
+                         value=self.shell_pressure,
+                         latex_name=r'$P_c$',
+                         info='Condenser Shell Pressure')
+
+        quantities.append(press)
+
+        temp = Quantity(name='cooling-water-temp',
+                        formal_name='T_cw', unit='K',
+                        value=self.cooling_water_temp,
+                        latex_name=r'$T_{cw}$',
+                        info='Condenser Cooling Water Inflow Temperature')
+
+        quantities.append(temp)
+
+        heat = Quantity(name='heat-rejection',
+                        formal_name='Q_c', unit='W',
+                        value=self.heat_rejection_pwr,
+                        latex_name=r'$\dot{Q}_c$',
+                        info='Condenser Heat Rejection Power')
+
+        quantities.append(heat)
+
+        self.state_phase = Phase(time_stamp=self.initial_time,
+                                 time_unit='s', quantities=quantities)
+
     def run(self, *args):
 
+        max_n_steps_per_time_step = 1500 # max number of nonlinear algebraic solver
+                                         # iterations per time step
+
+        self.integrator = Integrator(self.__f_vec, self.__jac, method=self.ode_method,
+                                     rtol=1e-7, atol=1e-8,
+                                     max_n_steps=max_n_steps_per_time_step)
+
         # Some logic for logging time stamps
         if self.initial_time + self.time_step > self.end_time:
             self.end_time = self.initial_time + self.time_step
 
+        reserve_histories(self)
+
         time = self.initial_time
 
         print_time = self.initial_time
@@ -147,7 +238,6 @@ class Condenser(Module):
 
             # Evolve one time step
             #---------------------
-
             time = self.__step(time)
 
             # Communicate information
@@ -156,8 +246,75 @@ class Condenser(Module):
 
         self.end_time = time # correct the final time if needed
 
-    def __call_ports(self, time):
+        # Close the held state in the phase histories
+        if self.__write_time < time:
+            self.__write_phases(time)
 
+        flush_histories(self) # on-disk stores, if streamed
+
+        if self.show_time[0]:
+            self.log.info(self.name+'::run(): skipped steps = %i'%self.n_skipped_steps)
+            self.log.info(self.name+'::run(): '+str(self.integrator))
+
+        self.integrator.close() # keep the counters only
+
+    def parameters(self, u_vec):
+        """Parameters of the condenser model `condenser_rhs()` at the state
+           `u_vec`.
+
+        The design data, the inflow conditions, and the saturation properties
+        linearized about the shell pressure of `u_vec`. The parameters are kept
+        over a time step.
+
+        Returns
+        -------
+        params: dict
+        """
+
+        press = u_vec[0]
+        temp_cw = u_vec[2]
+
+        params = dict()
+
+        # Design data
+        params['shell_volume'] = self.shell_volume
+        params['hotwell_mass'] = self.hotwell_mass
+        params['cooling_water_mass'] = self.cooling_water_mass
+        params['cooling_tower_conductance'] = self.cooling_tower_conductance
+        params['ambient_temp'] = self.ambient_temp
+
+        # Inflow conditions
+        params['inflow_temp'] = self.inflow_temp
+        params['inflow_mass_flowrate'] = self.inflow_mass_flowrate
+        params['inflow_quality'] = self.inflow_quality
+
+        # Cooling water
+        water = steam_table(T=temp_cw, P=0.1)
+        cp_cw = water.cp*unit.kj/unit.kg/unit.K
+
+        heat_capacity_rate = self.cooling_water_mass_flowrate*cp_cw
+        ntu = self.heat_transfer_coeff_area/heat_capacity_rate
+
+        params['cooling_water_cp'] = cp_cw
+        params['effective_conductance'] = (1 - math.exp(-ntu))*heat_capacity_rate
+
+        # Saturation at the shell pressure: T_sat(P) ~ T_0 + slope*P_0*ln(P/P_0)
+        # (Clausius-Clapeyron; the shell pressure stays positive)
+        sat_liq = saturation_cache.liquid(press/unit.mega/unit.pascal)
+        sat_vap = saturation_cache.vapor(press/unit.mega/unit.pascal)
+
+        h_vap = (sat_vap.h - sat_liq.h)*unit.kj/unit.kg
+
+        params['sat_press'] = sat_liq.P*unit.mega*unit.pascal
+        params['sat_temp'] = sat_liq.T
+        params['sat_temp_slope'] = sat_liq.T*(sat_vap.v - sat_liq.v)/h_vap # Clapeyron
+        params['h_vap'] = h_vap
+        params['liquid_cp'] = sat_liq.cp*unit.kj/unit.kg/unit.K
+        params['vapor_gas_constant'] = sat_vap.P*unit.mega*unit.pascal*sat_vap.v/sat_vap.T
+
+        return params
+
+    def __call_ports(self, time):
 
         # Interactions in the inflow port
         #----------------------------------------
@@ -174,6 +331,10 @@ class Condenser(Module):
             self.inflow_temp = inflow['temperature']
             self.inflow_pressure = inflow['pressure']
             self.inflow_mass_flowrate = inflow['mass_flowrate']
+            self.inflow_quality = inflow.get('quality', self.inflow_quality)
+
+            # adaptive time step set upstream
+            self.time_step = inflow.get('time_step', self.time_step)
 
         # Interactions in the outflow port
         #-----------------------------------------
@@ -185,25 +346,78 @@ class Condenser(Module):
             msg_time = self.recv('outflow')
             assert msg_time <= time
 
-            temp = self.outflow_phase.get_value('temp', msg_time)
-            pressure = self.outflow_phase.get_value('pressure', msg_time)
-
             outflow = dict()
-            outflow['temperature'] = temp
-            outflow['pressure'] = pressure
-            self.outflow_mass_flowrate = self.inflow_mass_flowrate
-            outflow['mass_flowrate'] = self.outflow_mass_flowrate
+
+            # Held state since the last phase rows
+            if msg_time >= self.__write_time:
+                outflow['temperature'] = self.outflow_temp
+                outflow['pressure'] = self.outflow_pressure
+                outflow['mass_flowrate'] = self.outflow_mass_flowrate
+            else:
+                # Row in effect at msg_time; the reply keeps the requested time
+                time_stamps = self.outflow_phase.time_stamps
+                row_time = time_stamps[bisect.bisect_right(time_stamps, msg_time+1e-6) - 1]
+                outflow['temperature'] = self.outflow_phase.get_value('temp', row_time)
+                outflow['pressure'] = self.outflow_phase.get_value('pressure', row_time)
+                outflow['mass_flowrate'] = self.outflow_phase.get_value('flowrate', row_time)
+
+            outflow['time_step'] = self.time_step
+
             self.send((msg_time, outflow), 'outflow')
 
     def __step(self, time=0.0):
 
+        inflow = np.array([self.inflow_temp, self.inflow_mass_flowrate,
+                           self.inflow_quality])
+
+        # Steady state fast path
+        if self.steady_fast_path[0] and self.__settled and \
+           np.allclose(inflow, self.__inflow, rtol=self.steady_fast_path[1], atol=0.0):
 
-        # Update state variables
-        condenser_outflow = self.outflow_phase.get_row(time)
-        condenser_inflow = self.inflow_phase.get_row(time)
+            self.n_skipped_steps += 1
+
+            return time + self.time_step
+
+        # Get state values
+        u_0 = np.array([self.shell_pressure, self.outflow_temp, self.cooling_water_temp])
+
+        # Model parameters (saturation properties) kept over the time step
+        self.__params = self.parameters(u_0)
+
+        self.integrator.reset(time, u_0)
+
+        u_vec = self.integrator.advance(time + self.time_step)
+
+        (f_vec, diagnostics) = condenser_rhs(u_vec, self.__params)
+
+        if self.steady_fast_path[0]:
+            # Distance to the equilibrium at the inflow conditions of the step
+            distance = np.linalg.solve(condenser_jac(u_vec, self.__params), f_vec)
+            self.__settled = np.all(np.abs(distance) <= self.steady_fast_path[2])
+        self.__inflow = inflow
+
+        self.shell_pressure = u_vec[0]
+        self.outflow_temp = u_vec[1]
+        self.cooling_water_temp = u_vec[2]
+
+        self.outflow_mass_flowrate = diagnostics['outflow_mass_flowrate']
+        self.heat_rejection_pwr = diagnostics['heat_rejection_pwr']
 
         time += self.time_step
 
+        self.__write_phases(time)
+
+        return time
+
+    def __write_phases(self, time):
+        """Add phase rows at `time` with the current state.
+        """
+
+        # Last rows (the state may have been held since)
+        condenser_outflow = self.outflow_phase.get_row()
+        condenser_inflow = self.inflow_phase.get_row()
+        condenser = self.state_phase.get_row()
+
         self.inflow_phase.add_row(time, condenser_inflow)
         self.inflow_phase.set_value('temp', self.inflow_temp, time)
         self.inflow_phase.set_value('flowrate', self.inflow_mass_flowrate , time)
@@ -213,4 +427,121 @@ class Condenser(Module):
         self.outflow_phase.set_value('flowrate', self.outflow_mass_flowrate , time)
         self.outflow_phase.set_value('pressure', self.outflow_pressure, time)
 
-        return time
+        self.state_phase.add_row(time, condenser)
+        self.state_phase.set_value('pressure', self.shell_pressure, time)
+        self.state_phase.set_value('cooling-water-temp', self.cooling_water_temp, time)
+        self.state_phase.set_value('heat-rejection', self.heat_rejection_pwr, time)
+
+        self.__write_time = time
+
+    def __f_vec(self, u_vec, time):
+
+        (f_vec, _) = condenser_rhs(u_vec, self.__params)
+
+        return f_vec
+
+    def __jac(self, u_vec, time):
+
+        return condenser_jac(u_vec, self.__params)
+
+def condenser_rhs(u_vec, params):
+    """Condenser model: time derivatives of the shell pressure, the hot well
+       temperature and the cooling water inflow temperature.
+
+    The heat rejected to the cooling water is `eps*C*(T_sat(P) - T_cw)` with
+    the effectiveness of a condensing exchanger, `eps = 1 - exp(-UA/C)`. The
+    vapor of the inflow that does not condense pressurizes the shell, the
+    condensate and the inflow liquid mix in the hot well (level controlled),
+    and the cooling tower rejects the heat to the ambient.
+
+    Returns
+    -------
+    (f_vec, diagnostics): tuple
+        Time derivatives [Pa/s, K/s, K/s], and a dict with the heat rejection
+        power (`heat_rejection_pwr`), the condensation rate
+        (`condensation_rate`) and the outflow mass flowrate
+        (`outflow_mass_flowrate`) at `u_vec`.
+    """
+
+    press = u_vec[0]    # shell pressure
+    temp_hw = u_vec[1]  # hot well temperature
+    temp_cw = u_vec[2]  # cooling water inflow temperature
+
+    temp_sat = params['sat_temp'] + params['sat_temp_slope']*params['sat_press'] * \
+               math.log(press/params['sat_press'])
+
+    heat_rejection_pwr = params['effective_conductance']*(temp_sat - temp_cw)
+    condensation_rate = heat_rejection_pwr/params['h_vap']
+
+    mass_flowrate = params['inflow_mass_flowrate']
+    quality = params['inflow_quality']
+    liquid_flowrate = (1 - quality)*mass_flowrate
+
+    f_vec = np.empty(3, dtype=np.float64)
+
+    #-----------------------
+    # shell vapor balance
+    #-----------------------
+    f_vec[0] = params['vapor_gas_constant']*params['sat_temp']/params['shell_volume'] * \
+               (quality*mass_flowrate - condensation_rate)
+
+    #-----------------------
+    # hot well energy balance
+    #-----------------------
+    f_vec[1] = (liquid_flowrate*(params['inflow_temp'] - temp_hw) +
+                condensation_rate*(temp_sat - temp_hw))/params['hotwell_mass']
+
+    #-----------------------
+    # cooling loop energy balance
+    #-----------------------
+    f_vec[2] = (heat_rejection_pwr - params['cooling_tower_conductance'] *
+                (temp_cw - params['ambient_temp'])) / \
+               (params['cooling_water_mass']*params['cooling_water_cp'])
+
+    diagnostics = dict()
+    diagnostics['heat_rejection_pwr'] = heat_rejection_pwr
+    diagnostics['condensation_rate'] = condensation_rate
+    diagnostics['outflow_mass_flowrate'] = liquid_flowrate + condensation_rate
+
+    return (f_vec, diagnostics)
+
+def condenser_jac(u_vec, params):
+    """Jacobian of `condenser_rhs()` with respect to `u_vec`.
+    """
+
+    press = u_vec[0]
+    temp_hw = u_vec[1]
+
+    slope = params['sat_temp_slope']
+    conductance = params['effective_conductance']
+
+    temp_sat = params['sat_temp'] + slope*params['sat_press']*math.log(press/params['sat_press'])
+
+    # dT_sat/dP
+    slope *= params['sat_press']/press
+
+    condensation_rate = conductance*(temp_sat - u_vec[2])/params['h_vap']
+
+    # Condensation rate derivatives
+    dm_dp = conductance*slope/params['h_vap']
+    dm_dtcw = -conductance/params['h_vap']
+
+    liquid_flowrate = (1 - params['inflow_quality'])*params['inflow_mass_flowrate']
+
+    shell = params['vapor_gas_constant']*params['sat_temp']/params['shell_volume']
+    hotwell_mass = params['hotwell_mass']
+    loop_capacity = params['cooling_water_mass']*params['cooling_water_cp']
+
+    jac = np.zeros((3, 3), dtype=np.float64)
+
+    jac[0, 0] = -shell*dm_dp
+    jac[0, 2] = -shell*dm_dtcw
+
+    jac[1, 0] = (dm_dp*(temp_sat - temp_hw) + condensation_rate*slope)/hotwell_mass
+    jac[1, 1] = -(liquid_flowrate + condensation_rate)/hotwell_mass
+    jac[1, 2] = dm_dtcw*(temp_sat - temp_hw)/hotwell_mass
+
+    jac[2, 0] = conductance*slope/loop_capacity
+    jac[2, 2] = -(conductance + params['cooling_tower_conductance'])/loop_capacity
+
+    return jac
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Heat transfer correlations for the BOP modules.
+
+   The correlations take scalars or NumPy arrays (e.g. the nodes of a
+   discretised heat exchanger or the members of an ensemble) and return the
+   value and its derivative with respect to the correlating variable, so the
+   model Jacobians can be assembled from them.
+
+   The flow regimes of a correlation are piecewise. With `blend = 0` the regime
+   switches are sharp, as in the original correlations; with `blend > 0` the
+   neighbouring regimes are mixed with a smooth (C1) step of half width `blend`
+   around each switch (in ln Re for the Reynolds number regimes, in K for the
+   onset of nucleate boiling) so that the right-hand side of a model has no
+   jumps for the integrator to reject steps on.
+
+   Correlations
+   ------------
+   `dittus_boelter()`:   turbulent flow in smooth pipes.
+   `zukauskas()`:        cross flow over staggered tube bundles.
+   `jens_lottes()`:      subcooled/saturated nucleate boiling.
+   `nucleate_boiling()`: single phase to nucleate boiling regime switch.
+"""
+
+import math
+import numpy as np
+
+import unit
+
+def smooth_step(z_var):
+    """C1 step from 0 (`z_var <= -1`) to 1 (`z_var >= 1`) and its derivative.
+    """
+
+    frac = np.clip((np.asarray(z_var, dtype=np.float64) + 1)/2, 0.0, 1.0)
+
+    step = frac**2*(3 - 2*frac)
+    dstep_dz = 3*frac*(1 - frac)
+
+    return (step[()], dstep_dz[()])
+
+def dittus_boelter(rey, prtl, blend=0.0):
+    """Mean Nusselt number for turbulent one-phase flow on "smooth" pipes.
+       Dittus and Boelter.
+       Re > 10000
+       L/D > 60
+       Laminar (Re <= 2000): Nu = 4.
+
+    Parameters
+    ----------
+    rey: float or numpy.ndarray
+        Reynolds number based on diameter; bulk conditions.
+    prtl: float or numpy.ndarray
+        Prandtl number; bulk conditions.
+    blend: float
+        Half width in ln Re of the laminar to turbulent transition.
+
+    Returns
+    -------
+    (nusselt, dnusselt_drey): tuple
+    """
+
+    rey = np.asarray(rey, dtype=np.float64)
+
+    rey_safe = np.maximum(rey, 1.0)
+
+    nusselt_turb = 0.023 * rey_safe**0.8 * np.asarray(prtl)**0.4
+    dnusselt_turb = 0.8*nusselt_turb/rey_safe
+
+    regimes = [(4.0, 0.0), (nusselt_turb, dnusselt_turb)]
+
+    (nusselt, dnusselt_drey) = _blend_regimes(rey, regimes, (2e3,), blend)
+
+    return (nusselt[()], dnusselt_drey[()])
+
+def zukauskas(rey, prtl, prtl_w, st_sl, blend=0.0):
+    """Mean Nusselt number for turbulent one-phase flow.
+       Staggered tube bundle.
+       A. Zukauskas 1987,
+       Convective Heat Transfer in Cross Flows
+       Handbook of Single-Phase Convective Heat Transfer, Chap 6.
+       S. Kakac, R. Shah, and W. Aung Eds.
+       J. Wiley & Sons, New York 1987
+
+    Parameters
+    ----------
+    rey: float or numpy.ndarray
+        Reynolds number based on diameter; Re <= 2e6.
+    prtl: float or numpy.ndarray
+        Prandtl number.
+    prtl_w: float or numpy.ndarray
+        Prandtl number based on wall temperature.
+    st_sl: float
+        Ratio of tube pitch transversal to flow to the tube pitch along flow.
+    blend: float
+        Half width in ln Re of the transitions between the Reynolds number
+        ranges of the correlation.
+
+    Returns
+    -------
+    (nusselt, dnusselt_drey): tuple
+    """
+
+    rey = np.asarray(rey, dtype=np.float64)
+
+    assert np.all(rey <= 2e6), 'Re = %r out of range'%np.max(rey)
+
+    rey_safe = np.maximum(rey, 1e-30)
+
+    prtl_factor = np.asarray(prtl)**0.36 * (np.asarray(prtl)/np.asarray(prtl_w))**0.25
+
+    regimes = [(4.0, 0.0)]
+    for (coeff, expo) in ((1.04, 0.4), (0.71, 0.5), (0.35*st_sl**0.2, 0.6),
+                          (0.031*st_sl**0.2, 0.8)):
+        nusselt = coeff * rey_safe**expo * prtl_factor
+        regimes.append((nusselt, expo*nusselt/rey_safe))
+
+    # The lowest range starts at Re = 1 inclusive; the others end inclusive
+    (nusselt, dnusselt_drey) = _blend_regimes(rey, regimes, (1.0, 5e2, 1e3, 2e5), blend,
+                                              inclusive=(True, False, False, False))
+
+    return (nusselt[()], dnusselt_drey[()])
+
+def jens_lottes(temp_excess, press):
+    """Heat transfer coefficient of subcooled/saturated nucleate boiling and its
+       derivative with respect to the wall superheat. SI units: W/m2-K.
+       Jens and Lottes correlation
+       500 <= P <= 2000 psi
+       Zero for a wall temperature at or below saturation.
+
+    Parameters
+    ----------
+    temp_excess: float or numpy.ndarray
+        Wall superheat, wall temperature minus saturation temperature [K].
+    press: float or numpy.ndarray
+        Pressure [Pa].
+
+    Returns
+    -------
+    (h_boiling, dh_dtemp_excess): tuple
+    """
+
+    temp_excess = np.maximum(np.asarray(temp_excess, dtype=np.float64), 0.0)
+
+    press_psia = np.asarray(press)/unit.psi
+
+    # q'' ~ (temp_excess)^4 [Btu/h-ft^2]; h = q''/temp_excess
+    coeff = (9/5 * np.exp(press_psia/900) / 60)**4 * 1e6 * unit.Btu/unit.hour/unit.ft**2
+
+    h_boiling = coeff * temp_excess**3
+    dh_dtemp_excess = 3*coeff * temp_excess**2
+
+    return (h_boiling[()], dh_dtemp_excess[()])
+
+def nucleate_boiling(h_single_phase, temp_excess, press, onset=0.0, blend=0.0):
+    """Heat transfer coefficient switching from single phase to nucleate boiling
+       (Jens and Lottes) at a wall superheat `onset`. SI units: W/m2-K.
+
+    Parameters
+    ----------
+    h_single_phase: float or numpy.ndarray
+        Single phase heat transfer coefficient.
+    temp_excess: float or numpy.ndarray
+        Wall superheat [K].
+    press: float or numpy.ndarray
+        Pressure [Pa].
+    onset: float
+        Wall superheat above which the wall boils [K].
+    blend: float
+        Half width of the transition around `onset` [K].
+
+    Returns
+    -------
+    (h, dh_dtemp_excess, boiling): tuple
+        Heat transfer coefficient, its derivative with respect to the wall
+        superheat (the single phase coefficient taken as constant), and the
+        weight of the boiling regime in [0, 1].
+    """
+
+    temp_excess = np.asarray(temp_excess, dtype=np.float64)
+
+    (h_boiling, dh_boiling) = jens_lottes(temp_excess, press)
+
+    if blend > 0.0:
+        (boiling, dboiling) = smooth_step((temp_excess - onset)/blend)
+        dboiling = dboiling/blend
+    else:
+        boiling = np.where(temp_excess > onset, 1.0, 0.0)
+        dboiling = 0.0
+
+    h_single_phase = np.asarray(h_single_phase, dtype=np.float64)
+
+    h = (1 - boiling)*h_single_phase + boiling*h_boiling
+    dh_dtemp_excess = boiling*dh_boiling + dboiling*(h_boiling - h_single_phase)
+
+    return (h[()], np.asarray(dh_dtemp_excess)[()], np.asarray(boiling)[()])
+
+def _blend_regimes(rey, regimes, switches, blend, inclusive=None):
+    """Piecewise correlation in Re: `regimes[k]`, a (value, derivative) pair,
+       applies between `switches[k-1]` and `switches[k]`. A sharp switch
+       belongs to the lower regime unless `inclusive[k]`.
+    """
+
+    if inclusive is None:
+        inclusive = (False,)*len(switches)
+
+    (value, deriv) = regimes[0]
+    value = np.broadcast_to(value, rey.shape).astype(np.float64)
+    deriv = np.broadcast_to(deriv, rey.shape).astype(np.float64)
+
+    log_rey = np.log(np.maximum(rey, 1e-30))
+
+    for ((next_value, next_deriv), switch, incl) in zip(regimes[1:], switches, inclusive):
+
+        if blend > 0.0:
+            (weight, dweight) = smooth_step((log_rey - math.log(switch))/blend)
+            dweight_drey = dweight/blend/np.maximum(rey, 1e-30)
+        else:
+            weight = np.where(rey >= switch if incl else rey > switch, 1.0, 0.0)
+            dweight_drey = 0.0
+
+        deriv = (1 - weight)*deriv + weight*next_deriv + dweight_drey*(next_value - value)
+        value = (1 - weight)*value + weight*next_value
+
+    return (value, deriv)
@@ -0,0 +1,721 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Columnar phase history store for the Cortix modules.
+
+   `PhaseHistory` is a drop-in replacement of `cortix.support.phase_new.PhaseNew`
+   for the calls the modules make every time step (`get_row`, `add_row`,
+   `get_value`, `set_value`). Each column is a preallocated NumPy buffer
+   (float64 for scalar quantities and species, object otherwise) grown by
+   doubling, so appending a row is amortised O(1) instead of the O(n) append of
+   a pandas data frame. The pandas `Series` (`get_quantity_history()`), data
+   frame (`to_dataframe()`) or `PhaseNew` (`to_phase()`) are built only when
+   asked for, e.g. for plotting at the end of a run.
+
+   Time stamps are matched as in `PhaseNew`: the nearest time stamp within
+   1e-3 of the mean time step. Rows must be added in increasing time.
+
+   What is kept of the history is set per phase with `set_recording()`: every
+   row (default), every k-th row, a row per time interval, time-weighted mean
+   (with min/max) over time windows, or the most recent rows only. The last few
+   rows, which the modules read back as their state and port values, are always
+   kept at full resolution.
+
+   With `stream_to()` the recorded rows are written in chunks to an on-disk
+   store (see `history_store`) on a background thread and dropped from memory.
+"""
+
+import bisect
+import numbers
+import os
+import shutil
+from copy import deepcopy
+
+import numpy as np
+import pandas
+
+from cortix.support.phase_new import PhaseNew
+from cortix.support.species import Species
+from cortix.support.quantity import Quantity
+
+from history_store import HistoryReader
+from history_store import writer
+from history_store import flush_writer
+
+class PhaseHistory:
+    """Phase history with preallocated column buffers.
+
+    Parameters
+    ----------
+    name: str or None
+    time_stamp: float or None
+        First time stamp; default 0.0.
+    time_unit: str or None
+        Default 's'.
+    species: list(Species) or None
+        Species columns (initial value 0.0).
+    quantities: list(Quantity) or None
+        Quantity columns (initial value `quantity.value`).
+    capacity: int
+        Initial number of rows allocated.
+
+    Examples
+    --------
+    >>> phase = PhaseHistory(time_stamp=0.0, quantities=[temp])
+    >>> phase.set_recording('interval', 1*unit.minute)
+    >>> phase.reserve(57601)
+    >>> phase.add_row(1.5, phase.get_row(0.0))
+    >>> phase.set_value('temp', 300.0, 1.5)
+    """
+
+    recording_policies = ('all', 'every', 'interval', 'window', 'ring')
+
+    def __init__(self, name=None, time_stamp=None, time_unit=None, species=None,
+                 quantities=None, capacity=64):
+
+        self.name = name if name else self.__class__.__name__
+
+        if time_stamp is None:
+            time_stamp = 0.0
+
+        assert isinstance(time_stamp, numbers.Real), 'time_stamp = %r'%time_stamp
+
+        self.__time_unit = 's' if time_unit is None else time_unit
+
+        if species is not None:
+            assert all(isinstance(spc, Species) for spc in species)
+        if quantities is not None:
+            assert all(isinstance(quant, Quantity) for quant in quantities)
+
+        self.__species = deepcopy(species)
+        self.__quantities = deepcopy(quantities)
+
+        names = list()
+        values = list()
+
+        for spc in self.__species or ():
+            names.append(spc.name)
+            values.append(0.0)
+
+        for quant in self.__quantities or ():
+            names.append(quant.name)
+            values.append(quant.value)
+
+        assert len(set(names)) == len(names), 'duplicate names in %r'%names
+
+        self.__names = names
+        self.__column = {name: i for (i, name) in enumerate(names)}
+
+        capacity = max(int(capacity), 1)
+
+        self.__n_rows = 0
+        self.__times = np.empty(capacity, dtype=np.float64)
+        self.__buffers = [np.empty(capacity, dtype=_dtype(value)) for value in values]
+
+        # Recording: rows [0, n_recorded) have gone through the policy, the
+        # others are live
+        self.__recording = ('all', None)
+        self.__live_rows = 4
+        self.__n_recorded = 0
+        self.__n_steps = 0         # rows ever added
+        self.__time_0 = float(time_stamp)
+        self.__last_bin = None     # interval/window of the last recorded row
+        self.__retired_time = None # time of the last row out of the live window
+        self.__window = None       # window accumulators
+        self.__extrema = dict()    # column: (min, max) buffers of window rows
+
+        # Streaming: (store path, chunk rows); rows [0, n_spilled) are stored
+        self.__stream = None
+        self.__n_spilled = 0
+
+        self.add_row(float(time_stamp), values)
+
+    def set_recording(self, policy, value=None, live_rows=4):
+        """Set what is kept of the history.
+
+        Parameters
+        ----------
+        policy: str
+            'all': every row.
+            'every': every `value`-th row (int).
+            'interval': first row in each time interval `value`.
+            'window': a row per time window `value` with the time-weighted mean
+            of the window; the min/max of scalar columns are kept and returned
+            by `get_quantity_history(name, 'min'/'max')`.
+            'ring': the most recent `value` rows (int); up to twice as many
+            are held between compactions.
+        value: int, float or None
+        live_rows: int
+            Number of last rows always kept; the policy applies to older rows.
+            Values read at dropped time stamps are missing.
+
+        Notes
+        -----
+        Set before the run; rows already recorded are not revisited.
+        """
+
+        assert policy in self.recording_policies, 'policy %r not in %r'%\
+               (policy, self.recording_policies)
+
+        if policy in ('every', 'ring'):
+            assert isinstance(value, numbers.Integral) and value >= 1, 'value = %r'%value
+        elif policy in ('interval', 'window'):
+            assert isinstance(value, numbers.Real) and value > 0.0, 'value = %r'%value
+
+        assert isinstance(live_rows, numbers.Integral) and live_rows >= 2
+
+        self.__recording = (policy, value)
+        self.__live_rows = int(live_rows)
+        self.__last_bin = None
+        self.__window = None
+
+        if policy == 'window':
+            self.__extrema = {i: (np.empty(self.__times.size), np.empty(self.__times.size))
+                              for (i, buffer) in enumerate(self.__buffers)
+                              if buffer.dtype != object}
+        else:
+            self.__extrema = dict()
+
+    def __get_recording(self):
+
+        return self.__recording
+    recording = property(__get_recording, None, None, None)
+
+    def stream_to(self, path, chunk_rows=4096):
+        """Write the recorded rows to the store `path` in chunks of `chunk_rows`
+           and drop them from memory; an existing store at `path` is replaced.
+
+        Notes
+        -----
+        `get_row()`, `get_value()`, `set_value()` and `time_stamps` cover the
+        rows in memory, the last ones; `get_quantity_history()` and
+        `to_dataframe()` the whole history. Call `flush()` at the end of the run.
+        """
+
+        assert isinstance(chunk_rows, numbers.Integral) and chunk_rows >= 1
+
+        path = os.path.abspath(path)
+
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            shutil.rmtree(path)
+
+        self.__stream = (path, int(chunk_rows))
+        self.__n_spilled = 0
+
+    def flush(self):
+        """Write the rows in memory not yet stored, keeping them in memory, and
+           wait for the store.
+        """
+
+        if self.__stream is None:
+            return
+
+        self.__spill(self.__n_rows)
+
+        flush_writer()
+
+    def reserve(self, n_rows, time_span=None):
+        """Allocate room for `n_rows` more rows; the rows kept by the recording
+           policy over `n_rows` steps or `time_span` when fewer.
+        """
+
+        (policy, value) = self.__recording
+
+        if policy == 'every':
+            n_rows = n_rows//value + 1
+        elif policy in ('interval', 'window') and time_span is not None:
+            n_rows = min(n_rows, int(time_span/value) + 1)
+        elif policy == 'ring':
+            n_rows = min(n_rows, 2*value)
+
+        if self.__stream is not None:
+            n_rows = min(n_rows, self.__stream[1])
+
+        n_rows += self.__n_rows + self.__live_rows + 1
+
+        if n_rows > self.__times.size:
+            self.__resize(int(n_rows))
+
+    def add_row(self, try_time_stamp, row_values):
+        """Add the row `row_values` (a value per column, in column order) at
+           `try_time_stamp`.
+        """
+
+        assert isinstance(row_values, list)
+        assert len(row_values) == len(self.__names)
+
+        n_rows = self.__n_rows
+
+        if n_rows:
+            assert try_time_stamp > self.__times[n_rows-1] and \
+                   self.__index(try_time_stamp) is None, \
+                   'already used or past time_stamp: %r'%try_time_stamp
+
+        if n_rows == self.__times.size:
+            self.__resize(2*n_rows)
+
+        self.__times[n_rows] = try_time_stamp
+        self.__n_rows += 1
+        self.__n_steps += 1
+
+        for (i, value) in enumerate(row_values):
+            self.__store(i, n_rows, value)
+
+        if self.__n_rows - self.__n_recorded > self.__live_rows:
+            self.__retire()
+
+        if self.__stream is not None and self.__n_recorded >= self.__stream[1]:
+            # Rows out to the store, live rows to the front
+            n_recorded = self.__n_recorded
+            self.__spill(n_recorded)
+            self.__move(n_recorded, self.__n_rows, 0)
+            self.__n_rows -= n_recorded
+            self.__n_spilled = max(self.__n_spilled - n_recorded, 0)
+            self.__n_recorded = 0
+
+    def get_row(self, try_time_stamp=None):
+        """Values of all columns at `try_time_stamp` (default the last one).
+
+        Returns
+        -------
+        row_values: list
+        """
+
+        row = self.__row(try_time_stamp)
+
+        return [buffer[row] for buffer in self.__buffers]
+
+    def get_value(self, actor, try_time_stamp=None):
+        """Value of column `actor` at `try_time_stamp` (default the last one).
+        """
+
+        assert actor in self.__column, 'actor %r not in %r'%(actor, self.__names)
+
+        return self.__buffers[self.__column[actor]][self.__row(try_time_stamp)]
+
+    def set_value(self, actor, value, try_time_stamp=None):
+        """Set the value of column `actor` at `try_time_stamp` (default the last
+           one).
+        """
+
+        assert actor in self.__column, 'actor = %r not in data frame'%actor
+
+        self.__store(self.__column[actor], self.__row(try_time_stamp), value)
+
+    def get_column(self, actor):
+        """History of column `actor`.
+
+        Returns
+        -------
+        values: list
+        """
+
+        assert actor in self.__column, 'actor %r not in %r'%(actor, self.__names)
+
+        return list(self.__series(actor))
+
+    def has_time_stamp(self, try_time_stamp):
+
+        return self.__index(try_time_stamp) is not None
+
+    def get_quantity_history(self, name, statistic=None):
+        """Quantity `name` with its history (pandas `Series` indexed by time) as
+           value, as `PhaseNew.get_quantity_history()`.
+
+        Parameters
+        ----------
+        name: str
+        statistic: str or None
+            'min' or 'max' over the windows of the 'window' recording policy;
+            default the recorded values.
+
+        Returns
+        -------
+        (quantity, time_unit): tuple
+        """
+
+        assert name in self.__column, 'name %r not in %r'%(name, self.__names)
+        assert statistic in (None, 'min', 'max'), 'statistic = %r'%statistic
+
+        if self.__quantities is None:
+            return (None, self.__time_unit)
+
+        for quant in self.__quantities:
+            if quant.name == name:
+                quant_history = deepcopy(quant)
+                quant_history.value = self.__series(name, statistic)
+                return (quant_history, self.__time_unit)
+
+        return None
+
+    def to_dataframe(self):
+        """History as a pandas data frame indexed by time.
+        """
+
+        return pandas.DataFrame({name: self.__series(name) for name in self.__names})
+
+    def to_phase(self):
+        """History as a `PhaseNew`.
+        """
+
+        phase = PhaseNew(name=self.name, time_stamp=float(self.__times[0]),
+                         time_unit=self.__time_unit, species=self.__species,
+                         quantities=self.__quantities)
+
+        # The data frame is built at once, not row by row
+        phase._PhaseNew__df = self.to_dataframe().astype(object)
+
+        return phase
+
+    def plot(self, *args, **kwargs):
+        """`PhaseNew.plot()` of the exported history.
+        """
+
+        return self.to_phase().plot(*args, **kwargs)
+
+    def __get_df(self):
+
+        return self.to_dataframe()
+    df = property(__get_df, None, None, None)
+
+    def __get_time_stamps(self):
+
+        return list(self.__times[:self.__n_rows])
+    time_stamps = property(__get_time_stamps, None, None, None)
+
+    def __get_time_unit(self):
+
+        return self.__time_unit
+    time_unit = property(__get_time_unit, None, None, None)
+
+    def __len__(self):
+
+        return self.__n_rows
+
+    def __getstate__(self):
+        """Pickle (Cortix results, checkpoints) without the unused capacity.
+        """
+
+        state = self.__dict__.copy()
+
+        n_rows = self.__n_rows
+        state['_PhaseHistory__times'] = self.__times[:n_rows].copy()
+        state['_PhaseHistory__buffers'] = [buffer[:n_rows].copy()
+                                           for buffer in self.__buffers]
+        state['_PhaseHistory__extrema'] = {i: (low[:n_rows].copy(), high[:n_rows].copy())
+                                           for (i, (low, high)) in self.__extrema.items()}
+
+        return state
+
+    def __str__(self):
+
+        return 'PhaseHistory: name=%s; %i time stamps (%i added), %i allocated; '\
+               'recording %r; stream %r; columns %r'%(self.name, self.__n_rows,
+                                                     self.__n_steps, self.__times.size,
+                                                     self.__recording, self.__stream,
+                                                     self.__names)
+
+    def __row(self, try_time_stamp):
+
+        if try_time_stamp is None:
+            return self.__n_rows - 1
+
+        assert isinstance(try_time_stamp, numbers.Real), 'time_stamp = %r'%try_time_stamp
+
+        row = self.__index(try_time_stamp)
+        assert row is not None, 'missing try_time_stamp: %r'%try_time_stamp
+
+        return row
+
+    def __index(self, try_time_stamp):
+        """Row of the nearest time stamp within the `PhaseNew` tolerance, or
+           None.
+        """
+
+        n_rows = self.__n_rows
+        times = self.__times
+
+        # 1e-3 * the mean delta t of all rows added, recorded or not
+        tol = 1.0e-3
+        if self.__n_steps >= 2:
+            tol *= (times[n_rows-1] - self.__time_0)/(self.__n_steps - 1)
+
+        # Most queries are on the last rows
+        last = n_rows - 1
+        if abs(times[last] - try_time_stamp) <= tol:
+            return last
+
+        row = bisect.bisect_left(times, try_time_stamp, 0, n_rows)
+
+        nearest = [r for r in (row-1, row) if 0 <= r < n_rows]
+        if not nearest:
+            return None
+
+        row = min(nearest, key=lambda r: abs(times[r] - try_time_stamp))
+
+        return row if abs(times[row] - try_time_stamp) <= tol else None
+
+    def __retire(self):
+        """Apply the recording policy to the oldest live row.
+        """
+
+        (policy, value) = self.__recording
+
+        row = self.__n_recorded
+        time = self.__times[row]
+
+        if policy == 'all':
+            keep = True
+
+        elif policy == 'every':
+            step = self.__n_steps - (self.__n_rows - row) # step index of the row
+            keep = step%value == 0
+
+        elif policy == 'interval':
+            time_bin = int((time - self.__time_0)//value)
+            keep = self.__last_bin is None or time_bin > self.__last_bin
+            if keep:
+                self.__last_bin = time_bin
+
+        elif policy == 'window':
+            keep = self.__accumulate(row, time)
+
+        elif policy == 'ring':
+            keep = True
+
+        self.__retired_time = time
+
+        if keep:
+            self.__n_recorded += 1
+        else:
+            self.__move(row+1, self.__n_rows, row)
+            self.__n_rows -= 1
+            if row < self.__n_spilled:
+                self.__n_spilled -= 1
+
+        if policy == 'ring' and self.__n_recorded >= 2*value:
+            # Amortised O(1): drop the oldest half at once
+            n_drop = self.__n_recorded - value
+            self.__move(n_drop, self.__n_rows, 0)
+            self.__n_rows -= n_drop
+            self.__n_recorded -= n_drop
+            self.__n_spilled = max(self.__n_spilled - n_drop, 0)
+
+    def __spill(self, end):
+        """Queue the rows [n_spilled, end) to the store.
+        """
+
+        start = self.__n_spilled
+
+        if end <= start:
+            return
+
+        n_recorded = self.__n_recorded
+
+        columns = list()
+
+        for (i, buffer) in enumerate(self.__buffers):
+
+            extrema = None
+            if i in self.__extrema:
+                # Window rows have the extrema, the live rows their values
+                extrema = tuple(buffer[start:end].copy() for _ in range(2))
+                for (array, window_array) in zip(extrema, self.__extrema[i]):
+                    array[:max(n_recorded-start, 0)] = window_array[start:n_recorded]
+
+            columns.append((buffer[start:end].copy(), extrema))
+
+        meta = dict(name=self.name, time_unit=self.__time_unit, names=self.__names,
+                    recording=list(self.__recording))
+
+        writer().append(self.__stream[0], meta, self.__times[start:end].copy(), columns)
+
+        self.__n_spilled = end
+
+    def __accumulate(self, row, time):
+        """Add `row` to the current window; at the end of the window, write the
+           window mean into `row`.
+
+        Returns
+        -------
+        keep: bool
+        """
+
+        window_size = self.__recording[1]
+
+        time_bin = int((time - self.__time_0)//window_size)
+        weight = 0.0 if self.__retired_time is None else time - self.__retired_time
+
+        values = [buffer[row] for buffer in self.__buffers]
+
+        if self.__window is None:
+            self.__window = dict(weight=0.0, sums=[None]*len(values),
+                                 low=[np.inf]*len(values), high=[-np.inf]*len(values))
+
+        window = self.__window
+        window['weight'] += weight
+
+        for (i, value) in enumerate(values):
+            window['sums'][i] = _weighted_sum(window['sums'][i], value, weight)
+            if i in self.__extrema:
+                window['low'][i] = min(window['low'][i], value)
+                window['high'][i] = max(window['high'][i], value)
+
+        # Window closes on the last row before the next window starts
+        next_time = self.__times[row+1]
+        if int((next_time - self.__time_0)//window_size) == time_bin:
+            return False
+
+        total_weight = window['weight']
+
+        for (i, value) in enumerate(values):
+            total = window['sums'][i]
+            if total_weight > 0.0 and total is not None:
+                self.__store(i, row, total/total_weight)
+            if i in self.__extrema:
+                self.__extrema[i][0][row] = window['low'][i]
+                self.__extrema[i][1][row] = window['high'][i]
+
+        self.__window = None
+
+        return True
+
+    def __store(self, column, row, value):
+
+        buffer = self.__buffers[column]
+
+        if buffer.dtype == object:
+            buffer[row] = deepcopy(value)
+            return
+
+        if _dtype(value) == object:
+            # Non-scalar value in a scalar column
+            buffer = buffer.astype(object)
+            self.__buffers[column] = buffer
+            buffer[row] = deepcopy(value)
+            self.__extrema.pop(column, None)
+        else:
+            buffer[row] = value
+
+    def __move(self, start, end, destination):
+        """Move rows [start, end) to `destination`.
+        """
+
+        if end <= start:
+            return
+
+        size = end - start
+
+        arrays = [self.__times] + self.__buffers + \
+                 [array for pair in self.__extrema.values() for array in pair]
+
+        for array in arrays:
+            array[destination:destination+size] = array[start:end]
+
+    def __resize(self, capacity):
+
+        n_rows = self.__n_rows
+
+        def resized(array):
+            new_array = np.empty(capacity, dtype=array.dtype)
+            new_array[:n_rows] = array[:n_rows]
+            return new_array
+
+        self.__times = resized(self.__times)
+        self.__buffers = [resized(buffer) for buffer in self.__buffers]
+        self.__extrema = {i: (resized(low), resized(high))
+                          for (i, (low, high)) in self.__extrema.items()}
+
+    def __series(self, name, statistic=None):
+        """History of column `name`: the stored rows, if any, and the rows in
+           memory.
+        """
+
+        column = self.__column[name]
+        values = self.__buffers[column][:self.__n_rows].copy()
+
+        if statistic is not None:
+            assert column in self.__extrema, 'no %s of %r recorded'%(statistic, name)
+            # Window rows have the extrema, the live rows their values
+            n_recorded = self.__n_recorded
+            values[:n_recorded] = self.__extrema[column][statistic == 'max'][:n_recorded]
+
+        start = 0
+        stored = None
+
+        if self.__stream is not None:
+            flush_writer()
+            if os.path.exists(os.path.join(self.__stream[0], 'meta.json')):
+                stored = HistoryReader(self.__stream[0]).series(name, statistic)
+                start = self.__n_spilled
+
+        series = pandas.Series(values[start:], name=name,
+                               index=pandas.Index(self.__times[start:self.__n_rows].copy(),
+                                                  dtype=np.float64))
+
+        if stored is not None:
+            series = pandas.concat([stored, series]) if len(series) else stored
+
+        return series
+
+def reserve_histories(module, n_rows=None):
+    """Preallocate the `PhaseHistory` attributes of `module` for its run: by
+       default the number of time steps from `module.initial_time` to
+       `module.end_time`, plus the initial and final rows.
+    """
+
+    time_span = module.end_time - module.initial_time
+
+    if n_rows is None:
+        n_rows = int(time_span/module.time_step) + 2
+
+    for value in vars(module).values():
+        if isinstance(value, PhaseHistory):
+            value.reserve(n_rows, time_span)
+
+def stream_histories(module, directory, chunk_rows=4096):
+    """Stream the `PhaseHistory` attributes of `module` to the stores
+       `directory/<module name>/<attribute>`; see `PhaseHistory.stream_to()`.
+    """
+
+    for (name, phase) in vars(module).items():
+        if isinstance(phase, PhaseHistory):
+            phase.stream_to(os.path.join(directory, module.name, name), chunk_rows)
+
+def flush_histories(module):
+    """Flush the `PhaseHistory` attributes of `module` to their stores, if
+       streamed.
+    """
+
+    for phase in vars(module).values():
+        if isinstance(phase, PhaseHistory):
+            phase.flush()
+
+def set_recording(module, policy, value=None, phases=None, live_rows=4):
+    """Set the recording policy of the `PhaseHistory` attributes of `module`
+       (all, or those named in `phases`); see `PhaseHistory.set_recording()`.
+    """
+
+    for (name, phase) in vars(module).items():
+        if isinstance(phase, PhaseHistory) and (phases is None or name in phases):
+            phase.set_recording(policy, value, live_rows)
+
+def _dtype(value):
+    """Column type of `value`: float64 for real scalars, object otherwise.
+    """
+
+    if isinstance(value, numbers.Real) and not isinstance(value, bool):
+        return np.float64
+
+    return object
+
+def _weighted_sum(total, value, weight):
+    """`total + weight*value` for numbers and arrays; None for other values.
+    """
+
+    if isinstance(value, np.ndarray) or \
+       (isinstance(value, numbers.Real) and not isinstance(value, bool)):
+        return weight*value if total is None else total + weight*value
+
+    return None
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Chunked on-disk store of phase histories.
+
+   A store is a directory with a `meta.json` file and one append-only binary
+   file per column: `time.f8` and `cNNN.f8` (float64, C order, one row of
+   `shape` values per time stamp) or `cNNN.pkl` (pickled lists) for values that
+   are not numbers or numeric arrays; `cNNN.min.f8`/`cNNN.max.f8` hold the window
+   extrema of the 'window' recording policy. Column files are written before
+   the time file, so the number of rows is the size of `time.f8` and a store
+   can be read while it is being written.
+
+   `HistoryWriter` appends chunks on a background thread (one per process, see
+   `writer()`); `HistoryReader` memory-maps the column files.
+"""
+
+import json
+import os
+import pickle
+import queue
+import threading
+
+import numpy as np
+import pandas
+
+class HistoryWriter:
+    """Background thread appending chunks of rows to history stores.
+
+    Errors of the thread are raised by the next `append()` or `flush()`.
+    """
+
+    def __init__(self):
+
+        self.pid = os.getpid()
+
+        self.__queue = queue.Queue()
+        self.__error = None
+
+        self.__thread = threading.Thread(target=self.__work, name='history-writer',
+                                         daemon=True)
+        self.__thread.start()
+
+    def append(self, path, meta, times, columns):
+        """Queue the chunk `times` (array), `columns` (list of (values,
+           extrema) with extrema None or (min, max) arrays) of the store `path`.
+           `meta` is written with the first chunk.
+        """
+
+        self.__raise()
+
+        self.__queue.put((path, meta, times, columns))
+
+    def flush(self):
+        """Wait until the queued chunks are written.
+        """
+
+        self.__queue.join()
+
+        self.__raise()
+
+    def __work(self):
+
+        while True:
+
+            chunk = self.__queue.get()
+
+            try:
+                if self.__error is None:
+                    _write_chunk(*chunk)
+            except Exception as error:
+                self.__error = error
+            finally:
+                self.__queue.task_done()
+
+    def __raise(self):
+
+        if self.__error is not None:
+            raise RuntimeError('history writer failed: %r'%self.__error) \
+                  from self.__error
+
+class HistoryReader:
+    """Memory-mapped reader of a history store.
+
+    Parameters
+    ----------
+    path: str
+        Store directory.
+
+    Examples
+    --------
+    >>> store = HistoryReader('histories/SM-PWR/state_phase')
+    >>> power = store.series('power')
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            self.meta = json.load(meta_file)
+
+        self.__columns = {column['name']: column for column in self.meta['columns']}
+
+    def __get_n_rows(self):
+
+        return os.path.getsize(os.path.join(self.path, 'time.f8'))//8
+    n_rows = property(__get_n_rows, None, None, None)
+
+    def __get_names(self):
+
+        return [column['name'] for column in self.meta['columns']]
+    names = property(__get_names, None, None, None)
+
+    def __get_time_unit(self):
+
+        return self.meta['time_unit']
+    time_unit = property(__get_time_unit, None, None, None)
+
+    def __get_times(self):
+
+        return self.__memmap('time.f8', (), self.n_rows)
+    times = property(__get_times, None, None, None)
+
+    def column(self, name, statistic=None):
+        """Values of column `name` ('min' or 'max' of the window extrema with
+           `statistic`): a read-only memory map of shape (n_rows, *shape), or an
+           object array for pickled columns.
+        """
+
+        assert name in self.__columns, 'name %r not in %r'%(name, self.names)
+        assert statistic in (None, 'min', 'max'), 'statistic = %r'%statistic
+
+        column = self.__columns[name]
+        n_rows = self.n_rows
+
+        if statistic is not None:
+            assert column['extrema'], 'no %s of %r stored'%(statistic, name)
+            return self.__memmap(column['file']+'.'+statistic+'.f8', (), n_rows)
+
+        if column['kind'] == 'f8':
+            return self.__memmap(column['file']+'.f8', tuple(column['shape']), n_rows)
+
+        values = list()
+        with open(os.path.join(self.path, column['file']+'.pkl'), 'rb') as pkl_file:
+            while len(values) < n_rows:
+                values += pickle.load(pkl_file)
+
+        array = np.empty(n_rows, dtype=object)
+        array[:] = values[:n_rows]
+
+        return array
+
+    def series(self, name, statistic=None):
+        """Column `name` as a pandas `Series` indexed by time; rows of vector
+           columns are arrays, as in `PhaseNew`.
+        """
+
+        values = self.column(name, statistic)
+
+        if values.ndim > 1:
+            rows = np.empty(len(values), dtype=object)
+            rows[:] = list(np.array(values))
+            values = rows
+
+        return pandas.Series(np.array(values), index=pandas.Index(np.array(self.times)),
+                             name=name)
+
+    def to_dataframe(self):
+
+        return pandas.DataFrame({name: self.series(name) for name in self.names})
+
+    def __memmap(self, file_name, shape, n_rows):
+
+        if n_rows == 0:
+            return np.empty((0,) + shape)
+
+        return np.memmap(os.path.join(self.path, file_name), dtype=np.float64, mode='r',
+                         shape=(n_rows,) + shape)
+
+    def __str__(self):
+
+        return 'HistoryReader: %s; %i rows; columns %r'%(self.path, self.n_rows,
+                                                         self.names)
+
+_WRITER = None
+
+def writer():
+    """The history writer of this process, started on first use.
+    """
+
+    global _WRITER
+
+    if _WRITER is None or _WRITER.pid != os.getpid():
+        _WRITER = HistoryWriter()
+
+    return _WRITER
+
+def flush_writer():
+    """Wait for the history writer of this process, if any.
+    """
+
+    if _WRITER is not None and _WRITER.pid == os.getpid():
+        _WRITER.flush()
+
+def _write_chunk(path, meta, times, columns):
+    """Append a chunk to the store `path`; create the store on the first chunk.
+    """
+
+    meta_path = os.path.join(path, 'meta.json')
+
+    if not os.path.exists(meta_path):
+
+        os.makedirs(path, exist_ok=True)
+
+        meta = dict(meta, columns=[_column_meta(name, i, values, extrema)
+                                   for (i, (name, (values, extrema)))
+                                   in enumerate(zip(meta['names'], columns))])
+        del meta['names']
+
+        with open(meta_path, 'w') as meta_file:
+            json.dump(meta, meta_file, indent=1)
+
+    else:
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+
+    for (column, (values, extrema)) in zip(meta['columns'], columns):
+
+        if column['kind'] == 'f8':
+            array = np.stack(list(values)) if values.dtype == object else values
+            array = np.ascontiguousarray(array, dtype=np.float64)
+            assert array.shape[1:] == tuple(column['shape']), \
+                   'column %r: shape %r, stored %r'%(column['name'], array.shape[1:],
+                                                      column['shape'])
+            _append(path, column['file']+'.f8', array.tobytes())
+        else:
+            _append(path, column['file']+'.pkl', pickle.dumps(list(values)))
+
+        if column['extrema']:
+            for (statistic, array) in zip(('min', 'max'), extrema):
+                _append(path, column['file']+'.'+statistic+'.f8',
+                        np.ascontiguousarray(array, dtype=np.float64).tobytes())
+
+    # Last: the rows are complete once their time stamps are stored
+    _append(path, 'time.f8', np.ascontiguousarray(times, dtype=np.float64).tobytes())
+
+def _column_meta(name, i, values, extrema):
+    """Storage of a column from its first chunk: float64 for numbers and
+       numeric arrays of one shape, pickle otherwise.
+    """
+
+    column = dict(name=name, file='c%03i'%i, kind='pkl', shape=[],
+                  extrema=extrema is not None)
+
+    if values.dtype != object:
+        column['kind'] = 'f8'
+    elif all(isinstance(value, np.ndarray) and value.dtype.kind in 'iuf'
+             for value in values) and \
+         len({value.shape for value in values}) == 1:
+        column['kind'] = 'f8'
+        column['shape'] = list(values[0].shape)
+
+    return column
+
+def _append(path, file_name, data):
+
+    with open(os.path.join(path, file_name), 'ab') as data_file:
+        data_file.write(data)
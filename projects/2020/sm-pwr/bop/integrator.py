@@ -0,0 +1,524 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""ODE integrator layer for the BOP modules.
+
+   An `Integrator` advances :math:`\\frac{\\text{d}u}{\\text{d}t} = f(u,t)` over
+   successive Cortix time steps. Except for `odeint`, which restarts on every
+   step as the modules originally did, the solver object is kept alive between
+   calls to `advance()` so that its step size, order and Jacobian history carry
+   over (warm restart).
+
+   Methods
+   -------
+   'odeint':      scipy.integrate.odeint restarted on every step.
+   'lsoda':       scipy.integrate.LSODA.
+   'bdf':         scipy.integrate.BDF.
+   'radau':       scipy.integrate.Radau.
+   'exponential': exponential Rosenbrock-Euler method with step doubling error
+                  control; suited for systems dominated by a stiff linear block
+                  (e.g. point kinetics).
+
+   The right-hand side and Jacobian keep the `odeint` argument order, `f(u, t)`
+   and `jac(u, t)`, and may return preallocated arrays.
+
+   Discontinuities of the right-hand side are handled without stepping across
+   them: at known times with `breakpoints`, and at the zero crossings of event
+   functions `g(u, t)` with `Event`. The integration stops at the located event,
+   the event action re-initialises the model and the state, and the solver is
+   cold restarted.
+"""
+
+import math
+import numpy as np
+import scipy
+from scipy.integrate import odeint, LSODA, BDF, Radau
+from scipy.linalg import expm
+from scipy.optimize import brentq
+from scipy.sparse import diags, dia_matrix
+
+_SCIPY_MAJOR = int(scipy.__version__.split('.')[0]) # see _set_lsoda_critical_time()
+
+class Event:
+    """State or time event: a zero crossing of `func(u_vec, time)`.
+
+    Parameters
+    ----------
+    func: callable
+        Event function `func(u_vec, time)`; the event occurs when it crosses zero.
+    action: callable or None
+        Called as `action(time, u_vec)` at the event; returns the re-initialised
+        state vector, or None to keep the state. Changes of the model (e.g. of the
+        right-hand side) are made here.
+    direction: int
+        Crossings counted: +1 increasing only, -1 decreasing only, 0 both.
+    once: bool
+        The event is disabled after it occurs.
+
+    Attributes
+    ----------
+    times: list(float)
+        Times at which the event occurred.
+    """
+
+    def __init__(self, func, action=None, direction=0, once=True):
+
+        assert direction in (-1, 0, 1)
+
+        self.func = func
+        self.action = action
+        self.direction = direction
+        self.once = once
+
+        self.times = list()
+
+    @property
+    def active(self):
+        """True while the event can still occur.
+        """
+
+        return not (self.once and self.times)
+
+    def crossed(self, g_0, g_1):
+        """True if the event function values `g_0`, `g_1` at the ends of an
+           interval bracket an event.
+        """
+
+        if self.direction >= 0 and g_0 < 0.0 <= g_1:
+            return True
+        if self.direction <= 0 and g_0 > 0.0 >= g_1:
+            return True
+
+        return False
+
+class Integrator:
+    """Persistent ODE integrator.
+
+    Parameters
+    ----------
+    f_vec: callable
+        Right-hand side `f_vec(u_vec, time)`.
+    jac: callable or None
+        Jacobian `jac(u_vec, time)`, df_i/du_j in row i, column j. Required by
+        the 'exponential' method; estimated by finite differences otherwise.
+    method: str
+        One of `Integrator.methods`.
+    rtol: float
+        Relative tolerance.
+    atol: float
+        Absolute tolerance.
+    max_n_steps: int
+        Maximum number of internal steps per call to `advance()`.
+    breakpoints: iterable of float
+        Times at which the right-hand side is discontinuous; no step crosses
+        them and the solver is cold restarted there.
+    band: tuple(int, int) or None
+        Lower and upper bandwidths of the Jacobian; a banded finite difference
+        Jacobian costs `sum(band)+1` right-hand side evaluations whatever the
+        number of unknowns (e.g. block diagonal stacked systems). With `band`,
+        `jac` returns the Jacobian in packed (LAPACK) banded form,
+        `jac_packed[upper+i-j, j] = df_i/du_j`, of shape `(sum(band)+1, n)`.
+    events: iterable of Event
+        Events located during the integration.
+
+    Attributes
+    ----------
+    n_rhs: int
+        Number of right-hand side evaluations.
+    n_jac: int
+        Number of Jacobian evaluations.
+    n_steps: int
+        Number of internal steps.
+    n_resets: int
+        Number of (cold) restarts.
+    n_events: int
+        Number of events that occurred.
+    """
+
+    methods = ('odeint', 'lsoda', 'bdf', 'radau', 'exponential')
+
+    def __init__(self, f_vec, jac=None, method='odeint', rtol=1e-7, atol=1e-8,
+                 max_n_steps=1500, breakpoints=(), band=None, events=()):
+
+        assert method in self.methods, 'method = %r; not in %r'%(method, self.methods)
+        assert jac is not None or method != 'exponential'
+
+        self.f_vec = f_vec
+        self.jac = jac
+        self.method = method
+        self.rtol = rtol
+        self.atol = atol
+        self.max_n_steps = max_n_steps
+        self.breakpoints = sorted(breakpoints)
+        self.band = band
+        self.events = list(events)
+
+        self.n_rhs = 0
+        self.n_jac = 0
+        self.n_steps = 0
+        self.n_resets = 0
+        self.n_events = 0
+
+        self.time = None
+        self.u_vec = None
+
+        self.__solver = None
+        self.__step_size = None # exponential method
+
+    def reset(self, time, u_vec):
+        """Cold (re)start from state `u_vec` at `time`.
+
+        Must be called before the first `advance()` and whenever the state or the
+        right-hand side change discontinuously.
+        """
+
+        self.time = time
+        self.u_vec = np.array(u_vec, dtype=np.float64)
+
+        self.__solver = None
+        self.__step_size = None
+
+        self.n_resets += 1
+
+    def close(self):
+        """Release the solver object and the right-hand side callables.
+
+        A closed integrator only keeps its configuration and counters, and is
+        picklable (e.g. when Cortix returns the module to the parent process).
+        """
+
+        self.f_vec = None
+        self.jac = None
+        self.events = list()
+
+        self.__solver = None
+        self.__step_size = None
+        self.u_vec = None
+
+    def advance(self, end_time):
+        """Integrate from the current time to `end_time` and return the state.
+        """
+
+        assert self.u_vec is not None, 'reset() must be called first.'
+        assert end_time > self.time
+
+        stop_times = [t for t in self.breakpoints if self.time < t < end_time]
+        stop_times.append(end_time)
+
+        for stop_time in stop_times:
+
+            while self.time < stop_time:
+
+                (time_0, u_0) = (self.time, self.u_vec)
+
+                # Stop at the first event, if any
+                if self.method == 'odeint':
+                    self.__advance_odeint(stop_time)
+                    # no dense output: the event is located by re-integration
+                    located = self.__locate_event(time_0, u_0, stop_time, self.u_vec,
+                                                  lambda t: self.__solve(time_0, u_0, t))
+                elif self.method == 'exponential':
+                    located = self.__advance_exponential(stop_time)
+                else:
+                    located = self.__advance_solver(stop_time)
+
+                if located is not None:
+                    (event, self.time, self.u_vec) = located
+                    self.__fire(event)
+                    continue
+
+                self.time = stop_time
+
+                if stop_time != end_time:
+                    self.reset(self.time, self.u_vec)
+
+        return self.u_vec
+
+    def __locate_event(self, time_0, u_0, time_1, u_1, solution):
+        """First event in the interval [time_0, time_1] given the end states and
+           the continuous `solution(t)`; returns (event, time, state) or None.
+        """
+
+        first = None
+
+        for event in self.events:
+
+            if not event.active:
+                continue
+
+            g_0 = event.func(u_0, time_0)
+            g_1 = event.func(u_1, time_1)
+
+            if not event.crossed(g_0, g_1):
+                continue
+
+            if g_1 == 0.0:
+                time = time_1
+            else:
+                time = brentq(lambda t: event.func(solution(t), t), time_0, time_1,
+                              xtol=1e-9*max(1.0, abs(time_1)))
+
+            if first is None or time < first[1]:
+                first = (event, time)
+
+        if first is None:
+            return None
+
+        (event, time) = first
+
+        return (event, time, np.array(solution(time), dtype=np.float64))
+
+    def __fire(self, event):
+        """Apply the event at the current time and cold restart.
+        """
+
+        event.times.append(self.time)
+        self.n_events += 1
+
+        u_vec = self.u_vec
+        if event.action is not None:
+            u_new = event.action(self.time, u_vec)
+            if u_new is not None:
+                u_vec = u_new
+
+        self.reset(self.time, u_vec)
+
+    def __solve(self, time_0, u_0, time):
+        """State at `time` integrated from `u_0` at `time_0` (event location).
+        """
+
+        if time == time_0:
+            return u_0
+
+        (ml, mu) = self.band if self.band else (None, None)
+
+        (u_vec_hist, info_dict) = odeint(self.f_vec, u_0, [time_0, time],
+                                         Dfun=self.jac, ml=ml, mu=mu,
+                                         rtol=self.rtol, atol=self.atol,
+                                         mxstep=self.max_n_steps,
+                                         full_output=True, tfirst=False)
+
+        assert info_dict['message'] == 'Integration successful.', info_dict['message']
+
+        self.n_rhs += int(info_dict['nfe'][-1])
+        self.n_jac += int(info_dict['nje'][-1])
+        self.n_steps += int(info_dict['nst'][-1])
+
+        return u_vec_hist[1, :]
+
+    def __advance_odeint(self, end_time):
+
+        (ml, mu) = self.band if self.band else (None, None)
+
+        (u_vec_hist, info_dict) = odeint(self.f_vec, self.u_vec,
+                                         [self.time, end_time],
+                                         Dfun=self.jac, ml=ml, mu=mu,
+                                         rtol=self.rtol, atol=self.atol,
+                                         mxstep=self.max_n_steps,
+                                         full_output=True, tfirst=False)
+
+        assert info_dict['message'] == 'Integration successful.', info_dict['message']
+
+        self.n_rhs += int(info_dict['nfe'][-1])
+        self.n_jac += int(info_dict['nje'][-1])
+        self.n_steps += int(info_dict['nst'][-1])
+
+        self.u_vec = u_vec_hist[1, :]
+
+    def __advance_solver(self, end_time):
+
+        solver = self.__solver
+
+        if solver is not None and self.method == 'lsoda' and \
+           not _set_lsoda_critical_time(solver, end_time):
+            # No warm restart with this scipy
+            self.n_resets += 1
+            solver = None
+
+        if solver is None:
+            solver = self.__new_solver(end_time)
+        else:
+            # Warm restart: move the integration bound; the solver never steps
+            # past it so the inputs of the next Cortix step are not anticipated
+            solver.t_bound = end_time
+            solver.status = 'running'
+
+        (n_rhs_0, n_jac_0) = (solver.nfev, solver.njev)
+
+        located = None
+
+        n_steps = 0
+        while solver.status == 'running':
+
+            (time_0, u_0) = (solver.t, np.array(solver.y))
+
+            message = solver.step()
+            assert solver.status != 'failed', message
+            n_steps += 1
+            assert n_steps <= self.max_n_steps, \
+                   'max_n_steps = %i exceeded at time %r'%(self.max_n_steps, solver.t)
+
+            if any(event.active for event in self.events):
+                located = self.__locate_event(time_0, u_0, solver.t, solver.y,
+                                              solver.dense_output())
+                if located is not None:
+                    break
+
+        self.n_rhs += solver.nfev - n_rhs_0
+        self.n_jac += solver.njev - n_jac_0
+        self.n_steps += n_steps
+
+        if located is None:
+            self.u_vec = np.array(solver.y)
+
+        return located
+
+    def __new_solver(self, end_time):
+
+        # The solvers keep references to the returned arrays
+        fun = lambda t, u: np.array(self.f_vec(u, t))
+
+        if self.jac is not None and self.band and self.method != 'lsoda':
+            jac = lambda t, u: self.__unpacked(self.jac(u, t)).tocsc()
+        elif self.jac is not None:
+            jac = lambda t, u: np.array(self.jac(u, t))
+        else:
+            jac = None
+
+        options = dict()
+        if self.band and self.method == 'lsoda':
+            (options['lband'], options['uband']) = self.band
+        elif self.band:
+            (lower, upper) = self.band
+            options['jac_sparsity'] = diags([1.0]*(lower+upper+1),
+                                            list(range(-lower, upper+1)),
+                                            shape=(self.u_vec.size, self.u_vec.size))
+
+        solver_class = {'lsoda': LSODA, 'bdf': BDF, 'radau': Radau}[self.method]
+
+        solver = solver_class(fun, self.time, self.u_vec, end_time, jac=jac,
+                              rtol=self.rtol, atol=self.atol, **options)
+
+        self.__solver = solver
+
+        return solver
+
+    def __advance_exponential(self, end_time):
+
+        time = self.time
+        u_vec = self.u_vec
+
+        step_size = self.__step_size
+        if step_size is None:
+            step_size = min(end_time - time, 1e-3)
+
+        n_steps = 0
+        while time < end_time:
+
+            step_size = min(step_size, end_time - time)
+
+            # Step doubling: one full step against two half steps
+            u_full = self.__exponential_euler(time, u_vec, step_size)
+            u_half = self.__exponential_euler(time, u_vec, step_size/2)
+            u_new = self.__exponential_euler(time + step_size/2, u_half, step_size/2)
+
+            scale = self.atol + self.rtol*np.maximum(np.abs(u_vec), np.abs(u_new))
+            error = np.linalg.norm((u_new - u_full)/scale/3.0)/math.sqrt(u_vec.size)
+
+            # Second order method: local error ~ h^3
+            factor = 0.9*error**(-1/3) if error > 0.0 else 5.0
+            factor = min(5.0, max(0.2, factor))
+
+            if error <= 1.0:
+
+                if any(event.active for event in self.events):
+                    # the exponential Euler step is the interpolant
+                    (time_0, u_0) = (time, u_vec)
+                    located = self.__locate_event(time_0, u_0, time + step_size, u_new,
+                                                  lambda t: self.__exponential_euler(
+                                                      time_0, u_0, t - time_0))
+                    if located is not None:
+                        self.n_steps += n_steps + 1
+                        return located
+
+                time += step_size
+                u_vec = u_new
+                n_steps += 1
+                assert n_steps <= self.max_n_steps, \
+                       'max_n_steps = %i exceeded at time %r'%(self.max_n_steps, time)
+
+            step_size *= factor
+
+        self.n_steps += n_steps
+
+        self.__step_size = step_size
+        self.u_vec = u_vec
+
+        return None
+
+    def __exponential_euler(self, time, u_vec, step_size):
+        r"""Exponential Rosenbrock-Euler step
+        :math:`u + h\,\varphi_1(hJ)\,f(u)`; :math:`h\,\varphi_1(hJ)\,f` is the last
+        column of the exponential of the augmented matrix
+        :math:`h\begin{pmatrix}J & f\\0 & 0\end{pmatrix}`.
+        """
+
+        n_unknowns = u_vec.size
+
+        mtrx = np.zeros((n_unknowns+1, n_unknowns+1), dtype=np.float64)
+        if self.band:
+            mtrx[:-1, :-1] = self.__unpacked(self.jac(u_vec, time)).toarray()
+        else:
+            mtrx[:-1, :-1] = self.jac(u_vec, time)
+        mtrx[:-1, -1] = self.f_vec(u_vec, time)
+        mtrx *= step_size
+
+        self.n_rhs += 1
+        self.n_jac += 1
+
+        return u_vec + expm(mtrx)[:-1, -1]
+
+    def __unpacked(self, jac_packed):
+        """Sparse matrix of a Jacobian in packed banded form.
+        """
+
+        (lower, upper) = self.band
+        n_unknowns = self.u_vec.size
+
+        return dia_matrix((np.array(jac_packed), list(range(upper, -lower-1, -1))),
+                          shape=(n_unknowns, n_unknowns))
+
+    def __str__(self):
+
+        return 'Integrator(%s): n_steps=%i, n_rhs=%i, n_jac=%i, n_resets=%i, '\
+               'n_events=%i'%(self.method, self.n_steps, self.n_rhs, self.n_jac,
+                              self.n_resets, self.n_events)
+
+def _set_lsoda_critical_time(solver, time):
+    """Move the critical time of the Fortran solver (itask=5) of a scipy `LSODA`
+       solver to `time`, as `LSODA.__init__()` sets it to `t_bound`.
+
+       This is private scipy state (`rwork[0]` of the `ode` integrator, as laid
+       out in scipy 1.x); False, and nothing changed, if it is not where and
+       what it is expected to be, in which case the solver must be cold
+       restarted.
+    """
+
+    if _SCIPY_MAJOR != 1:
+        return False
+
+    try:
+        integrator = solver._lsoda_solver._integrator
+        rwork = integrator.rwork
+        passed = integrator.call_args[4] is rwork
+    except (AttributeError, IndexError, TypeError):
+        return False
+
+    if not (passed and isinstance(rwork, np.ndarray) and rwork.size and
+            rwork[0] == solver.t_bound):
+        return False
+
+    rwork[0] = time
+
+    return True
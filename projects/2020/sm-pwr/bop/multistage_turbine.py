@@ -0,0 +1,520 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Cortix module"""
+
+import logging
+
+import numpy as np
+
+import iapws.iapws97 as steam_table
+
+from saturation import saturation_cache
+
+import unit
+
+from cortix import Module
+from history import PhaseHistory as Phase
+from history import reserve_histories
+from history import flush_histories
+from cortix import Quantity
+
+class MultiStageTurbine(Module):
+    """Multi-stage turbine with bleed extractions.
+
+    The steam expands through `len(extraction_pressures)+1` stages; stage `j`
+    exhausts at `extraction_pressures[j]` (the last one at `vent_pressure`) with
+    isentropic efficiency `stage_efficiencies[j]`. After each stage but the last,
+    the fraction `extraction_fractions[j]` of the inflow mass flowrate is bled
+    and condensed to saturated liquid in a feedwater heater.
+
+    The expansion line is computed in one pass over the stages (see
+    `expansion_line()`); the saturation states at the stage pressures are
+    computed once per configuration.
+
+    Notes
+    -----
+    These are the `port` names available in this module to connect to respective
+    modules: steamer, condenser, water heaters.
+    See instance attribute `port_names_expected`. Port `extraction-k` sends the
+    heating power of the bleed at the `k`-th extraction pressure (k = 1, 2, ...).
+
+    """
+
+    def __init__(self, extraction_pressures=(1.0*unit.mega*unit.pascal,
+                                             0.3*unit.mega*unit.pascal,
+                                             0.07*unit.mega*unit.pascal)):
+        """Constructor.
+
+        Parameters
+        ----------
+        extraction_pressures: tuple
+            Decreasing bleed (stage exhaust) pressures [Pa] above the vent
+            pressure; one `extraction-k` port is created for each.
+        """
+
+        super().__init__()
+
+        assert all(p_1 > p_2 for (p_1, p_2) in zip(extraction_pressures[:-1],
+                                                    extraction_pressures[1:]))
+
+        self.n_extractions = len(extraction_pressures)
+
+        self.port_names_expected = ['inflow', 'outflow', 'process-heat'] + \
+            ['extraction-%i'%(k+1) for k in range(self.n_extractions)]
+
+        # General attributes
+        self.initial_time = 0.0*unit.second
+        self.end_time = 1.0*unit.hour
+        self.time_step = 10.0*unit.second
+
+        self.show_time = (False, 10.0*unit.second)
+        self.save = True
+
+        self.log = logging.getLogger('cortix')
+        self.__logit = True # flag indicating when to log
+
+        # Domain attributes
+
+        # Configuration parameters
+
+        self.extraction_pressures = tuple(extraction_pressures)
+        self.stage_efficiencies = (0.7784,)*(self.n_extractions+1)
+        self.extraction_fractions = (0.05,)*self.n_extractions
+
+        self.vent_pressure = 0.008066866*unit.mega*unit.pascal
+
+        # Initialization
+
+        self.inflow_temp = 20+273.15 #K
+        self.inflow_pressure = 34*unit.bar
+        self.inflow_mass_flowrate = 67*unit.kg/unit.second
+        self.inflow_total_heat_pwr = 0.0*unit.watt
+
+        self.outflow_temp = 20+272.15 #K
+        self.outflow_pressure = self.vent_pressure
+        self.outflow_mass_flowrate = 67*unit.kg/unit.second
+        self.outflow_quality = 0.0
+
+        self.rejected_heat_pwr = 0.0*unit.mega*unit.watt
+        self.turbine_power = 0.0*unit.mega*unit.watt
+        self.extraction_heat_pwrs = np.zeros(self.n_extractions)
+
+        self.stage_qualities = np.zeros(self.n_extractions+1) # stage exhaust qualities
+
+        self.__saturation = None # (stage pressures [MPa], saturation states)
+
+        # Outflow phase history
+        quantities = list()
+
+        flowrate = Quantity(name='flowrate',
+                            formal_name='q', unit='kg/s',
+                            value=self.outflow_mass_flowrate,
+                            latex_name=r'$q$',
+                            info='Turbine Outflow Mass Flowrate')
+
+        quantities.append(flowrate)
+
+        temp = Quantity(name='temp',
+                        formal_name='T', unit='K',
+                        value=self.outflow_temp,
+                        latex_name=r'$T$',
+                        info='Turbine Outflow Temperature')
+
+        quantities.append(temp)
+
+        pressure = Quantity(name='pressure',
+                        formal_name='P', unit='Pa',
+                        value=self.vent_pressure,
+                        latex_name=r'$P$',
+                        info='Turbine Outflow Pressure')
+
+        quantities.append(pressure)
+
+        quality = Quantity(name='quality',
+                         formal_name='X', unit='',
+                         value=self.outflow_quality,
+                         latex_name=r'$X$',
+                         info='Turbine Exit Steam Quality')
+
+        quantities.append(quality)
+
+        self.outflow_phase = Phase(time_stamp=self.initial_time,
+                                   time_unit='s', quantities=quantities)
+
+        # Turbine phase history
+        quantities = list()
+
+        power = Quantity(name='power',
+                         formal_name='W_s', unit='W$_e$',
+                         value=0.0,
+                         latex_name=r'$W_s$',
+                         info='Turbine Power')
+
+        quantities.append(power)
+
+        rejected_heat_pwr = Quantity(name='rejected-heat',
+                         formal_name='Q', unit='W',
+                         value=0.0,
+                         latex_name=r'$\dot{Q}$',
+                         info='Turbine Rejected Heat Power')
+
+        quantities.append(rejected_heat_pwr)
+
+        for k in range(self.n_extractions):
+
+            extraction_heat_pwr = Quantity(name='extraction-heat-%i'%(k+1),
+                             formal_name='Q_%i'%(k+1), unit='W',
+                             value=0.0,
+                             latex_name=r'$\dot{Q}_{%i}$'%(k+1),
+                             info='Turbine Extraction %i Heating Power'%(k+1))
+
+            quantities.append(extraction_heat_pwr)
+
+        self.state_phase = Phase(time_stamp=self.initial_time,
+                                 time_unit='s', quantities=quantities)
+
+    def run(self, *args):
+
+        # Some logic for logging time stamps
+        if self.initial_time + self.time_step > self.end_time:
+            self.end_time = self.initial_time + self.time_step
+
+        reserve_histories(self)
+
+        time = self.initial_time
+
+        print_time = self.initial_time
+        print_time_step = self.show_time[1]
+
+        if print_time_step < self.time_step:
+            print_time_step = self.time_step
+
+        while time <= self.end_time:
+
+            if self.show_time[0] and \
+               (print_time <= time < print_time+print_time_step):
+
+                msg = self.name+'::run():time[m]='+ str(round(time/unit.minute, 1))
+                self.log.info(msg)
+
+                self.__logit = True
+                print_time += self.show_time[1]
+
+            else:
+                self.__logit = False
+
+            # Evolve one time step
+            #---------------------
+            time = self.__step(time)
+
+            # Communicate information
+            #------------------------
+            self.__call_ports(time)
+
+        self.end_time = time # correct the final time if needed
+
+        flush_histories(self) # on-disk stores, if streamed
+
+    def __call_ports(self, time):
+
+        # Interactions in the inflow port
+        #----------------------------------------
+        # One way "from" inflow
+
+        # Receive from
+        if self.get_port('inflow').connected_port:
+
+            self.send(time, 'inflow')
+
+            (check_time, inflow) = self.recv('inflow')
+            assert abs(check_time-time) <= 1e-6
+
+            self.inflow_temp = inflow['temperature']
+            self.inflow_pressure = inflow['pressure']
+            self.inflow_mass_flowrate = inflow['mass_flowrate']
+            self.inflow_total_heat_pwr = inflow['total_heat_power']
+
+            # Adaptive time step set upstream
+            self.time_step = inflow.get('time_step', self.time_step)
+
+        # Interactions in the outflow port
+        #-----------------------------------------
+        # One way "to" outflow
+
+        # Send to
+        if self.get_port('outflow').connected_port:
+
+            msg_time = self.recv('outflow')
+
+            outflow = dict()
+            outflow['temperature'] = self.outflow_phase.get_value('temp', msg_time)
+            outflow['pressure'] = self.vent_pressure
+            outflow['mass_flowrate'] = self.outflow_phase.get_value('flowrate', msg_time)
+            outflow['quality'] = self.outflow_phase.get_value('quality', msg_time)
+            outflow['time_step'] = self.time_step
+
+            self.send((msg_time, outflow), 'outflow')
+
+        # Interactions in the process-heat port
+        #-----------------------------------------
+        # One way "to" process-heat
+
+        # Send to
+        if self.get_port('process-heat').connected_port:
+
+            msg_time = self.recv('process-heat')
+
+            self.send((msg_time, self.rejected_heat_pwr), 'process-heat')
+
+        # Interactions in the extraction ports
+        #-----------------------------------------
+        # One way "to" extraction-k
+
+        # Send to
+        for k in range(self.n_extractions):
+
+            port_name = 'extraction-%i'%(k+1)
+
+            if self.get_port(port_name).connected_port:
+
+                msg_time = self.recv(port_name)
+
+                heat_pwr = self.state_phase.get_value('extraction-heat-%i'%(k+1), msg_time)
+
+                self.send((msg_time, heat_pwr), port_name)
+
+    def __step(self, time=0.0):
+
+        assert len(self.extraction_pressures) == self.n_extractions
+        assert len(self.stage_efficiencies) == self.n_extractions+1
+        assert len(self.extraction_fractions) == self.n_extractions
+        assert sum(self.extraction_fractions) < 1.0
+
+        # Check for valid intervals
+        p_in_min = 6.1121e-4*unit.mega*unit.pascal
+        p_in_max = 22.064*unit.mega*unit.pascal
+        assert p_in_min <= self.inflow_pressure <= p_in_max
+
+        assert 19+273.15 <= self.inflow_temp <= 800+273.15, 'inflow temp = %r'%self.inflow_temp
+
+        # Get state values
+        p_in_MPa = self.inflow_pressure/unit.mega/unit.pascal
+
+        press = np.array((self.inflow_pressure,) + self.extraction_pressures +
+                         (self.vent_pressure,))/unit.mega/unit.pascal
+
+        assert np.all(np.diff(press) < 0), 'stage pressures not decreasing: %r'%press
+
+        fractions = np.array(self.extraction_fractions)
+
+        # If entering stream is not steam (valve closed scenario)
+        if self.inflow_temp < saturation_cache.liquid(p_in_MPa).T:
+            t_runoff = self.inflow_temp
+            turbine_power = 0
+            quality = 0
+            self.extraction_heat_pwrs = np.zeros(self.n_extractions)
+            self.stage_qualities = np.zeros(self.n_extractions+1)
+
+        else:
+            sat = self.__stage_saturation(press)
+
+            state = steam_table._Region2(self.inflow_temp, p_in_MPa)
+
+            (enthalpy, _, qualities) = expansion_line(state['h'], state['s'], press,
+                                                      np.array(self.stage_efficiencies), sat)
+
+            # Mass flowrate through each stage
+            flowrates = self.inflow_mass_flowrate * \
+                        (1 - np.concatenate(([0.0], np.cumsum(fractions))))
+
+            turbine_power = np.sum(flowrates * -np.diff(enthalpy)) * unit.kilo*unit.watt
+
+            # Bleeds condensed to saturated liquid at the extraction pressures
+            self.extraction_heat_pwrs = self.inflow_mass_flowrate * fractions * \
+                np.maximum(enthalpy[1:-1] - sat['h_f'][1:-1], 0.0) * unit.kilo*unit.watt
+
+            # Exhaust
+            if qualities[-1] <= 0.0:
+                t_runoff = steam_table._Backward1_T_Ph(press[-1], enthalpy[-1])
+            elif qualities[-1] >= 1.0:
+                t_runoff = steam_table._Backward2_T_Ph(press[-1], enthalpy[-1])
+            else:
+                t_runoff = sat['T'][-1]
+
+            quality = min(max(qualities[-1], 0.0), 1.0)
+
+            self.stage_qualities = np.clip(qualities[1:], 0.0, 1.0)
+
+        self.turbine_power = turbine_power
+        self.outflow_mass_flowrate = self.inflow_mass_flowrate*(1 - np.sum(fractions))
+
+        # Update state variables
+        turbine_outflow = self.outflow_phase.get_row(time)
+        turbine = self.state_phase.get_row(time)
+
+        time += self.time_step
+
+        self.outflow_phase.add_row(time, turbine_outflow)
+
+        self.outflow_phase.set_value('temp', t_runoff, time)
+        self.outflow_phase.set_value('flowrate', self.outflow_mass_flowrate, time)
+        self.outflow_phase.set_value('quality', quality, time)
+        self.outflow_phase.set_value('pressure', self.vent_pressure, time)
+
+        self.state_phase.add_row(time, turbine)
+
+        self.state_phase.set_value('power', turbine_power, time)
+        self.rejected_heat_pwr = self.inflow_total_heat_pwr - turbine_power - \
+                                 np.sum(self.extraction_heat_pwrs)
+        self.state_phase.set_value('rejected-heat', self.rejected_heat_pwr, time)
+
+        for (k, heat_pwr) in enumerate(self.extraction_heat_pwrs):
+            self.state_phase.set_value('extraction-heat-%i'%(k+1), heat_pwr, time)
+
+        return time
+
+    def __stage_saturation(self, press):
+        """Saturation states at the stage pressures `press` [MPa]; recomputed
+           only when the pressures change.
+        """
+
+        if self.__saturation is None or not np.array_equal(self.__saturation[0], press):
+            self.__saturation = (press, stage_saturation(press))
+
+        return self.__saturation[1]
+
+def stage_saturation(press):
+    """Saturation states at the pressures `press` [MPa].
+
+    Returns
+    -------
+    sat: dict(numpy.ndarray)
+        Saturation temperature 'T' [K], liquid and vapor enthalpies 'h_f',
+        'h_g' [kJ/kg] and entropies 's_f', 's_g' [kJ/kg-K] at `press`.
+    """
+
+    bubl = [steam_table._Region4(p, 0) for p in press]
+    dew = [steam_table._Region4(p, 1) for p in press]
+
+    return {'T': np.array([state['T'] for state in bubl]),
+            'h_f': np.array([state['h'] for state in bubl]),
+            'h_g': np.array([state['h'] for state in dew]),
+            's_f': np.array([state['s'] for state in bubl]),
+            's_g': np.array([state['s'] for state in dew])}
+
+def expansion_line(h_in, s_in, press, efficiencies, sat):
+    """Expansion line through the stages of a turbine.
+
+    Stage `j` expands from `press[j]` to `press[j+1]` with isentropic efficiency
+    `efficiencies[j]`. Within the two phase dome the isobars are straight in the
+    h-s plane (dh = T ds), so each wet stage is an affine map of the inlet
+    enthalpy and the wet part of the line follows from cumulative products and
+    sums over the stages. Superheated (or subcooled) stages are computed one at
+    a time with the region 1/2 equations; there are few of them in practice.
+
+    Parameters
+    ----------
+    h_in: float
+        Inflow enthalpy [kJ/kg].
+    s_in: float
+        Inflow entropy [kJ/kg-K].
+    press: numpy.ndarray
+        Decreasing stage pressures [MPa], inflow pressure first.
+    efficiencies: numpy.ndarray
+        Stage isentropic efficiencies, `press.size-1` values.
+    sat: dict(numpy.ndarray)
+        Saturation states at `press` (see `stage_saturation()`).
+
+    Returns
+    -------
+    (h, s, quality): tuple(numpy.ndarray)
+        Enthalpy [kJ/kg], entropy [kJ/kg-K] and quality (< 0 subcooled, > 1
+        superheated) at `press`.
+    """
+
+    n_stages = press.size - 1
+
+    assert efficiencies.size == n_stages
+
+    h = np.empty(press.size)
+    s = np.empty(press.size)
+
+    (h[0], s[0]) = (h_in, s_in)
+
+    j = 0
+    while j < n_stages:
+
+        if sat['h_f'][j] <= h[j] <= sat['h_g'][j]:
+
+            _wet_line(h, s, j, efficiencies, sat)
+
+            # First stage leaving the dome, if any, is recomputed below
+            out = (h[j+1:] < sat['h_f'][j+1:]) | (h[j+1:] > sat['h_g'][j+1:])
+            if not np.any(out):
+                break
+            j += int(np.argmax(out))
+
+        (h[j+1], s[j+1]) = _stage(h[j], s[j], press[j+1], efficiencies[j], sat, j+1)
+        j += 1
+
+    quality = (h - sat['h_f'])/(sat['h_g'] - sat['h_f'])
+
+    return (h, s, quality)
+
+def _wet_line(h, s, j, efficiencies, sat):
+    """Fill `h[j+1:]`, `s[j+1:]` from the wet state `h[j]` assuming all stages
+       from `j` on exhaust within the dome:
+       h[i+1] = a[i] h[i] + b[i].
+    """
+
+    h_f = sat['h_f'][j:]
+    s_f = sat['s_f'][j:]
+    eff = efficiencies[j:]
+
+    # Slope of the isobars within the dome (the saturation temperature, to the
+    # consistency of the region 4 states)
+    slope = (sat['h_g'][j:] - h_f)/(sat['s_g'][j:] - s_f)
+
+    # Isentropic exhaust enthalpy: h_f[i+1] + slope[i+1] (s[i] - s_f[i+1])
+    # with s[i] = s_f[i] + (h[i] - h_f[i])/slope[i]
+    ratio = slope[1:]/slope[:-1]
+    a = 1 - eff + eff*ratio
+    b = eff*(h_f[1:] + slope[1:]*(s_f[:-1] - s_f[1:]) - ratio*h_f[:-1])
+
+    a_prod = np.cumprod(a)
+
+    h[j+1:] = a_prod*(h[j] + np.cumsum(b/a_prod))
+    s[j+1:] = s_f[1:] + (h[j+1:] - h_f[1:])/slope[1:]
+
+def _stage(h_in, s_in, press, efficiency, sat, i):
+    """Exhaust (h, s) of one stage expanding from (`h_in`, `s_in`) to `press`
+       [MPa]; `i` indexes the exhaust saturation states in `sat`.
+    """
+
+    (h_f, h_g, s_f, s_g) = (sat['h_f'][i], sat['h_g'][i], sat['s_f'][i], sat['s_g'][i])
+
+    # Isentropic exhaust
+    if s_in > s_g:
+        temp = steam_table._Backward2_T_Ps(press, s_in)
+        h_ideal = steam_table._Region2(temp, press)['h']
+    elif s_in < s_f:
+        temp = steam_table._Backward1_T_Ps(press, s_in)
+        h_ideal = steam_table._Region1(temp, press)['h']
+    else:
+        h_ideal = h_f + (s_in - s_f)/(s_g - s_f)*(h_g - h_f)
+
+    h_out = h_in - efficiency*(h_in - h_ideal)
+
+    # Real exhaust
+    if h_out > h_g:
+        temp = steam_table._Backward2_T_Ph(press, h_out)
+        s_out = steam_table._Region2(temp, press)['s']
+    elif h_out < h_f:
+        temp = steam_table._Backward1_T_Ph(press, h_out)
+        s_out = steam_table._Region1(temp, press)['s']
+    else:
+        s_out = s_f + (h_out - h_f)/(h_g - h_f)*(s_g - s_f)
+
+    return (h_out, s_out)
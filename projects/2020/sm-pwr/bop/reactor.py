@@ -32,18 +32,26 @@
 import logging
 
 import math
-from scipy.integrate import odeint
 import numpy as np
 
 import unit
 
 from iapws import IAPWS97 as WaterProps
 
+from scipy.optimize import brentq
+
+from saturation import saturation_cache
+from integrator import Integrator, Event
+from checkpoint import Checkpoint
+from heat_transfer import dittus_boelter, nucleate_boiling
+
 from cortix import Module
-from cortix.support.phase_new import PhaseNew as Phase
+from history import PhaseHistory as Phase
+from history import reserve_histories
+from history import flush_histories
 from cortix import Quantity
 
-class SMPWR(Module):
+class SMPWR(Checkpoint, Module):
     """Small modular pressurized boiling water single-point reactor.
 
     Notes
@@ -52,8 +60,20 @@ class SMPWR(Module):
     modules: steam generator.
     See instance attribute `port_names_expected`.
 
+    The model equations are the pure functions `smpwr_rhs()` and
+    `smpwr_prompt_neutron_dens()` (reduced kinetics) of the state and of the
+    parameters returned by `parameters()`; the module records the
+    `smpwr_diagnostics()` at the end of each time step. The same functions
+    integrate the stacked members of `reactor_ensemble.SMPWREnsemble`.
+
+    The run can be checkpointed and restarted; see `checkpoint.Checkpoint`.
+
     """
 
+    # the integrator holds bound methods; the property tables are configuration
+    # (set the same `water_props` before restarting)
+    checkpoint_exclude = Checkpoint.checkpoint_exclude + ('integrator', 'water_props')
+
     def __init__(self):
         """Constructor.
 
@@ -81,6 +101,26 @@ class SMPWR(Module):
 
         self.shutdown = (False, 10*unit.minute)
 
+        # Scram on high core temperature: (on/off, trip temperature). Shutdown and
+        # scram are integrator events; the integration stops exactly at the trip
+        # and restarts from the shutdown model.
+        self.scram = (False, (330+273.15)*unit.K)
+
+        # Adaptive time stepping: (on/off, minimum, maximum time step). The
+        # reactor sets the time step of the network; it is sent through the
+        # coolant-outflow port and adopted by the connected modules. The step
+        # grows while the relative change of the state and inflow quantities per
+        # step stays below `time_step_rtol`, and is cut to the minimum at
+        # breakpoints (shutdown, and events received through coolant-inflow).
+        self.adaptive_time_step = (False, 1.5*unit.second, 1.0*unit.minute)
+        self.time_step_rtol = 1e-3
+
+        # Checkpoint: (on/off, time, file name). The state is saved at the end of
+        # the time step reaching the checkpoint time, where the integrator is
+        # cold restarted so that a run restarted with `load_checkpoint()`
+        # reproduces the uninterrupted run.
+        self.checkpoint = (False, 30*unit.minute, 'smpwr.ckpt')
+
         # Configuration parameters
         self.discard_tau_recording_before = 2*unit.minute
 
@@ -127,6 +167,39 @@ class SMPWR(Module):
 
         self.coolant_quality = 0.0 # not used; to be used in heat flux correlations
 
+        # Half widths of the regime transitions of the heat transfer correlations
+        # (see heat_transfer): (ln Re, wall superheat [K]); 0 for sharp switches
+        self.regime_blend = (0.0, 0.0)
+
+        # Coolant property backend: IAPWS97 or any callable with its signature
+        # (e.g. water_table.WaterTable)
+        self.water_props = WaterProps
+
+        # ODE integrator: one of integrator.Integrator.methods; the solver is
+        # kept across time steps and cold restarted when the boundary conditions
+        # (inflow temperature, pressure, reactivity) change by more than
+        # `ode_restart_rtol`
+        self.ode_method = 'odeint'
+        self.ode_restart_rtol = 1e-2
+        self.integrator = None
+
+        # Neutron kinetics model
+        #   'full':         point kinetics with the neutron density equation
+        #   'prompt-jump':  prompt jump approximation; the neutron density is
+        #                   algebraic (Lambda dn/dt = 0) and the prompt time scale
+        #                   is removed from the ODE system
+        #   'quasi-static': prompt jump with the first order correction
+        #                   Lambda dn/dt; dn/dt is taken from the previous time
+        #                   step and frozen over the step
+        # Approximate models start after the neutron source pulse and are checked
+        # against the full model over one time step
+        # every `kinetics_check_interval`; when the relative difference in neutron
+        # density or temperatures exceeds `kinetics_check_rtol` the run falls back
+        # to the full model.
+        self.kinetics_mode = 'full'
+        self.kinetics_check_interval = 10*unit.minute
+        self.kinetics_check_rtol = 1e-2
+
         # Initialization
         self.n_dens_ref = 1.0
         self.q_0 = 1./self.gen_time # pulse neutron source
@@ -135,15 +208,17 @@ class SMPWR(Module):
         self.n_0 = 0.0 # neutronless steady state before start up
         self.rho_0 = rho_0_over_beta * self.beta # neutron source
 
-        lambda_vec = np.array(self.species_decay, dtype=np.float64)
-        beta_vec = np.array(self.species_rel_yield, dtype=np.float64) * self.beta
-        c_vec_0 = beta_vec/lambda_vec/self.gen_time * self.n_0
+        self.__setup_kinetics()
+
+        c_vec_0 = self.__beta_vec/self.__lambda_vec/self.gen_time * self.n_0
 
         self.temp_f_0 = self.temp_o + 20*unit.K
         self.temp_c_0 = self.temp_o + 20*unit.K
 
         self.inflow_cool_temp = self.temp_o + 20*unit.K
 
+        self.__flowrate_relaxation = self.flowrate_relaxation_startup
+
         # Derived quantities
 
         # Coolant outflow phase history
@@ -273,10 +348,63 @@ class SMPWR(Module):
 
     def run(self, *args):
 
+        # Kinetics data may have been changed after construction
+        self.__setup_kinetics()
+
+        max_n_steps_per_time_step = 1500 # max number of nonlinear algebraic solver
+                                         # iterations per time step
+
+        # Discontinuities of the right-hand side
+        breakpoints = [100*unit.milli] # end of the neutron source pulse
+
+        assert self.kinetics_mode in ('full', 'prompt-jump', 'quasi-static')
+
+        # Run state; restored from the checkpoint on restart
+        if not self.restarted:
+            self.__tripped = False
+            self.__flowrate_relaxation = self.flowrate_relaxation_startup
+
+            # Full kinetics until the neutron source pulse is over
+            self.__kinetics_mode = 'full'
+            self.__kinetics_fallback = False
+            self.__kinetics_check_time = self.initial_time
+
+            self.__time_step_0 = self.time_step
+            self.__next_time_step = self.time_step
+            self.__breakpoints = set()
+            self.__time_step_inputs = None
+
+        # A trip occurs once
+        events = list()
+        if self.shutdown[0] and not self.__tripped:
+            events.append(Event(self.__shutdown_func, self.__trip, direction=1))
+        if self.scram[0] and not self.__tripped:
+            events.append(Event(self.__scram_func, self.__trip, direction=1))
+
+        self.integrator = Integrator(self.__f_vec, self.__jac, method=self.ode_method,
+                                     rtol=1e-7, atol=1e-8,
+                                     max_n_steps=max_n_steps_per_time_step,
+                                     breakpoints=breakpoints, events=events)
+        if self.__kinetics_mode != 'full':
+            self.integrator.f_vec = self.__f_vec_reduced
+            self.integrator.jac = self.__jac_reduced
+        self.__ode_inputs = None
+
         # Some logic for logging time stamps
         if self.initial_time + self.time_step > self.end_time:
             self.end_time = self.initial_time + self.time_step
 
+        reserve_histories(self)
+
+        # Time step control
+        self.__breakpoints.add(self.end_time)
+        if self.shutdown[0]:
+            self.__breakpoints.add(self.shutdown[1])
+        if self.checkpoint[0]:
+            self.__breakpoints.add(self.checkpoint[1])
+
+        self.restarted = False
+
         time = self.initial_time
 
         print_time = self.initial_time
@@ -301,20 +429,144 @@ class SMPWR(Module):
 
             # Evolve one time step
             #---------------------
+            self.time_step = self.__next_time_step
+
             time = self.__step(time)
 
             # Communicate information
             #------------------------
             self.__call_ports(time)
 
-            # Shudown procedure
-            #------------------
-            if self.shutdown[0] and time > self.shutdown[1]:
-                self.rho_0 = -1.0
-                self.species_rel_yield = len(self.species_rel_yield)*[0.0]
+            if self.checkpoint[0] and \
+               time - self.time_step < self.checkpoint[1] <= time:
+                self.save_checkpoint(self.checkpoint[2], time)
+                self.__ode_inputs = None # cold restart as after a restart
 
         self.end_time = time # correct the final time if needed
 
+        flush_histories(self) # on-disk stores, if streamed
+        self.time_step = self.__time_step_0
+
+        if self.show_time[0]:
+            self.log.info(self.name+'::run(): '+str(saturation_cache))
+            self.log.info(self.name+'::run(): '+str(self.integrator))
+
+        self.integrator.close() # keep the counters only
+
+    def steady_state(self, inflow_temp=None, power=None):
+        """Equilibrium of the reactor at a given coolant inflow temperature.
+
+        The delayed neutron emitters are in equilibrium with the neutron density,
+        the flowrate is at its steady state value, and the core and coolant
+        energy balances hold. Without `power` the reactivity `rho_0` is kept and
+        the power follows from criticality; with `power` the reactivity `rho_0`
+        that makes the reactor critical at that power is computed.
+
+        Parameters
+        ----------
+        inflow_temp: float or None
+            Coolant inflow temperature [K]; default `inflow_cool_temp`.
+        power: float or None
+            Reactor thermal power [W].
+
+        Returns
+        -------
+        (u_vec, rho_0): tuple
+            State vector (ordered as in the ODE system) and reference reactivity.
+        """
+
+        if inflow_temp is None:
+            inflow_temp = self.inflow_cool_temp
+
+        inflow_cool_temp = self.inflow_cool_temp
+        self.inflow_cool_temp = inflow_temp
+
+        self.__params = self.parameters()
+
+        try:
+            if power is None:
+                (n_dens, temp_f, temp_c) = self.__critical_state(inflow_temp)
+                rho_0 = self.rho_0
+            else:
+                (n_dens, temp_f, temp_c) = self.__power_state(inflow_temp, power)
+                temp = (temp_f + temp_c)/2.0
+                rho_0 = self.rho_0 - _reactivity(n_dens, temp, self.__params)
+        finally:
+            self.inflow_cool_temp = inflow_cool_temp
+            self.__params = self.parameters()
+
+        u_vec = np.empty(self.__u_vec.size, dtype=np.float64)
+        u_vec[0] = n_dens
+        u_vec[1:-3] = self.__beta_vec/self.__lambda_vec/self.gen_time * n_dens
+        u_vec[-3] = self.coolant_mass_flowrate_ss
+        u_vec[-2] = temp_f
+        u_vec[-1] = temp_c
+
+        return (u_vec, rho_0)
+
+    def set_state(self, u_vec, inflow_temp, rho_0=None):
+        """Start the run from the state vector `u_vec` (e.g. a steady state)
+           instead of the neutronless cold state; the start up neutron source is
+           turned off.
+        """
+
+        time = self.initial_time
+
+        if rho_0 is not None:
+            self.rho_0 = rho_0
+
+        self.q_0 = 0.0
+
+        self.n_0 = u_vec[0]
+        self.temp_f_0 = u_vec[-2]
+        self.temp_c_0 = u_vec[-1]
+        self.inflow_cool_temp = inflow_temp
+
+        self.neutron_phase.set_value('neutron-dens', u_vec[0], time)
+        self.neutron_phase.set_value('delayed-neutrons-cc', u_vec[1:-3], time)
+
+        self.coolant_outflow_phase.set_value('flowrate', u_vec[-3], time)
+        self.coolant_outflow_phase.set_value('temp', u_vec[-1], time)
+
+        self.state_phase.set_value('core-temp', u_vec[-2], time)
+        self.state_phase.set_value('inlet-temp', inflow_temp, time)
+
+        water = self.__water(u_vec[-1])
+        cp_c = water['cp']*unit.kj/unit.kg/unit.K
+
+        self.state_phase.set_value('power', u_vec[-3]*cp_c*(u_vec[-1]-inflow_temp), time)
+
+    def parameters(self):
+        """Parameters of the reactor model `smpwr_rhs()`.
+
+        The kinetics, feedback, nuclear heating and heat transfer data, the
+        reference reactivity and flowrate relaxation (changed by a trip), and
+        the coolant inflow conditions. The parameters are kept over a time step.
+
+        Returns
+        -------
+        params: dict
+        """
+
+        params = dict()
+
+        for name in ('gen_time', 'beta', 'alpha_n', 'n_dens_ref', 'rho_0', 'q_0',
+                     'buckling', 'diff_coeff', 'k_infty', 'temp_o',
+                     'temp_c_ss_operation', 'n_dens_ss_operation', 'fis_energy',
+                     'sigma_f_o', 'fis_nuclide_num_dens', 'thermal_neutron_velo',
+                     'core_dens', 'cp_core', 'core_volume', 'core_heat_transfer_area',
+                     'coolant_volume', 'regime_blend', 'coolant_mass_flowrate_ss',
+                     'discard_tau_recording_before', 'inflow_cool_temp',
+                     'coolant_pressure'):
+            params[name] = getattr(self, name)
+
+        params['lambda_vec'] = np.array(self.species_decay, dtype=np.float64)
+        params['beta_vec'] = np.array(self.species_rel_yield, dtype=np.float64) * self.beta
+        params['diameter'] = (4*self.core_flow_area/math.pi)**.5
+        params['flowrate_relaxation'] = self.__flowrate_relaxation
+
+        return params
+
     def __call_ports(self, time):
 
         # Interactions in the coolant-outflow port
@@ -338,6 +590,9 @@ class SMPWR(Module):
             coolant_outflow['mass_flowrate'] = flowrate
             coolant_outflow['quality'] = chi
 
+            if self.adaptive_time_step[0]:
+                coolant_outflow['time_step'] = self.__next_time_step
+
             self.send((msg_time, coolant_outflow), 'coolant-outflow')
 
         # Interactions in the coolant-inflow port
@@ -357,6 +612,9 @@ class SMPWR(Module):
             self.coolant_pressure = inflow_coolant['pressure']
             self.coolant_quality = inflow_coolant['quality']
 
+            # Events of the network (e.g. malfunctions)
+            self.__breakpoints.update(inflow_coolant.get('breakpoints', ()))
+
     def __step(self, time=0.0):
         r"""ODE IVP problem.
         Given the initial data at :math:`t=0`,
@@ -374,22 +632,57 @@ class SMPWR(Module):
         None
         """
 
+        # Model parameters over the step (inflow conditions)
+        self.__params = self.parameters()
+
         # Get state values
         u_0 = self.__get_state_vector(time)
 
-        t_interval_sec = np.linspace(time, time+self.time_step, num=2)
+        # Cold restart of the integrator if needed
+        ode_inputs = np.array([self.inflow_cool_temp, self.coolant_pressure,
+                               self.rho_0])
 
-        max_n_steps_per_time_step = 1500 # max number of nonlinear algebraic solver
-                                         # iterations per time step
+        if self.__kinetics_mode != self.kinetics_mode and \
+           not self.__kinetics_fallback and time > 100*unit.milli:
+            self.__set_kinetics_mode(self.kinetics_mode, time, u_0)
+
+        reduced = self.__kinetics_mode != 'full'
+
+        if self.integrator.time != time or self.__ode_inputs is None or \
+           np.any(np.abs(ode_inputs - self.__ode_inputs) >
+                  self.ode_restart_rtol*np.abs(self.__ode_inputs)):
+            self.integrator.reset(time, u_0[1:] if reduced else u_0)
+            self.__ode_inputs = ode_inputs
 
-        (u_vec_hist, info_dict) = odeint(self.__f_vec, u_0, t_interval_sec,
-                                         rtol=1e-7, atol=1e-8,
-                                         mxstep=max_n_steps_per_time_step,
-                                         full_output=True, tfirst=False)
+        end_time = time + self.time_step
 
-        assert info_dict['message'] == 'Integration successful.', info_dict['message']
+        check = reduced and time >= self.__kinetics_check_time
+        if check:
+            u_ref = self.__full_kinetics_solution(time, u_0, end_time)
 
-        u_vec = u_vec_hist[1, :]  # solution vector at final time step
+        n_events = self.integrator.n_events
+
+        u_vec = self.integrator.advance(end_time)
+
+        tripped = self.integrator.n_events != n_events
+        if tripped:
+            # the reference solution does not include the trip; check later
+            check = False
+
+        if reduced:
+            n_dens = self.__prompt_neutron_dens(u_vec, end_time)
+            u_vec = np.insert(u_vec, 0, n_dens)
+
+        if check:
+            u_vec = self.__check_kinetics(u_vec, u_ref, end_time)
+
+        if self.__kinetics_mode == 'quasi-static':
+            # dn/dt across a trip is not representative of the next step
+            self.__n_dens_rate = 0.0 if tripped else (u_vec[0] - u_0[0])/self.time_step
+
+        if self.adaptive_time_step[0]:
+            self.__next_time_step = self.__new_time_step(end_time, u_0, u_vec,
+                                                         tripped)
 
         n_dens = u_vec[0]
         c_vec = u_vec[1:7]
@@ -417,281 +710,289 @@ class SMPWR(Module):
         self.state_phase.set_value('core-temp', core_temp, time)
         self.state_phase.set_value('inlet-temp', self.inflow_cool_temp, time)
 
-        # Coolant properties
-        water = WaterProps(T=cool_temp, P=self.coolant_pressure/unit.mega/unit.pascal)
-        if water.phase == 'Two phases':
-            qual = water.x
-            assert qual <= 0.4 # limit to low quality
-            #rho_c = (1-qual)*water.Liquid.rho + qual*water.Vapor.rho
-            rho_c = water.rho
-            cp_c = (1-qual)*water.Liquid.cp + qual*water.Vapor.cp
-            cp_c *= unit.kj/unit.kg/unit.K
-            mu_c = (1-qual)*water.Liquid.mu + qual*water.Vapor.mu
-            k_c = (1-qual)*water.Liquid.k + qual*water.Vapor.k
-            prtl_c = (1-qual)*water.Liquid.Prandt + qual*water.Vapor.Prandt
-        elif water.phase == 'Liquid':
-            rho_c = water.Liquid.rho
-            cp_c = water.Liquid.cp*unit.kj/unit.kg/unit.K
-            k_c = water.Liquid.k
-            mu_c = water.Liquid.mu
-            prtl_c = water.Liquid.Prandt
-        else:
-            assert False,'Vapor not allowed.'
+        # Diagnostics
+        water = self.__water(cool_temp)
 
-        # Reactor power
-        pwr = mass_flowrate*cp_c*(cool_temp-self.inflow_cool_temp)
+        diagnostics = smpwr_diagnostics(u_vec, time, self.__params, water)
 
-        if pwr <= 0: # case when reactor is heated by the coolant inflow
-            pwr = 0.0
-        self.state_phase.set_value('power', abs(pwr), time)
+        for name in ('power', 'reynolds', 'prandtl', 'heatflux', 'nusselt', 'tau'):
+            self.state_phase.set_value(name, diagnostics[name], time)
 
-        # Reynolds number
-        diameter = (4*self.core_flow_area/math.pi)**.5
-        rey_c = 4*mass_flowrate / mu_c / math.pi / diameter
-        self.state_phase.set_value('reynolds', rey_c, time)
+        # Coolant quality
+        if water['phase'] == 'Two phases':
+            quality = water['x']
+        else:
+            quality = diagnostics['quality']
 
-        # Prandtl number
-        self.state_phase.set_value('prandtl', prtl_c, time)
+        self.coolant_outflow_phase.set_value('quality', quality, time)
 
-        # Heat flux and Nusselt number
-        (heat_sink_rate, nusselt) = self.__heat_sink_rate(core_temp, water,
-                                                          mass_flowrate)
+        return time
 
-        q2prime = - heat_sink_rate/self.core_heat_transfer_area
-        if q2prime < 0.0: # case when reactor is heated by the coolant inflow
-            q2prime = 0.0
-        self.state_phase.set_value('heatflux', q2prime, time)
-        self.state_phase.set_value('nusselt', nusselt, time)
+    def __new_time_step(self, time, u_0, u_vec, tripped=False):
+        """Time step following the step that ended at `time`.
 
-        heat_rate_transfered = - heat_sink_rate
+           The error of holding the inflow conditions constant over a step is of
+           the order of their change per step; the step size is scaled by the
+           ratio of `time_step_rtol` to the largest relative change per step of
+           the neutron density, flowrate, temperatures and inflow conditions.
+           After a trip within the step the minimum step is used.
+        """
 
-        # Coolant quality 
-        # Coolant temperature is likely below saturation but there is quality in
-        # view of local nucleate boiling.
-        if water.phase == 'Liquid':
-            water_sat_l = WaterProps(P=self.coolant_pressure/unit.mega/unit.pascal, x=0)
-            water_sat_v = WaterProps(P=self.coolant_pressure/unit.mega/unit.pascal, x=1)
-            spfc_h_sat_l = water_sat_l.Liquid.h * unit.kj/unit.kg
-            spfc_h_sat_v = water_sat_v.Vapor.h * unit.kj/unit.kg
+        (_, min_time_step, max_time_step) = self.adaptive_time_step
 
-            heat_rate_latent = (spfc_h_sat_v-spfc_h_sat_l)*mass_flowrate
-            heat_rate_sensible = (water_sat_l.T-self.inflow_cool_temp)*cp_c*mass_flowrate
-        #print(heat_rate_transfered/unit.mega, heat_rate_sensible/unit.mega, heat_rate_latent/unit.mega)
-        #print((heat_rate_transfered-heat_rate_sensible)/(heat_rate_latent-heat_rate_sensible)*100)
+        inputs = np.array([self.inflow_cool_temp, self.coolant_pressure])
 
-            quality = (heat_rate_transfered-heat_rate_sensible)/\
-                      (heat_rate_latent-heat_rate_sensible)*100
+        # Relative change per step; neutron density relative to n_dens_ref
+        idx = [0, -3, -2, -1]
+        scale = np.maximum(np.abs(u_vec[idx]), [self.n_dens_ref, 1.0, 1.0, 1.0])
+        change = np.max(np.abs(u_vec[idx] - u_0[idx])/scale)
 
-            quality = quality if 0<=quality<=100 else 0
+        if self.__time_step_inputs is not None:
+            change = max(change, np.max(np.abs(inputs - self.__time_step_inputs)/
+                                        np.abs(inputs)))
+        self.__time_step_inputs = inputs
 
-        elif water.phase == 'Two phases':
-            quality = water.x
+        error = change/self.time_step_rtol
 
-        self.coolant_outflow_phase.set_value('quality', quality, time)
+        factor = 0.9/error if error > 0.0 else 2.0
+        time_step = self.time_step * min(2.0, max(0.5, factor))
 
-        # Coolant residence time
-        q_vol = mass_flowrate/rho_c
+        # Breakpoints: restart from the minimum step after an event and land on
+        # the next one
+        if tripped or any(abs(time - t) <= 1e-6 for t in self.__breakpoints):
+            time_step = min_time_step
 
-        tau = self.coolant_volume/q_vol \
-              if q_vol > 0 and time > self.discard_tau_recording_before else 0
+        time_step = min(max(time_step, min_time_step), max_time_step)
 
-        self.state_phase.set_value('tau', tau, time)
+        upcoming = [t for t in self.__breakpoints if time + 1e-6 < t < time + time_step]
+        if upcoming:
+            time_step = min(upcoming) - time
 
-        return time
+        return time_step
 
-    def __get_state_vector(self, time):
-        """Return a numpy array of all unknowns ordered as shown.
-           Neutron density, delayed neutron emmiter concentrations,
-           temperature of core, and temperature of coolant.
+    def __steady_rhs(self, n_dens, temp_f, temp_c):
+        """Right-hand side past the start up source pulse at an equilibrium
+           state of the delayed neutron emitters and flowrate.
         """
 
-        u_vec = np.empty(0, dtype=np.float64)
+        u_vec = np.empty(self.__u_vec.size, dtype=np.float64)
+        u_vec[0] = n_dens
+        u_vec[1:-3] = self.__beta_vec/self.__lambda_vec/self.gen_time * n_dens
+        u_vec[-3] = self.coolant_mass_flowrate_ss
+        u_vec[-2] = temp_f
+        u_vec[-1] = temp_c
 
-        neutron_dens = self.neutron_phase.get_value('neutron-dens', time)
-        u_vec = np.append(u_vec, neutron_dens)
+        return self.__f_vec(u_vec, math.inf)
 
-        delayed_neutrons_cc = self.neutron_phase.get_value('delayed-neutrons-cc', time)
-        u_vec = np.append(u_vec, delayed_neutrons_cc)
+    def __steady_coolant_temp(self, temp_f, inflow_temp, temp_sat):
+        """Coolant temperature that balances the heat from the core at
+           temperature `temp_f`.
+        """
 
-        flowrate = self.coolant_outflow_phase.get_value('flowrate', time)
-        u_vec = np.append(u_vec, flowrate)
+        temp_max = min(temp_f, temp_sat - 1e-6)
 
-        core_temp = self.state_phase.get_value('core-temp', time)
-        u_vec = np.append(u_vec, core_temp)
+        coolant_balance = lambda temp_c: self.__steady_rhs(0.0, temp_f, temp_c)[-1]
 
-        temp = self.coolant_outflow_phase.get_value('temp', time)
-        u_vec = np.append(u_vec, temp)
+        assert coolant_balance(temp_max) < 0.0, 'coolant at saturation'
 
-        return u_vec
+        return brentq(coolant_balance, inflow_temp, temp_max, xtol=1e-9)
 
-    def __alpha_tn_func(self, temp):
-        """Single energy group formula.
+    def __temp_f_root(self, func, temp_low, temp_sat):
+        """Root of the core balance `func(temp_f)`; the heat transfer coefficient
+           is discontinuous at the onset of nucleate boiling (temp_f = temp_sat)
+           so the single phase and boiling branches are bracketed separately.
         """
 
-        B2 = self.buckling
-        D = self.diff_coeff
-        k_infty = self.k_infty
-        Ea = .022  #/cm
-        To = self.temp_o
+        if func(temp_sat - 1e-6) < 0.0:
+            return brentq(func, temp_low, temp_sat - 1e-6, xtol=1e-9)
+
+        temp_high = temp_sat + 1.0
+        while func(temp_high) > 0.0:
+            temp_high += 10.0
+            assert temp_high < temp_sat + 500.0, 'no core temperature root'
 
-        alpha_tn = -1.0 / 2.0 * B2 * D / (k_infty * Ea * math.sqrt(To * temp))
+        return brentq(func, temp_sat + 1e-6, temp_high, xtol=1e-9)
 
-        return alpha_tn
+    def __critical_state(self, inflow_temp):
+        """Neutron density, core and coolant temperatures of the critical reactor.
+        """
 
-    def __rho_func(self, time, n_dens, temp):
-        """Reactivity function.
+        temp_sat = saturation_cache.liquid(self.coolant_pressure/unit.mega/unit.pascal).T
 
-        Parameters
-        ----------
-        t: float
-            Time.
-        temp_f: float
-            Temperature at time t.
-        params: dict
-            Dictionary of quantities.
+        def state(temp_f):
+            temp_c = self.__steady_coolant_temp(temp_f, inflow_temp, temp_sat)
+            # reactivity is linear in the neutron density
+            temp = (temp_f + temp_c)/2.0
+            n_dens = - _reactivity(0.0, temp, self.__params)/self.alpha_n
+            assert n_dens > 0.0, 'subcritical reactor'
+            return (n_dens, temp_f, temp_c)
 
-        Returns
-        -------
-        rho_t: float
-            Value of reactivity.
+        core_balance = lambda temp_f: self.__steady_rhs(*state(temp_f))[-2]
+
+        temp_f = self.__temp_f_root(core_balance, inflow_temp + 1e-3, temp_sat)
+
+        return state(temp_f)
 
-        Examples
-        --------
+    def __power_state(self, inflow_temp, power):
+        """Neutron density, core and coolant temperatures at a given power.
         """
 
-        temp_ref = self.temp_c_ss_operation
-        alpha_n = self.alpha_n
-        n_dens_ref = self.n_dens_ref
+        assert power > 0.0
 
-        alpha_tn = self.__alpha_tn_func(temp)
+        press_MPa = self.coolant_pressure/unit.mega/unit.pascal
+        temp_sat = saturation_cache.liquid(press_MPa).T
+        mass_flowrate = self.coolant_mass_flowrate_ss
 
-        rho_t = self.rho_0 + alpha_n * (n_dens - n_dens_ref) + \
-                alpha_tn * (temp - temp_ref)
+        def coolant_balance(temp_c):
+            cp_c = self.__water(temp_c)['cp']*unit.kj/unit.kg/unit.K
+            return power - mass_flowrate*cp_c*(temp_c - inflow_temp)
 
-        return rho_t
+        assert coolant_balance(temp_sat - 1e-6) < 0.0, 'coolant at saturation'
 
-    def __q_source(self, time):
-        """Neutron source delta function.
+        temp_c = brentq(coolant_balance, inflow_temp, temp_sat - 1e-6, xtol=1e-9)
 
-        Parameters
-        ----------
-        t: float
-            Time.
+        water = self.__water(temp_c)
 
-        Returns
-        -------
-        q: float
-            Value of source.
+        def heat_balance(temp_f):
+            (heat_sink_pwr, _) = _heat_sink_pwr(temp_f, temp_c, mass_flowrate,
+                                                self.__params, water)
+            return power + heat_sink_pwr
 
-        Examples
-        --------
-        """
+        temp_f = self.__temp_f_root(heat_balance, temp_c + 1e-3, temp_sat)
 
-        #broken on Mac/Windows if time <= 100*unit.milli*unit.second: # small time value
-        if time <= 100*unit.milli: # small time value
-            qval = self.q_0
-        else:
-            qval = 0.0
+        # nuclear power is linear in the neutron density
+        temp = (temp_f + temp_c)/2.0
+        pwr_dens = _nuclear_pwr_dens(temp, 1.0, self.__params)
 
-        return qval
+        n_dens = - power/self.core_volume/pwr_dens
 
-    def __sigma_fis_func(self, temp):
-        """Effective microscopic fission cross section.
+        return (n_dens, temp_f, temp_c)
+
+    def __shutdown_func(self, u_vec, time):
+        """Event function of the scheduled shutdown.
         """
 
-        sigma_f = self.sigma_f_o * math.sqrt(self.temp_o/temp) * \
-                  math.sqrt(math.pi)/2.0
+        return time - self.shutdown[1]
+
+    def __scram_func(self, u_vec, time):
+        """Event function of the high core temperature scram; the core
+           temperature is the second to last unknown in both the full and reduced
+           kinetics state vectors.
+        """
 
-        return sigma_f
+        return u_vec[-2] - self.scram[1]
 
-    def __nuclear_pwr_dens_func(self, time, temp, n_dens):
-        """Scaled nuclear power density.
+    def __trip(self, time, u_vec):
+        """Shutdown/scram action: negative reactivity insertion, delayed neutron
+           emitters decoupled, and the coolant flowrate relaxes to its shutdown
+           value. The state is continuous across the trip.
         """
 
-        rxn_heat = self.fis_energy # get fission reaction energy J per reaction
+        if self.__tripped:
+            return None
 
-        sigma_f = self.__sigma_fis_func(temp)
+        self.__tripped = True
 
-        fis_nuclide_num_dens = self.fis_nuclide_num_dens #  #/m3
+        self.rho_0 = -1.0
+        self.species_rel_yield = len(self.species_rel_yield)*[0.0]
+        self.__setup_kinetics()
 
-        macro_sigma_f = sigma_f * fis_nuclide_num_dens # macroscopic cross section
+        self.__flowrate_relaxation = self.flowrate_relaxation_shutdown
+        self.coolant_mass_flowrate_ss = 1.0*unit.kg/unit.second
 
-        v_o = self.thermal_neutron_velo # m/s
+        self.__params = self.parameters()
 
-        neutron_flux = n_dens * self.n_dens_ss_operation * v_o
+        self.log.info(self.name+'::run(): trip at time[m]='+
+                      str(round(time/unit.minute, 2)))
 
-        #reaction rate density
-        rxn_rate_dens = macro_sigma_f * neutron_flux
+        return None
 
-        # nuclear heating power density
-        q3prime = - rxn_heat * rxn_rate_dens # exothermic reaction W/m3)
+    def __get_state_vector(self, time):
+        """Return a numpy array of all unknowns ordered as shown.
+           Neutron density, delayed neutron emmiter concentrations,
+           temperature of core, and temperature of coolant.
+        """
 
-        return q3prime
+        u_vec = np.empty(self.__u_vec.size, dtype=np.float64)
 
-    def __f_vec(self, u_vec, time):
+        u_vec[0] = self.neutron_phase.get_value('neutron-dens', time)
+        u_vec[1:-3] = self.neutron_phase.get_value('delayed-neutrons-cc', time)
+        u_vec[-3] = self.coolant_outflow_phase.get_value('flowrate', time)
+        u_vec[-2] = self.state_phase.get_value('core-temp', time)
+        u_vec[-1] = self.coolant_outflow_phase.get_value('temp', time)
 
-        n_dens = u_vec[0] # get neutron dens
+        return u_vec
 
-        c_vec = u_vec[1:-3] # get delayed neutron emitter concentration
+    def __setup_kinetics(self):
+        """Precompute the constant data of the kinetics kernel and allocate the
+           work arrays of the ODE Jacobian.
+        """
 
-        mass_flowrate = u_vec[-3]
+        self.__lambda_vec = np.array(self.species_decay, dtype=np.float64)
+        self.__beta_vec = np.array(self.species_rel_yield, dtype=np.float64) * self.beta
 
-        temp_f = u_vec[-2] # get temperature of core
+        assert self.__lambda_vec.size == self.__beta_vec.size
 
-        temp_c = u_vec[-1] # get temperature of coolant
+        n_unknowns = 1 + self.__lambda_vec.size + 3
 
+        self.__u_vec = np.empty(n_unknowns, dtype=np.float64)
 
-        # initialize f_vec to zero
-        lambda_vec = np.array(self.species_decay, dtype=np.float64)
-        n_species = len(lambda_vec)
+        # Constant entries of the Jacobian are set once; the remaining entries
+        # are overwritten on every evaluation
+        jac = np.zeros((n_unknowns, n_unknowns), dtype=np.float64)
+        jac[0, 1:-3] = self.__lambda_vec
+        jac[1:-3, 0] = self.__beta_vec / self.gen_time
+        jac[1:-3, 1:-3] = - np.diag(self.__lambda_vec)
 
-        f_tmp = np.zeros(1+n_species+3, dtype=np.float64) # vector for f_vec return
+        self.__jac_tmp = jac
 
-        #----------------
-        # neutron balance
-        #----------------
+    def __f_vec(self, u_vec, time):
 
-        rho_t = self.__rho_func(time, n_dens, (temp_f+temp_c)/2.0)
+        water = self.__water(u_vec[-1])
 
-        beta = self.beta
-        gen_time = self.gen_time
+        return smpwr_rhs(u_vec, time, self.__params, water)
 
-        assert len(lambda_vec) == len(c_vec)
+    def __jac(self, u_vec, time):
+        """Analytic Jacobian of `__f_vec`, df_i/du_j (row i, column j).
 
-        q_source_t = self.__q_source(time)
+           The coolant properties are frozen at the coolant temperature; the
+           dependence of the heat transfer coefficient on the mass flowrate
+           (single phase) and on the core temperature (nucleate boiling) is
+           retained.
+        """
 
-        f_tmp[0] = (rho_t - beta)/gen_time * n_dens + lambda_vec @ c_vec + q_source_t
+        n_dens = u_vec[0]
+        mass_flowrate = u_vec[-3]
+        temp_f = u_vec[-2]
+        temp_c = u_vec[-1]
 
-        #-----------------------------------
-        # n species balances (implicit loop)
-        #-----------------------------------
-        species_rel_yield = self.species_rel_yield
-        beta_vec = np.array(species_rel_yield) * beta
+        jac = self.__jac_tmp # constant kinetics entries set in __setup_kinetics
 
-        assert len(beta_vec) == len(c_vec)
+        #----------------
+        # neutron balance
+        #----------------
+        temp = (temp_f+temp_c)/2.0
 
-        f_tmp[1:-3] = beta_vec / gen_time * n_dens - lambda_vec * c_vec
+        (jac[0, 0], jac[0, -2]) = self.__neutron_balance_grad(u_vec, time)
+        jac[0, -1] = jac[0, -2]
 
         #----------------------------
         # mass flowrate ("buoyancy")
         #----------------------------
-
-        if self.shutdown[0] and time > self.shutdown[1]:
-            tau = self.flowrate_relaxation_shutdown
-            self.coolant_mass_flowrate_ss = 1.0*unit.kg/unit.second
-        else:
-            tau = self.flowrate_relaxation_startup
-
-        f_tmp[-3] = - 1/tau * (mass_flowrate - self.coolant_mass_flowrate_ss)
+        jac[-3, -3] = - 1/self.__flowrate_relaxation
 
         #---------------------------
-        # Heating power calculations
+        # Heat transfer
         #---------------------------
-        water = WaterProps(T=temp_c, P=self.coolant_pressure/unit.mega/unit.pascal)
-        assert water.phase != 'Vapour'
+        water = self.__water(temp_c)
 
-        # Compute the heating sink power
-        (heat_sink_pwr, _) = self.__heat_sink_rate(temp_f, water, mass_flowrate)
+        (h_c, _, dh_dmdot, dh_dtemp_f) = _heat_transfer_coeff(temp_f, mass_flowrate,
+                                                              self.__params, water)
+        area = self.core_heat_transfer_area
+
+        ua = area * h_c
+        dua_dmdot = area * dh_dmdot
+        dua_dtemp_f = area * dh_dtemp_f
 
         #--------------------
         # core energy balance
@@ -700,163 +1001,483 @@ class SMPWR(Module):
         cp_f = self.cp_core
         vol_core = self.core_volume
 
-        nuclear_pwr_dens = self.__nuclear_pwr_dens_func(time, (temp_f+temp_c)/2, n_dens)
+        # q3prime ~ n_dens temp^(-1/2)
+        q3prime_per_n = _nuclear_pwr_dens(temp, 1.0, self.__params)
+        dq3prime_dtemp = - q3prime_per_n*n_dens/2.0/temp
 
-        heat_sink_pwr_dens = heat_sink_pwr/vol_core
+        coeff = -1/rho_f/cp_f
 
-        f_tmp[-2] = -1/rho_f/cp_f * (nuclear_pwr_dens - heat_sink_pwr_dens)
+        jac[-2, 0] = coeff * q3prime_per_n
+        jac[-2, -3] = coeff * dua_dmdot*(temp_f - temp_c)/vol_core
+        jac[-2, -2] = coeff * (dq3prime_dtemp/2.0 +
+                               (ua + dua_dtemp_f*(temp_f - temp_c))/vol_core)
+        jac[-2, -1] = coeff * (dq3prime_dtemp/2.0 - ua/vol_core)
 
         #-----------------------
         # coolant energy balance
         #-----------------------
-        if water.phase == 'Two phases':
-            qual = water.x
-            assert qual <= 0.4 # limit to low quality
-            cp_c = (1-qual)*water.Liquid.cp + qual*water.Vapor.cp
-            cp_c *= unit.kj/unit.kg/unit.K
-            #rho_c = (1-qual)*water.Liquid.rho + qual*water.Vapor.rho
-            rho_c = water.rho
-        elif water.phase == 'Liquid':
-            cp_c = water.Liquid.cp*unit.kj/unit.kg/unit.K
-            rho_c = water.Liquid.rho
-        else:
-            assert False,'Vapor not allowed.'
+        rho_c = water['rho']
+        cp_c = water['cp']*unit.kj/unit.kg/unit.K
 
         vol_cool = self.coolant_volume
+        rho_cp_vol = rho_c * cp_c * vol_cool
 
-        temp_in = self.inflow_cool_temp
-
-        q_vol = mass_flowrate/rho_c
-        if q_vol > 0:
-            tau = vol_cool / q_vol
+        if mass_flowrate > 0:
+            jac[-1, -3] = - (temp_c - self.inflow_cool_temp)/vol_cool/rho_c
+            jac[-1, -1] = - mass_flowrate/rho_c/vol_cool
         else:
-            tau = 1*unit.hour
+            jac[-1, -3] = 0.0
+            jac[-1, -1] = - 1/(1*unit.hour)
+
+        jac[-1, -3] += dua_dmdot*(temp_f - temp_c)/rho_cp_vol
+        jac[-1, -2] = (ua + dua_dtemp_f*(temp_f - temp_c))/rho_cp_vol
+        jac[-1, -1] -= ua/rho_cp_vol
+
+        return jac
+
+    def __neutron_balance_grad(self, u_vec, time):
+        """Partial derivatives of the neutron balance right-hand side with respect
+           to the neutron density and to the core (or coolant) temperature.
+        """
+
+        n_dens = u_vec[0]
+        temp = (u_vec[-2]+u_vec[-1])/2.0
+
+        rho_t = _reactivity(n_dens, temp, self.__params)
+
+        # alpha_tn ~ temp^(-1/2)
+        alpha_tn = _alpha_tn(temp, self.__params)
+        drho_dtemp = alpha_tn - alpha_tn/2.0/temp * (temp - self.temp_c_ss_operation)
+
+        df_dn = (rho_t - self.beta + self.alpha_n*n_dens)/self.gen_time
+        df_dtemp = n_dens/self.gen_time * drho_dtemp/2.0
+
+        return (df_dn, df_dtemp)
+
+    def __prompt_neutron_dens(self, v_vec, time):
+        """Neutron density of the reduced kinetics models.
+        """
+
+        # Lambda dn/dt is zero in the prompt jump model
+        return smpwr_prompt_neutron_dens(v_vec, time, self.__params, self.__n_dens_rate)
+
+    def __f_vec_reduced(self, v_vec, time):
+        """Right-hand side of the reduced kinetics models (no neutron density).
+        """
+
+        n_dens = self.__prompt_neutron_dens(v_vec, time)
+
+        u_vec = self.__u_vec
+        u_vec[0] = n_dens
+        u_vec[1:] = v_vec
+
+        return self.__f_vec(u_vec, time)[1:]
+
+    def __jac_reduced(self, v_vec, time):
+        """Jacobian of `__f_vec_reduced`; the neutron density is eliminated with
+           the prompt jump relation dn/dv = - df_0/dv / df_0/dn.
+        """
+
+        n_dens = self.__prompt_neutron_dens(v_vec, time)
+
+        u_vec = self.__u_vec
+        u_vec[0] = n_dens
+        u_vec[1:] = v_vec
+
+        jac = self.__jac(u_vec, time)
+
+        dn_dv = - jac[0, 1:]/jac[0, 0]
 
-        # Heating source power
-        heat_source_pwr = - heat_sink_pwr
-        heat_source_pwr_dens = heat_source_pwr/vol_cool
+        return jac[1:, 1:] + np.outer(jac[1:, 0], dn_dv)
 
-        f_tmp[-1] = - 1/tau * (temp_c - temp_in) + 1./rho_c/cp_c * heat_source_pwr_dens
+    def __full_kinetics_solution(self, time, u_0, end_time):
+        """Reference solution of the full kinetics model over one time step.
+        """
+
+        integrator = Integrator(self.__f_vec, self.__jac, method='odeint',
+                                rtol=self.integrator.rtol, atol=self.integrator.atol,
+                                max_n_steps=self.integrator.max_n_steps,
+                                breakpoints=self.integrator.breakpoints)
+
+        integrator.reset(time, u_0)
+
+        return np.array(integrator.advance(end_time))
+
+    def __check_kinetics(self, u_vec, u_ref, time):
+        """Compare the reduced kinetics solution against the full model; fall back
+           to the full model if the difference is too large.
+        """
+
+        self.__kinetics_check_time = time + self.kinetics_check_interval
+
+        idx = [0, -2, -1] # neutron density, core and coolant temperatures
 
-        return f_tmp
+        error = np.max(np.abs(u_vec[idx] - u_ref[idx]) /
+                       np.maximum(np.abs(u_ref[idx]), 1e-10))
 
-    def __heat_sink_rate(self, temp_f, water, coolant_mass_flowrate):
-        """Cooling rate of the core.
+        if error <= self.kinetics_check_rtol:
+            return u_vec
 
-           Assumptions
-           -----------
+        self.log.warning(self.name+'::run(): %s kinetics relative error %.2e at '\
+                         'time[m]=%s; falling back to full kinetics'%\
+                         (self.__kinetics_mode, error, round(time/unit.minute, 1)))
 
-           + Coolant: overall ranging from one phase heat tranfer to transition
-             nucleate boiling.
+        self.__kinetics_fallback = True
+        self.__set_kinetics_mode('full', time, u_ref)
+
+        return u_ref
+
+    def __set_kinetics_mode(self, mode, time, u_vec):
+        """Switch the kinetics model and cold restart the integrator from the full
+           state vector `u_vec` at `time`.
         """
 
-        assert water.phase != 'Vapour'
+        self.__kinetics_mode = mode
+        self.__n_dens_rate = 0.0
+
+        if mode == 'full':
+            self.integrator.f_vec = self.__f_vec
+            self.integrator.jac = self.__jac
+            self.integrator.reset(time, u_vec)
+        else:
+            self.integrator.f_vec = self.__f_vec_reduced
+            self.integrator.jac = self.__jac_reduced
+            self.integrator.reset(time, u_vec[1:])
 
-        # Primary props
-        temp_c = water.T
+    def __water(self, temp_c):
+        """Coolant properties at temperature `temp_c` and the coolant pressure,
+           with the keys of `WaterTable.evaluate()` (see `smpwr_rhs()`).
+        """
 
-        #print(water.P*unit.mega/unit.bar)
-        #print(temp_c-273.15)
+        press = self.coolant_pressure/unit.mega/unit.pascal
 
-        water_sat = WaterProps(P=water.P, x=0.0)
-        temp_c_sat = water_sat.T
+        water = self.water_props(T=temp_c, P=press)
 
-        # Overall condition on colant; locally there may be nucleate boiling
-        assert temp_c <= temp_c_sat
+        props = dict()
 
         if water.phase == 'Two phases':
             qual = water.x
             assert qual <= 0.4 # limit to low quality
-            cp_c = (1-qual)*water.Liquid.cp + qual*water.Vapor.cp
-            cp_c *= unit.kj/unit.kg/unit.K
-            mu_c = (1-qual)*water.Liquid.mu + qual*water.Vapor.mu
-            k_c = (1-qual)*water.Liquid.k + qual*water.Vapor.k
-            prtl_c = (1-qual)*water.Liquid.Prandt + qual*water.Vapor.Prandt
+            #props['rho'] = (1-qual)*water.Liquid.rho + qual*water.Vapor.rho
+            props['rho'] = water.rho
+            props['cp'] = (1-qual)*water.Liquid.cp + qual*water.Vapor.cp
+            props['mu'] = (1-qual)*water.Liquid.mu + qual*water.Vapor.mu
+            props['k'] = (1-qual)*water.Liquid.k + qual*water.Vapor.k
+            props['Prandt'] = (1-qual)*water.Liquid.Prandt + qual*water.Vapor.Prandt
         elif water.phase == 'Liquid':
-            cp_c = water.cp * unit.kj/unit.kg/unit.K
-            mu_c = water.mu
-            k_c = water.k
-            prtl_c = water.Prandt
+            props['rho'] = water.Liquid.rho
+            props['cp'] = water.Liquid.cp
+            props['mu'] = water.Liquid.mu
+            props['k'] = water.Liquid.k
+            props['Prandt'] = water.Liquid.Prandt
         else:
             assert False, 'Vapor not allowed.'
 
-        # Heat transfer coefficient
-        diameter = (4*self.core_flow_area/math.pi)**.5
-        rey_c = 4*coolant_mass_flowrate / mu_c / math.pi / diameter
-        #print('Reactor coolant Rey =',rey_c)
-        #print('Reactor coolant mu  =',mu_c)
-        #print('Reactor coolant T   =',temp_c-273.15)
+        props['phase'] = water.phase
+        props['x'] = water.x
 
-        temp_c_w = temp_f
-        temp_c_w_F = unit.convert_temperature(temp_c_w, 'K', 'F')
-        temp_c_sat_F = unit.convert_temperature(temp_c_sat, 'K', 'F')
+        water_sat_l = saturation_cache.liquid(press)
+        water_sat_v = saturation_cache.vapor(press)
 
-        #print('F ',temp_c_w_F, temp_c_sat_F)
+        # Overall condition on coolant; locally there may be nucleate boiling
+        assert temp_c <= water_sat_l.T
 
-        if temp_c_w_F > temp_c_sat_F and \
-           coolant_mass_flowrate >= 142.5*unit.kg/unit.second: # nucleate boiling
-        # Jens and Lottes correlation for subcooled/saturated nucleate boiling
-        # 500 <=  P <= 2000 psi
-        # mdot >= 142.5 kg/s
+        props['T_sat'] = water_sat_l.T
+        props['h_l'] = water_sat_l.Liquid.h
+        props['h_v'] = water_sat_v.Vapor.h
 
-            # Sanity check
-            press_c_psia = water.P*unit.mega*unit.pascal/unit.psi
-            assert 500 <= press_c_psia <= 2000, 'press_s [psi] = %r'%press_c_psia
+        return props
 
-            q2prime = ( (temp_c_w_F - temp_c_sat_F) * math.exp(press_c_psia/900) / 60 )**4 * 1e6
-            q2prime *= unit.Btu/unit.hour/unit.ft**2
-            h_c = q2prime/(temp_c_w - temp_c_sat)
-            nusselt_c = h_c * diameter / k_c
+def smpwr_rhs(u_vec, time, params, water):
+    """SM-PWR model: time derivatives of the state.
 
-            #print('Jens mass flowrate = ',coolant_mass_flowrate)
+    Pure function of the state `u_vec` (neutron density, delayed neutron emitter
+    concentrations, coolant mass flowrate, core and coolant temperatures), of
+    the parameters `params` (see `SMPWR.parameters()`) and of the coolant
+    properties `water` at the coolant temperature (keys of
+    `WaterTable.evaluate()`). The states of several reactors may be stacked as
+    the rows of `u_vec`, with one value per reactor of the parameters that
+    differ (see `reactor_ensemble`).
 
-        else: # single phase heat transfer
+    Returns
+    -------
+    f_vec: numpy.ndarray
+        Time derivatives, shaped as `u_vec`.
+    """
 
-            nusselt_c = self.__mean_nusselt_single_phase(rey_c, prtl_c)
-            h_c = nusselt_c * k_c / diameter
+    n_dens = u_vec[..., 0] # neutron density
 
-            #print('Single mass flowrate = ',coolant_mass_flowrate)
+    c_vec = u_vec[..., 1:-3] # delayed neutron emitter concentrations
 
-        ###################################################
-        # Overall heat transfer
-        ###################################################
+    mass_flowrate = u_vec[..., -3]
 
-        #therm_cond_wall = self.cladding_k
-        # Can we consider the cladding?
-        #one_over_U = 1.0/h_c * area_outer/area_inner + \
-        #     (radius_outer-radius_inner)/therm_cond_wall * area_outer/area_mean
+    temp_f = u_vec[..., -2] # core temperature
 
-        one_over_U = 1.0/h_c
+    temp_c = u_vec[..., -1] # coolant temperature
 
-        # Total area of heat tranfer
-        area = self.core_heat_transfer_area
+    f_vec = np.empty_like(u_vec)
 
-        UA = area * 1/one_over_U
+    temp = (temp_f + temp_c)/2.0
 
-        # Heating power (W)
-        qdot = - UA * (temp_f - temp_c)
+    #----------------
+    # neutron balance
+    #----------------
+    rho_t = _reactivity(n_dens, temp, params)
 
-        return (qdot, nusselt_c)
+    gen_time = params['gen_time']
+    lambda_vec = params['lambda_vec']
 
-    def __mean_nusselt_single_phase(self, rey, prtl):
-        """Mean Nusselt number for turbulent one-phase flow on "smooth" pipes.
-           Dittus and Boelter.
-           Re > 10000
-           L/D > 60
+    f_vec[..., 0] = (rho_t - params['beta'])/gen_time * n_dens + c_vec @ lambda_vec + \
+                    _q_source(time, params)
 
-           Parameters
-           ----------
+    #-----------------------------------
+    # n species balances (implicit loop)
+    #-----------------------------------
+    # species last in `beta_vec` and `c_vec`; reactors last in the transposes
+    f_vec[..., 1:-3] = (params['beta_vec'].T / gen_time * n_dens).T - lambda_vec * c_vec
 
-           rey: float
-               Reynolds number based on diameter; bulk conditions
-           prtl: float
-               Prandtl number; bulk conditions
-        """
+    #----------------------------
+    # mass flowrate ("buoyancy")
+    #----------------------------
+    tau = params['flowrate_relaxation'] # changed by a trip
 
-        if rey <= 2e3:
-            nusselt = 4.0
-        else:
-           coeff = 0.023
-           nusselt = coeff * rey**0.8 * prtl**0.4
+    f_vec[..., -3] = - 1/tau * (mass_flowrate - params['coolant_mass_flowrate_ss'])
+
+    #---------------------------
+    # Heating power calculations
+    #---------------------------
+    (heat_sink_pwr, _) = _heat_sink_pwr(temp_f, temp_c, mass_flowrate, params, water)
+
+    #--------------------
+    # core energy balance
+    #--------------------
+    nuclear_pwr_dens = _nuclear_pwr_dens(temp, n_dens, params)
+
+    heat_sink_pwr_dens = heat_sink_pwr/params['core_volume']
+
+    f_vec[..., -2] = -1/params['core_dens']/params['cp_core'] * \
+                     (nuclear_pwr_dens - heat_sink_pwr_dens)
+
+    #-----------------------
+    # coolant energy balance
+    #-----------------------
+    rho_c = water['rho']
+    cp_c = water['cp']*unit.kj/unit.kg/unit.K
+
+    tau = _residence_time(mass_flowrate, params, water, 1*unit.hour)
+
+    # Heating source power
+    heat_source_pwr_dens = - heat_sink_pwr/params['coolant_volume']
+
+    f_vec[..., -1] = - 1/tau * (temp_c - params['inflow_cool_temp']) + \
+                     1./rho_c/cp_c * heat_source_pwr_dens
+
+    return f_vec
+
+def smpwr_prompt_neutron_dens(v_vec, time, params, n_dens_rate=0.0):
+    """Neutron density of the reduced kinetics models.
+
+    Pure function of the state of `smpwr_rhs()` without the neutron density,
+    `v_vec`, and of the parameters `params`. The prompt jump balance
+    0 = (rho(n) - beta) n + Lambda source, rho linear in n, is solved for n; the
+    source is the delayed neutron emission plus the external source, less
+    Lambda dn/dt = `n_dens_rate` (quasi-static model, frozen over a time step).
+    """
+
+    temp = (v_vec[..., -2] + v_vec[..., -1])/2.0
+
+    source = v_vec[..., :-3] @ params['lambda_vec'] + _q_source(time, params)
+    source = source - n_dens_rate
+
+    # a n^2 + b n - Lambda source = 0
+    a = - params['alpha_n']
+    b = params['beta'] - _reactivity(0.0, temp, params)
+    lambda_s = params['gen_time'] * np.maximum(source, 0.0)
+
+    assert (np.maximum(a, b) > 0.0).all(), 'prompt jump invalid: prompt supercritical'
+
+    # stable form of the positive root
+    n_dens = 2.0*lambda_s/(b + np.sqrt(b**2 + 4*a*lambda_s))
+
+    return n_dens
+
+def smpwr_diagnostics(u_vec, time, params, water):
+    """Quantities recorded at the state `u_vec` of `smpwr_rhs()` at `time`.
+
+    Returns
+    -------
+    diagnostics: dict
+        Reactor power (`power`), coolant Reynolds and Prandtl numbers
+        (`reynolds`, `prandtl`), core average heat flux (`heatflux`), Nusselt
+        number (`nusselt`), coolant quality [%] of local nucleate boiling
+        (`quality`), and coolant residence time (`tau`; zero without flow and
+        before `discard_tau_recording_before`).
+    """
+
+    mass_flowrate = u_vec[..., -3]
+    core_temp = u_vec[..., -2]
+    cool_temp = u_vec[..., -1]
+
+    temp_in = params['inflow_cool_temp']
+
+    cp_c = water['cp']*unit.kj/unit.kg/unit.K
+
+    diagnostics = dict()
+
+    # Reactor power; none when the reactor is heated by the coolant inflow
+    pwr = mass_flowrate*cp_c*(cool_temp - temp_in)
+    diagnostics['power'] = np.maximum(pwr, 0.0)[()]
+
+    diagnostics['reynolds'] = 4*mass_flowrate / water['mu'] / math.pi / params['diameter']
+    diagnostics['prandtl'] = water['Prandt']
+
+    # Heat flux and Nusselt number
+    (heat_sink_pwr, nusselt) = _heat_sink_pwr(core_temp, cool_temp, mass_flowrate,
+                                              params, water)
+
+    heat_rate_transfered = - heat_sink_pwr
+
+    diagnostics['heatflux'] = np.maximum(heat_rate_transfered/
+                                         params['core_heat_transfer_area'], 0.0)[()]
+    diagnostics['nusselt'] = nusselt
+
+    # Coolant quality
+    # Coolant temperature is likely below saturation but there is quality in
+    # view of local nucleate boiling.
+    spfc_h_sat_l = water['h_l'] * unit.kj/unit.kg
+    spfc_h_sat_v = water['h_v'] * unit.kj/unit.kg
+
+    heat_rate_latent = (spfc_h_sat_v - spfc_h_sat_l)*mass_flowrate
+    heat_rate_sensible = (water['T_sat'] - temp_in)*cp_c*mass_flowrate
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        quality = (heat_rate_transfered - heat_rate_sensible)/\
+                  (heat_rate_latent - heat_rate_sensible)*100
+
+    diagnostics['quality'] = np.where((0 <= quality) & (quality <= 100), quality, 0.0)[()]
+
+    # Coolant residence time
+    tau = _residence_time(mass_flowrate, params, water, 0.0)
+
+    diagnostics['tau'] = tau if time > params['discard_tau_recording_before'] else 0.0
+
+    return diagnostics
+
+def _q_source(time, params):
+    """Neutron source delta function.
+    """
+
+    #broken on Mac/Windows if time <= 100*unit.milli*unit.second: # small time value
+    if time <= 100*unit.milli: # small time value
+        return params['q_0']
+
+    return 0.0
+
+def _alpha_tn(temp, params):
+    """Temperature coefficient of reactivity; single energy group formula.
+    """
+
+    Ea = .022  #/cm
+
+    return -1.0 / 2.0 * params['buckling'] * params['diff_coeff'] / \
+           (params['k_infty'] * Ea * np.sqrt(params['temp_o'] * temp))
+
+def _reactivity(n_dens, temp, params):
+    """Reactivity at neutron density `n_dens` and average core and coolant
+       temperature `temp`.
+    """
+
+    alpha_tn = _alpha_tn(temp, params)
+
+    return params['rho_0'] + params['alpha_n'] * (n_dens - params['n_dens_ref']) + \
+           alpha_tn * (temp - params['temp_c_ss_operation'])
+
+def _nuclear_pwr_dens(temp, n_dens, params):
+    """Scaled nuclear power density (W/m3; negative: exothermic reaction).
+    """
+
+    # Effective microscopic fission cross section
+    sigma_f = params['sigma_f_o'] * np.sqrt(params['temp_o']/temp) * \
+              math.sqrt(math.pi)/2.0
+
+    macro_sigma_f = sigma_f * params['fis_nuclide_num_dens'] # macroscopic cross section
+
+    neutron_flux = n_dens * params['n_dens_ss_operation'] * params['thermal_neutron_velo']
+
+    # reaction rate density times the fission reaction energy
+    return - params['fis_energy'] * (macro_sigma_f * neutron_flux)
+
+def _residence_time(mass_flowrate, params, water, no_flow):
+    """Coolant residence time; `no_flow` without flow.
+    """
+
+    q_vol = mass_flowrate/water['rho']
+
+    return np.where(q_vol > 0, params['coolant_volume']/np.maximum(q_vol, 1e-30),
+                    no_flow)[()]
+
+def _heat_sink_pwr(temp_f, temp_c, mass_flowrate, params, water):
+    """Cooling rate of the core (W) and Nusselt number.
+
+       Assumptions
+       -----------
+
+       + Coolant: overall ranging from one phase heat tranfer to transition
+         nucleate boiling.
+    """
+
+    (h_c, nusselt_c, _, _) = _heat_transfer_coeff(temp_f, mass_flowrate, params, water)
+
+    # Overall heat transfer; the cladding is not considered
+    one_over_U = 1.0/h_c
+
+    UA = params['core_heat_transfer_area'] * 1/one_over_U
+
+    return (- UA * (temp_f - temp_c), nusselt_c)
+
+def _heat_transfer_coeff(temp_f, mass_flowrate, params, water):
+    """Core to coolant heat transfer coefficient.
+
+       Returns
+       -------
+       (h_c, nusselt_c, dh_dmdot, dh_dtemp_f): tuple
+           Heat transfer coefficient, Nusselt number, and the partial
+           derivatives of the coefficient with respect to the coolant mass
+           flowrate and the core temperature.
+    """
+
+    mu_c = water['mu']
+    k_c = water['k']
+
+    # Heat transfer coefficient
+    diameter = params['diameter']
+    rey_c = 4*mass_flowrate / mu_c / math.pi / diameter
+
+    # Single phase heat transfer: Dittus-Boelter, h_c ~ mdot^0.8
+    (nusselt_c, dnusselt_drey) = dittus_boelter(rey_c, water['Prandt'],
+                                                params['regime_blend'][0])
+    h_c = nusselt_c * k_c / diameter
+
+    # no flow: laminar (dnusselt_drey = 0)
+    dh_dmdot = dnusselt_drey*rey_c/np.maximum(mass_flowrate, 1e-30) * k_c / diameter
+
+    # Jens and Lottes correlation for subcooled/saturated nucleate boiling
+    # 500 <=  P <= 2000 psi
+    # mdot >= 142.5 kg/s (no wall superheat below)
+    temp_excess = np.where(mass_flowrate >= 142.5*unit.kg/unit.second,
+                           temp_f - water['T_sat'], -np.inf)
+
+    (h_c, dh_dtemp_f, boiling) = nucleate_boiling(h_c, temp_excess,
+                                                  params['coolant_pressure'],
+                                                  blend=params['regime_blend'][1])
+
+    if (boiling > 0.0).any():
+        # Sanity check
+        press_c_psia = params['coolant_pressure']/unit.psi
+        assert (((500 <= press_c_psia) & (press_c_psia <= 2000)) |
+                (boiling <= 0.0)).all(), 'press_s [psi] = %r'%press_c_psia
+
+        nusselt_c = np.where(boiling > 0.0, h_c * diameter / k_c, nusselt_c)[()]
+        dh_dmdot = dh_dmdot * (1 - boiling)
 
-        return nusselt
+    return (h_c, nusselt_c, dh_dmdot, dh_dtemp_f)
@@ -0,0 +1,486 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Ensemble of standalone SMPWR reactors integrated as one stacked ODE system.
+
+   Each member is an SMPWR reactor with fixed coolant inflow conditions (no
+   Cortix ports) that differs from the prototype reactor in the values of
+   `SMPWREnsemble.parameter_names`. The members share the model of the
+   prototype, `reactor.smpwr_rhs()`, evaluated for all members at once with
+   their states stacked; the stacked Jacobian is block diagonal and is
+   estimated as a banded matrix.
+"""
+
+import math
+import copy
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas
+
+import unit
+
+from reactor import SMPWR
+from reactor import smpwr_rhs, smpwr_prompt_neutron_dens, smpwr_diagnostics
+from water_table import WaterTable
+from integrator import Integrator, Event
+
+class SMPWREnsemble:
+    """Batched SMPWR parameter sweep.
+
+    Parameters
+    ----------
+    params: dict
+        Parameter name (see `parameter_names`) to sequence of values, one per
+        member; scalars are broadcast. Parameters not given take the value of the
+        prototype reactor. `shutdown_time` is the shutdown time [s] and
+        `scram_temp` the core temperature of the scram [K]; `numpy.inf` means no
+        shutdown or scram.
+    reactor: SMPWR or None
+        Prototype reactor holding all other data, including the kinetics model
+        (`kinetics_mode`); a default `SMPWR()` if None.
+    water_props: WaterTable or None
+        Vectorised coolant property backend; the prototype's if it is a
+        `WaterTable`, else a table covering 280-595 K and 12-14 MPa.
+
+    Attributes
+    ----------
+    times: numpy.ndarray
+        Output time stamps, available after `run()`.
+    integrator: Integrator
+        Integrator of the stacked system (closed after the run; None when the
+        members were integrated in chunks).
+    kinetics_fallback_time: float or None
+        Time at which an approximate kinetics model was found inaccurate for
+        some member and the ensemble fell back to the full model.
+    """
+
+    parameter_names = ('alpha_n', 'beta', 'gen_time', 'k_infty', 'buckling',
+                       'diff_coeff', 'coolant_mass_flowrate_ss', 'inflow_cool_temp',
+                       'coolant_pressure', 'shutdown_time', 'scram_temp')
+
+    history_names = ('neutron-dens', 'delayed-neutrons-cc', 'flowrate', 'temp',
+                     'pressure', 'quality', 'core-temp', 'inlet-temp', 'power',
+                     'reynolds', 'prandtl', 'heatflux', 'nusselt', 'tau')
+
+    def __init__(self, params, reactor=None, water_props=None):
+
+        if reactor is None:
+            reactor = SMPWR()
+
+        unknown = set(params) - set(self.parameter_names)
+        assert not unknown, 'unknown parameters: %r'%sorted(unknown)
+
+        sizes = {np.size(v) for v in params.values() if np.ndim(v) > 0}
+        assert len(sizes) <= 1, 'parameter sequences of different lengths'
+        self.n_members = sizes.pop() if sizes else 1
+
+        # Member parameters
+        defaults = {name: getattr(reactor, name) for name in self.parameter_names
+                    if name not in ('shutdown_time', 'scram_temp')}
+        defaults['shutdown_time'] = reactor.shutdown[1] if reactor.shutdown[0] \
+                                    else np.inf
+        defaults['scram_temp'] = reactor.scram[1] if reactor.scram[0] else np.inf
+
+        for name in self.parameter_names:
+            value = params.get(name, defaults[name])
+            value = np.broadcast_to(np.asarray(value, dtype=np.float64),
+                                    (self.n_members,)).copy()
+            setattr(self, name, value)
+
+        # Shared data
+        self.initial_time = reactor.initial_time
+        self.end_time = reactor.end_time
+        self.time_step = reactor.time_step
+
+        # Model parameters of the prototype (see `SMPWR.parameters()`)
+        self.reactor_params = reactor.parameters()
+
+        self.species_rel_yield = np.array(reactor.species_rel_yield, dtype=np.float64)
+
+        for name in ('n_0', 'temp_f_0', 'temp_c_0', 'flowrate_relaxation_shutdown',
+                     'kinetics_mode', 'kinetics_check_interval', 'kinetics_check_rtol'):
+            setattr(self, name, getattr(reactor, name))
+
+        assert self.kinetics_mode in ('full', 'prompt-jump', 'quasi-static')
+
+        if water_props is None:
+            water_props = reactor.water_props
+        if not isinstance(water_props, WaterTable):
+            water_props = WaterTable(temp_range=(280, 595), press_range=(12.0, 14.0))
+        self.water_props = water_props
+
+        # Members are integrated in stacked systems of at most `chunk_size`
+        # members: the step size of a stacked system is set by its stiffest
+        # member (e.g. at the onset of nucleate boiling)
+        self.chunk_size = 50
+
+        self.ode_method = 'bdf'
+        self.integrator = None
+
+        self.kinetics_fallback_time = None
+
+        self.times = None
+        self.__history = None
+
+    def run(self, n_workers=1):
+        """Integrate all members from `initial_time` to `end_time`.
+
+        Parameters
+        ----------
+        n_workers: int
+            Number of processes over which the chunks of members are spread.
+        """
+
+        n_chunks = -(-self.n_members // self.chunk_size)
+
+        if n_chunks > 1:
+            chunks = np.array_split(np.arange(self.n_members), n_chunks)
+            ensembles = [self.subset(c) for c in chunks]
+
+            if n_workers > 1:
+                with ProcessPoolExecutor(max_workers=min(n_workers, n_chunks)) as pool:
+                    ensembles = list(pool.map(_run_ensemble, ensembles))
+            else:
+                ensembles = [_run_ensemble(e) for e in ensembles]
+
+            self.times = ensembles[0].times
+            self.__history = {name: np.concatenate([e.history(name) for e in ensembles],
+                                                   axis=1)
+                              for name in self.history_names}
+
+            fallback_times = [e.kinetics_fallback_time for e in ensembles
+                              if e.kinetics_fallback_time is not None]
+            self.kinetics_fallback_time = min(fallback_times, default=None)
+            return
+
+        self.__run()
+
+    def subset(self, members):
+        """New (not run) ensemble with the selected members.
+        """
+
+        ensemble = copy.copy(self)
+
+        for name in self.parameter_names:
+            setattr(ensemble, name, getattr(self, name)[members])
+
+        ensemble.n_members = len(getattr(ensemble, self.parameter_names[0]))
+        ensemble.integrator = None
+        ensemble.kinetics_fallback_time = None
+        ensemble.times = None
+        ensemble.__history = None
+
+        return ensemble
+
+    def history(self, name):
+        """History of a quantity: array of shape (n_times, n_members) or
+           (n_times, n_members, n_species) for 'delayed-neutrons-cc'.
+        """
+
+        assert self.__history is not None, 'run() must be called first.'
+
+        return self.__history[name]
+
+    def member_history(self, member):
+        """History of one member as a data frame indexed by time with the SMPWR
+           phase quantity names as columns.
+        """
+
+        data = {name: list(self.history(name)[:, member])
+                if name == 'delayed-neutrons-cc' else self.history(name)[:, member]
+                for name in self.history_names}
+
+        return pandas.DataFrame(data, index=self.times)
+
+    def __run(self):
+
+        params = self.__params = self.__parameters()
+
+        n_species = params['lambda_vec'].size
+        self.__n_unknowns = 1 + n_species + 3
+
+        # Initial state as in SMPWR
+        u_0 = np.empty((self.n_members, self.__n_unknowns), dtype=np.float64)
+        u_0[:, 0] = self.n_0
+        u_0[:, 1:-3] = params['beta_vec']/params['lambda_vec']/self.gen_time[:, None]*self.n_0
+        u_0[:, -3] = 0.0
+        u_0[:, -2] = self.temp_f_0
+        u_0[:, -1] = self.temp_c_0
+
+        # Discontinuities of the right-hand side
+        breakpoints = [100*unit.milli] # end of the neutron source pulse
+
+        # One shutdown event per distinct shutdown time and one scram event per
+        # member; a member trips once
+        events = [Event(functools.partial(self.__shutdown_func, shutdown_time),
+                        functools.partial(self.__trip,
+                                          np.flatnonzero(self.shutdown_time ==
+                                                         shutdown_time)),
+                        direction=1)
+                  for shutdown_time in np.unique(self.shutdown_time)
+                  if np.isfinite(shutdown_time)]
+
+        events += [Event(functools.partial(self.__scram_func, member),
+                         functools.partial(self.__trip, [member]), direction=1)
+                   for member in np.flatnonzero(np.isfinite(self.scram_temp))]
+
+        self.__tripped = np.zeros(self.n_members, dtype=bool)
+
+        band = self.__n_unknowns - 1
+        self.integrator = Integrator(self.__f_vec, method=self.ode_method,
+                                     rtol=1e-7, atol=1e-8,
+                                     max_n_steps=1500*self.n_members,
+                                     breakpoints=breakpoints, band=(band, band),
+                                     events=events)
+
+        # Output time stamps as in SMPWR.run()
+        if self.initial_time + self.time_step > self.end_time:
+            self.end_time = self.initial_time + self.time_step
+
+        n_steps = int(math.floor((self.end_time - self.initial_time)/self.time_step
+                                 + 1e-9)) + 1
+
+        self.times = self.initial_time + self.time_step*np.arange(n_steps+1)
+
+        self.__history = dict()
+        for name in self.history_names:
+            shape = (n_steps+1, self.n_members)
+            if name == 'delayed-neutrons-cc':
+                shape += (n_species,)
+            self.__history[name] = np.zeros(shape, dtype=np.float64)
+
+        self.__record(0, u_0, initial=True)
+
+        self.integrator.reset(self.initial_time, u_0.ravel())
+
+        # Full kinetics until the neutron source pulse is over (see SMPWR)
+        self.__kinetics_mode = 'full'
+        self.__n_dens_rate = np.zeros(self.n_members)
+        kinetics_check_time = self.initial_time
+
+        u_vec = u_0
+
+        for step in range(1, n_steps+1):
+
+            (time_0, time) = self.times[step-1:step+1]
+
+            if self.__kinetics_mode != self.kinetics_mode and \
+               self.kinetics_fallback_time is None and time_0 > 100*unit.milli:
+                self.__set_kinetics_mode(self.kinetics_mode, time_0, u_vec)
+
+            reduced = self.__kinetics_mode != 'full'
+
+            check = reduced and time_0 >= kinetics_check_time
+            if check:
+                u_ref = self.__full_kinetics_solution(time_0, u_vec, time)
+
+            tripped = self.__tripped.copy()
+
+            u_new = self.integrator.advance(time).reshape(self.n_members, -1)
+
+            tripped = self.__tripped & ~tripped
+            if reduced:
+                n_dens = smpwr_prompt_neutron_dens(u_new, time, params,
+                                                   self.__n_dens_rate)
+                u_new = np.insert(u_new, 0, n_dens, axis=1)
+
+            # the reference solution does not include the trips; check later
+            if check and not np.any(tripped):
+                kinetics_check_time = time + self.kinetics_check_interval
+                u_new = self.__check_kinetics(u_new, u_ref, time)
+
+            if self.__kinetics_mode == 'quasi-static':
+                # dn/dt across a trip is not representative of the next step
+                self.__n_dens_rate[:] = np.where(tripped, 0.0, (u_new[:, 0] -
+                                                 u_vec[:, 0])/self.time_step)
+
+            u_vec = u_new
+
+            self.__record(step, u_vec)
+
+        self.end_time = self.times[-1]
+
+        self.integrator.close()
+
+    def __parameters(self):
+        """Parameters of `smpwr_rhs()` for all members: those of the prototype
+           with one value per member of the swept ones and of those changed by
+           a trip.
+        """
+
+        params = dict(self.reactor_params)
+
+        for name in self.parameter_names:
+            if name not in ('shutdown_time', 'scram_temp'):
+                params[name] = getattr(self, name).copy()
+
+        params['rho_0'] = np.full(self.n_members, params['rho_0'])
+        params['beta_vec'] = np.outer(self.beta, self.species_rel_yield)
+        params['flowrate_relaxation'] = np.full(self.n_members,
+                                                params['flowrate_relaxation'])
+
+        return params
+
+    def __shutdown_func(self, shutdown_time, u_flat, time):
+        """Event function of the shutdown of the members at `shutdown_time`.
+        """
+
+        return time - shutdown_time
+
+    def __scram_func(self, member, u_flat, time):
+        """Event function of the high core temperature scram of `member`; the
+           core temperature is the second to last unknown in both the full and
+           reduced kinetics states.
+        """
+
+        return u_flat.reshape(self.n_members, -1)[member, -2] - self.scram_temp[member]
+
+    def __trip(self, members, time, u_flat):
+        """Shutdown/scram action of `members` (see SMPWR).
+        """
+
+        params = self.__params
+
+        self.__tripped[members] = True
+
+        params['rho_0'][members] = -1.0
+        params['beta_vec'][members] = 0.0
+        params['flowrate_relaxation'][members] = self.flowrate_relaxation_shutdown
+        params['coolant_mass_flowrate_ss'][members] = 1.0*unit.kg/unit.second
+
+        return None
+
+    def __f_vec(self, u_flat, time):
+
+        u_vec = u_flat.reshape(self.n_members, self.__n_unknowns)
+
+        water = self.__water(u_vec[:, -1], trial=True)
+
+        return smpwr_rhs(u_vec, time, self.__params, water).ravel()
+
+    def __f_vec_reduced(self, v_flat, time):
+        """Right-hand side of the reduced kinetics models (no neutron densities).
+        """
+
+        v_vec = v_flat.reshape(self.n_members, self.__n_unknowns-1)
+
+        n_dens = smpwr_prompt_neutron_dens(v_vec, time, self.__params,
+                                           self.__n_dens_rate)
+
+        u_vec = np.insert(v_vec, 0, n_dens, axis=1)
+
+        water = self.__water(u_vec[:, -1], trial=True)
+
+        return smpwr_rhs(u_vec, time, self.__params, water)[:, 1:].ravel()
+
+    def __set_kinetics_mode(self, mode, time, u_vec):
+        """Switch the kinetics model and cold restart the integrator from the full
+           states `u_vec` at `time`.
+        """
+
+        self.__kinetics_mode = mode
+        self.__n_dens_rate[:] = 0.0
+
+        if mode == 'full':
+            band = self.__n_unknowns - 1
+            self.integrator.f_vec = self.__f_vec
+            self.integrator.band = (band, band)
+            self.integrator.reset(time, u_vec.ravel())
+        else:
+            band = self.__n_unknowns - 2
+            self.integrator.f_vec = self.__f_vec_reduced
+            self.integrator.band = (band, band)
+            self.integrator.reset(time, u_vec[:, 1:].ravel())
+
+    def __full_kinetics_solution(self, time, u_vec, end_time):
+        """Reference solution of the full kinetics model over one time step.
+        """
+
+        band = self.__n_unknowns - 1
+
+        integrator = Integrator(self.__f_vec, method=self.ode_method,
+                                rtol=self.integrator.rtol, atol=self.integrator.atol,
+                                max_n_steps=self.integrator.max_n_steps,
+                                breakpoints=self.integrator.breakpoints,
+                                band=(band, band))
+
+        integrator.reset(time, u_vec.ravel())
+
+        return integrator.advance(end_time).reshape(u_vec.shape)
+
+    def __check_kinetics(self, u_vec, u_ref, time):
+        """Compare the reduced kinetics solution against the full model; fall back
+           to the full model for all members if the difference of any member is
+           too large.
+        """
+
+        idx = [0, -2, -1] # neutron density, core and coolant temperatures
+
+        error = np.max(np.abs(u_vec[:, idx] - u_ref[:, idx]) /
+                       np.maximum(np.abs(u_ref[:, idx]), 1e-10))
+
+        if error <= self.kinetics_check_rtol:
+            return u_vec
+
+        self.kinetics_fallback_time = time
+        self.__set_kinetics_mode('full', time, u_ref)
+
+        return u_ref
+
+    def __record(self, step, u_vec, initial=False):
+        """Store the state and the SMPWR diagnostics at output `step`.
+        """
+
+        hist = self.__history
+        params = self.__params
+
+        hist['neutron-dens'][step] = u_vec[:, 0]
+        hist['delayed-neutrons-cc'][step] = u_vec[:, 1:-3]
+        hist['flowrate'][step] = u_vec[:, -3]
+        hist['temp'][step] = u_vec[:, -1]
+        hist['pressure'][step] = params['coolant_pressure']
+        hist['core-temp'][step] = u_vec[:, -2]
+        hist['inlet-temp'][step] = params['inflow_cool_temp']
+
+        water = self.__water(u_vec[:, -1])
+
+        if initial:
+            hist['prandtl'][step] = water['Prandt']
+            return
+
+        diagnostics = smpwr_diagnostics(u_vec, self.times[step], params, water)
+
+        for name in ('power', 'reynolds', 'prandtl', 'heatflux', 'nusselt', 'quality',
+                     'tau'):
+            hist[name][step] = diagnostics[name]
+
+    def __water(self, temp_c, trial=False):
+        """Coolant properties of all members.
+
+        Trial states of the integrator may overshoot saturation; their properties
+        are those of the liquid at saturation so that the step is rejected by the
+        error control rather than failing.
+        """
+
+        press = self.__params['coolant_pressure']/unit.mega/unit.pascal
+
+        if trial:
+            temp_sat = self.water_props.saturation(press)['T']
+            temp_c = np.minimum(temp_c, temp_sat - 1e-3)
+
+        water = self.water_props.evaluate(temp_c, press)
+
+        assert np.all(water['phase'] == 'Liquid'), 'only subcooled coolant supported'
+
+        return water
+
+def _run_ensemble(ensemble):
+    """Process pool worker.
+    """
+
+    ensemble.run()
+
+    return ensemble
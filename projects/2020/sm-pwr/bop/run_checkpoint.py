@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment
+# https://cortix.org
+"""Check of the SM-PWR checkpoint/restart: the restarted run reproduces the uninterrupted run exactly"""
+
+import os
+import tempfile
+
+import numpy as np
+
+import unit
+from reactor import SMPWR
+from water_table import WaterTable
+
+def main():
+
+    # Preamble
+    end_time = 20*unit.minute
+    time_step = 1.5*unit.second
+    shutdown_time = 15*unit.minute
+    checkpoint_time = 10*unit.minute
+
+    cases = (('odeint', 'full'), ('lsoda', 'full'), ('bdf', 'full'), ('radau', 'full'),
+             ('exponential', 'full'), ('bdf', 'prompt-jump'), ('odeint', 'quasi-static'))
+
+    phases = ('neutron_phase', 'state_phase', 'coolant_outflow_phase')
+
+    water_props = WaterTable(temp_range=(280, 595), press_range=(12.0, 14.0))
+
+    def new_reactor(method, kinetics_mode):
+        reactor = SMPWR()
+        reactor.water_props = water_props
+        reactor.ode_method = method
+        reactor.kinetics_mode = kinetics_mode
+        reactor.time_step = time_step
+        reactor.end_time = end_time
+        reactor.inflow_cool_temp = unit.convert_temperature(497,'F','K')
+        reactor.shutdown = (True, shutdown_time)
+        return reactor
+
+    print('%-12s %-13s %11s %8s %14s'%('method', 'kinetics', 'restart [s]', 'rows',
+                                         'max abs diff'))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        filename = os.path.join(tmp_dir, 'smpwr.ckpt')
+
+        for (method, kinetics_mode) in cases:
+
+            # Uninterrupted run writing the checkpoint on the way
+            reactor = new_reactor(method, kinetics_mode)
+            reactor.checkpoint = (True, checkpoint_time, filename)
+            reactor.run()
+
+            # Restarted run; the property tables are not saved
+            restarted = new_reactor(method, kinetics_mode)
+            restart_time = restarted.load_checkpoint(filename)
+            restarted.water_props = water_props
+            restarted.run()
+
+            assert restart_time == checkpoint_time, 'restart time %r'%restart_time
+
+            max_diff = 0.0
+            for phase in phases:
+                df = getattr(reactor, phase).df
+                df_restarted = getattr(restarted, phase).df
+
+                assert np.array_equal(df.index, df_restarted.index), \
+                       '%s %s: %s time stamps differ'%(method, kinetics_mode, phase)
+
+                for name in df.columns:
+                    value = np.array(df[name].tolist(), dtype=np.float64)
+                    value_restarted = np.array(df_restarted[name].tolist(), dtype=np.float64)
+
+                    max_diff = max(max_diff, np.max(np.abs(value - value_restarted)))
+
+            print('%-12s %-13s %11.1f %8i %14.3e'%(method, kinetics_mode, restart_time,
+                                                    len(reactor.state_phase.df), max_diff))
+
+            assert max_diff == 0.0, '%s %s: restarted run differs by %r'%(method,
+                                                                          kinetics_mode,
+                                                                          max_diff)
+
+    print('\nAll restarted runs reproduce the uninterrupted runs exactly.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment
+# https://cortix.org
+"""Check of the condenser steady state fast path: the held state stays within the
+   equilibrium tolerances of the state solved at every step"""
+
+import time
+
+import numpy as np
+
+import unit
+from condenser import Condenser
+
+def main():
+
+    # Preamble
+    end_time = 2*unit.hour
+    time_step = 1.5*unit.second
+
+    # Runs: every step solved, and steps skipped at steady state
+    (solved, solved_time) = run(False, end_time, time_step)
+    (fast, fast_time) = run(True, end_time, time_step)
+
+    n_steps = int(round(end_time/time_step))
+    tolerances = np.array(fast.steady_fast_path[2])
+
+    print('Solved wall clock time [s]: %.2f'%solved_time)
+    print('Fast path wall clock time [s]: %.2f (%i of %i steps skipped)'%
+          (fast_time, fast.n_skipped_steps, n_steps))
+
+    # Agreement of the final state
+    names = ('shell pressure [Pa]', 'hot well temp [K]', 'cooling water temp [K]')
+    states = [np.array([module.shell_pressure, module.outflow_temp,
+                        module.cooling_water_temp]) for module in (solved, fast)]
+    diff = np.abs(states[1] - states[0])
+
+    print('\n%-24s %14s %14s %10s %10s'%('state', 'solved', 'fast path', 'abs diff',
+                                          'tolerance'))
+    for (name, value, value_fast, d, tol) in zip(names, states[0], states[1], diff,
+                                                 tolerances):
+        print('%-24s %14.6f %14.6f %10.2e %10.2e'%(name, value, value_fast, d, tol))
+
+    assert fast.n_skipped_steps > 0, 'no steps skipped'
+
+    # Held within the tolerances, with a margin for the residual drift of the
+    # solved run over the skipped steps
+    assert np.all(diff <= 1.5*tolerances), 'held state off the equilibrium by %r'%diff
+
+    print('\nThe fast path holds the condenser state within the equilibrium tolerances.')
+
+def run(fast_path, end_time, time_step):
+    """Run the condenser standalone at its design inflow.
+
+    Returns
+    -------
+    (condenser, wall_time): tuple
+    """
+
+    condenser = Condenser()
+    condenser.end_time = end_time
+    condenser.time_step = time_step
+    condenser.show_time = (False, 10*unit.minute)
+    condenser.steady_fast_path = (fast_path,) + condenser.steady_fast_path[1:]
+
+    start = time.time()
+    condenser.run()
+
+    return (condenser, time.time() - start)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment
+# https://cortix.org
+"""Timing report of the heat transfer correlations: scalar vs vectorised evaluation"""
+
+import math
+import time
+
+import numpy as np
+
+import unit
+from heat_transfer import dittus_boelter, zukauskas, nucleate_boiling
+
+def main():
+
+    # Preamble
+    n_samples = 10000
+    n_repeat = 20
+    blend = 0.25 # half width in ln Re
+
+    rng = np.random.default_rng(2)
+    reys = np.exp(rng.uniform(math.log(1e2), math.log(1e6), n_samples))
+    prtls = rng.uniform(0.8, 2.0, n_samples)
+    prtls_w = prtls*rng.uniform(0.8, 1.0, n_samples)
+    temp_excess = rng.uniform(-10, 30, n_samples) # K
+    press = 12.8*unit.mega*unit.pascal
+
+    correlations = (
+        ('dittus_boelter', lambda i: dittus_boelter(reys[i], prtls[i]),
+                           lambda: dittus_boelter(reys, prtls)),
+        ('zukauskas', lambda i: zukauskas(reys[i], prtls[i], prtls_w[i], 1.2),
+                      lambda: zukauskas(reys, prtls, prtls_w, 1.2)),
+        ('nucleate_boiling', lambda i: nucleate_boiling(3e4, temp_excess[i], press, 5.0),
+                             lambda: nucleate_boiling(3e4, temp_excess, press, 5.0)),
+    )
+
+    # Timing
+    print('Time per evaluation [us] (%i samples):'%n_samples)
+    print('%-18s %10s %10s %10s'%('correlation', 'scalar', 'vector', 'speedup'))
+
+    for (name, scalar, vector) in correlations:
+
+        start = time.time()
+        for i in range(n_samples):
+            scalar(i)
+        scalar_time = (time.time() - start)/n_samples
+
+        start = time.time()
+        for _ in range(n_repeat):
+            vector()
+        vector_time = (time.time() - start)/n_repeat/n_samples
+
+        print('%-18s %10.3f %10.4f %10.1f'%(name, scalar_time*1e6, vector_time*1e6,
+                                            scalar_time/vector_time))
+
+    # Regime blending: jump of the Nusselt number across the regime switches
+    print('\nZukauskas Nu across the regime switches (Pr = 1, st/sl = 1.2):')
+    print('%10s %12s %12s %12s'%('Re', 'sharp jump', 'blend jump', 'blend dNu/dRe'))
+
+    for switch in (5e2, 1e3, 2e5):
+        rey_pair = switch*np.array([1 - 1e-9, 1 + 1e-9])
+
+        (nu_sharp, _) = zukauskas(rey_pair, 1.0, 1.0, 1.2)
+        (nu_blend, dnu_blend) = zukauskas(rey_pair, 1.0, 1.0, 1.2, blend)
+
+        print('%10.0f %12.3e %12.3e %12.3e'%(switch, np.diff(nu_sharp)[0],
+                                             np.diff(nu_blend)[0], dnu_blend[0]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment
+# https://cortix.org
+"""Check of the phase history recording policies against the full history"""
+
+import numpy as np
+
+from cortix.support.quantity import Quantity
+
+from history import PhaseHistory
+
+def main():
+
+    # Preamble
+    n_steps = 2000
+    live_rows = 4
+
+    policies = (('all', None), ('every', 10), ('interval', 60.0), ('window', 60.0),
+                ('ring', 50))
+
+    # Irregular time steps, as with the adaptive time stepping
+    rng = np.random.default_rng(2)
+    times = np.concatenate(([0.0], np.cumsum(rng.uniform(0.5, 3.0, n_steps))))
+    temps = 500.0 + 50.0*np.sin(times/100.0) + rng.normal(0.0, 1.0, times.size)
+    concs = np.stack((np.cos(times/50.0), times/times[-1]), axis=1)
+
+    print('%-10s %8s %8s %8s'%('policy', 'value', 'rows', 'kept'))
+
+    for (policy, value) in policies:
+
+        temp = Quantity(name='temp', formal_name='T', unit='K', value=temps[0])
+        conc = Quantity(name='conc', formal_name='c', unit='', value=concs[0].copy())
+
+        phase = PhaseHistory(time_stamp=times[0], time_unit='s', quantities=[temp, conc])
+        phase.set_recording(policy, value, live_rows)
+
+        for (time, temp_value, conc_value) in zip(times[1:], temps[1:], concs[1:]):
+            phase.add_row(time, phase.get_row())
+            phase.set_value('temp', temp_value, time)
+            phase.set_value('conc', conc_value.copy(), time)
+
+        (quant, _) = phase.get_quantity_history('temp')
+        series = quant.value
+
+        kept_times = series.index.to_numpy()
+        kept_temps = series.to_numpy()
+        kept_concs = np.array(phase.get_quantity_history('conc')[0].value.tolist())
+
+        print('%-10s %8s %8i %8i'%(policy, value, times.size, kept_times.size))
+
+        # The live rows are always at full resolution
+        assert np.array_equal(kept_times[-live_rows:], times[-live_rows:]), policy
+        assert np.array_equal(kept_temps[-live_rows:], temps[-live_rows:]), policy
+
+        # Rows that went through the policy
+        n_retired = times.size - live_rows
+        (expected_times, expected_temps, expected_concs) = \
+            _expected(policy, value, times[:n_retired], temps[:n_retired],
+                      concs[:n_retired])
+
+        expected_times = np.concatenate((expected_times, times[n_retired:]))
+        expected_temps = np.concatenate((expected_temps, temps[n_retired:]))
+        expected_concs = np.concatenate((expected_concs, concs[n_retired:]))
+
+        assert np.array_equal(kept_times, expected_times), '%s: time stamps'%policy
+        assert np.allclose(kept_temps, expected_temps, rtol=1e-12, atol=0.0), \
+               '%s: scalar values'%policy
+        assert np.allclose(kept_concs, expected_concs, rtol=1e-12, atol=1e-15), \
+               '%s: array values'%policy
+
+        if policy == 'window':
+            n_windows = kept_times.size - live_rows
+            (low, _) = phase.get_quantity_history('temp', 'min')
+            (high, _) = phase.get_quantity_history('temp', 'max')
+            bins = ((times[:n_retired] - times[0])//value).astype(int)
+            for (k, time_bin) in enumerate(np.unique(bins)[:n_windows]):
+                window_temps = temps[:n_retired][bins == time_bin]
+                assert low.value.iloc[k] == window_temps.min(), 'window %i min'%k
+                assert high.value.iloc[k] == window_temps.max(), 'window %i max'%k
+
+    print('\nAll recording policies keep the expected rows.')
+
+def _expected(policy, value, times, temps, concs):
+    """Rows kept by `policy` out of the rows (`times`, `temps`, `concs`) older
+       than the live rows.
+    """
+
+    if policy == 'all':
+        return (times, temps, concs)
+
+    if policy == 'every':
+        keep = np.arange(times.size)%value == 0
+        return (times[keep], temps[keep], concs[keep])
+
+    bins = ((times - times[0])//value).astype(int)
+
+    if policy == 'interval':
+        keep = np.concatenate(([True], bins[1:] > bins[:-1]))
+        return (times[keep], temps[keep], concs[keep])
+
+    if policy == 'window':
+        # Time-weighted mean at the last row of each closed window; the weight
+        # of a row is the time since the previous row. The last window is
+        # still open.
+        weights = np.concatenate(([0.0], np.diff(times)))
+        last_rows = np.flatnonzero(bins[1:] > bins[:-1])
+        first_rows = np.concatenate(([0], last_rows[:-1] + 1))
+
+        means = [(weights[a:b+1, None]*np.column_stack((temps, concs))[a:b+1]).sum(axis=0)/
+                 weights[a:b+1].sum() for (a, b) in zip(first_rows, last_rows)]
+        means = np.array(means).reshape(-1, 1 + concs.shape[1])
+
+        return (times[last_rows], means[:, 0], means[:, 1:])
+
+    if policy == 'ring':
+        # Between `value` and 2*`value` most recent rows
+        n_kept = value + (times.size - value)%value
+        return (times[-n_kept:], temps[-n_kept:], concs[-n_kept:])
+
+    assert False, 'policy %r'%policy
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment
+# https://cortix.org
+"""Check of the streamed phase histories: the on-disk store reads back equal to the in-memory history"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from cortix.support.quantity import Quantity
+
+from history import PhaseHistory
+from history_store import HistoryReader
+
+def main():
+
+    # Preamble
+    n_steps = 5000
+    chunk_rows = 256
+
+    policies = (('all', None), ('every', 10), ('interval', 60.0), ('window', 60.0))
+
+    # Irregular time steps; a scalar, a vector and a non-numeric column
+    rng = np.random.default_rng(2)
+    times = np.concatenate(([0.0], np.cumsum(rng.uniform(0.5, 3.0, n_steps))))
+    temps = 500.0 + 50.0*np.sin(times/100.0) + rng.normal(0.0, 1.0, times.size)
+    concs = np.stack((np.cos(times/50.0), times/times[-1]), axis=1)
+    regimes = np.where(temps > 520.0, 'Two phases', 'Liquid')
+
+    print('%-10s %8s %8s %8s %8s'%('policy', 'value', 'rows', 'kept', 'stored'))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        for (policy, value) in policies:
+
+            path = os.path.join(tmp_dir, policy)
+
+            phases = list()
+
+            for stream in (False, True):
+
+                temp = Quantity(name='temp', formal_name='T', unit='K', value=temps[0])
+                conc = Quantity(name='conc', formal_name='c', unit='',
+                                value=concs[0].copy())
+                regime = Quantity(name='regime', formal_name='r', unit='',
+                                  value=str(regimes[0]))
+
+                phase = PhaseHistory(time_stamp=times[0], time_unit='s',
+                                     quantities=[temp, conc, regime])
+                phase.set_recording(policy, value)
+                if stream:
+                    phase.stream_to(path, chunk_rows)
+
+                for (time, temp_value, conc_value, regime_value) in \
+                    zip(times[1:], temps[1:], concs[1:], regimes[1:]):
+                    phase.add_row(time, phase.get_row())
+                    phase.set_value('temp', temp_value, time)
+                    phase.set_value('conc', conc_value.copy(), time)
+                    phase.set_value('regime', str(regime_value), time)
+
+                phase.flush()
+                phases.append(phase)
+
+            (memory, streamed) = phases
+            store = HistoryReader(path)
+
+            memory_df = memory.to_dataframe()
+
+            print('%-10s %8s %8i %8i %8i'%(policy, value, times.size, len(memory_df),
+                                           store.n_rows))
+
+            # Streamed history, and the store read on its own, against memory
+            for (label, df) in (('streamed', streamed.to_dataframe()),
+                                ('store', store.to_dataframe())):
+
+                assert np.array_equal(df.index, memory_df.index), \
+                       '%s %s: time stamps'%(policy, label)
+
+                for name in memory_df.columns:
+                    assert _equal(df[name], memory_df[name]), \
+                           '%s %s: column %r'%(policy, label, name)
+
+            if policy == 'window':
+                for statistic in ('min', 'max'):
+                    (quant, _) = streamed.get_quantity_history('temp', statistic)
+                    (memory_quant, _) = memory.get_quantity_history('temp', statistic)
+                    assert _equal(quant.value, memory_quant.value), \
+                           '%s: temp %s'%(policy, statistic)
+
+    print('\nAll streamed histories read back equal to the in-memory histories.')
+
+def _equal(series, other):
+    """Row by row equality of two columns of numbers, arrays or other values.
+    """
+
+    if len(series) != len(other):
+        return False
+
+    return all(np.array_equal(value, other_value)
+               for (value, other_value) in zip(series, other))
+
+if __name__ == '__main__':
+    main()
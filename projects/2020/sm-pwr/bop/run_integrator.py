@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment
+# https://cortix.org
+"""Check of the integrator methods against odeint on the SM-PWR start up and shutdown"""
+
+import time
+
+import numpy as np
+
+import unit
+from integrator import Integrator
+from reactor import SMPWR
+from water_table import WaterTable
+
+def main():
+
+    # Preamble
+    end_time = 20*unit.minute
+    time_step = 1.5*unit.second
+    shutdown_time = 15*unit.minute
+
+    # Max. relative difference to odeint (scaled by the largest value).
+    # The exponential Rosenbrock-Euler step samples the right-hand side at the
+    # start of the step only, so it does not resolve the jump of the heat
+    # transfer coefficient at the nucleate boiling cut-off (coolant flowrate
+    # below 142.5 kg/s after the shutdown) as tightly as the multistep solvers.
+    rtol = {'lsoda': 1e-4, 'bdf': 1e-4, 'radau': 1e-4, 'exponential': 2e-2}
+
+    quantities = (('neutron_phase', 'neutron-dens'),
+                  ('state_phase', 'core-temp'),
+                  ('state_phase', 'power'),
+                  ('coolant_outflow_phase', 'temp'),
+                  ('coolant_outflow_phase', 'flowrate'))
+
+    water_props = WaterTable(temp_range=(280, 595), press_range=(12.0, 14.0))
+
+    # Runs
+    histories = dict()
+
+    print('%-12s %8s %8s %8s %8s'%('method', 'wall [s]', 'n_rhs', 'n_jac', 'n_steps'))
+
+    for method in Integrator.methods:
+
+        reactor = SMPWR()
+        reactor.water_props = water_props
+        reactor.ode_method = method
+        reactor.time_step = time_step
+        reactor.end_time = end_time
+        reactor.inflow_cool_temp = unit.convert_temperature(497,'F','K')
+        reactor.shutdown = (True, shutdown_time)
+
+        start = time.time()
+        reactor.run()
+        wall_time = time.time() - start
+
+        integrator = reactor.integrator
+        print('%-12s %8.2f %8i %8i %8i'%(method, wall_time, integrator.n_rhs,
+                                         integrator.n_jac, integrator.n_steps))
+
+        histories[method] = [getattr(reactor, phase).df[name].to_numpy(dtype=np.float64)
+                             for (phase, name) in quantities]
+
+    # Agreement with odeint
+    print('\nMax. relative difference to odeint:')
+    print('%-12s'%'method' + ''.join(' %13s'%name for (_, name) in quantities))
+
+    reference = histories['odeint']
+
+    for method in Integrator.methods[1:]:
+
+        diffs = [np.max(np.abs(value - ref_value))/np.max(np.abs(ref_value))
+                 for (value, ref_value) in zip(histories[method], reference)]
+
+        print('%-12s'%method + ''.join(' %13.3e'%diff for diff in diffs))
+
+        for ((_, name), diff) in zip(quantities, diffs):
+            assert diff <= rtol[method], '%s %s: %.3e > %.1e'%(method, name, diff,
+                                                               rtol[method])
+
+    print('\nAll methods agree with odeint.')
+
+if __name__ == '__main__':
+    main()
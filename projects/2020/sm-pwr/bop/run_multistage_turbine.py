@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment
+# https://cortix.org
+"""Multi-stage turbine run file: expansion line and its cost vs the number of stages"""
+
+import time
+
+import numpy as np
+
+import iapws.iapws97 as steam_table
+from iapws import IAPWS97 as WaterProps
+
+import unit
+
+from multistage_turbine import MultiStageTurbine, expansion_line, stage_saturation
+
+def main():
+
+    # Preamble
+    inflow_temp = 580.0 # K
+    inflow_pressure = 34*unit.bar
+    vent_pressure = 0.008066866*unit.mega*unit.pascal
+    efficiency = 0.7784
+    n_repeat = 100
+
+    # Turbine module
+    turbine = MultiStageTurbine()
+
+    turbine.inflow_temp = inflow_temp
+    turbine.inflow_pressure = inflow_pressure
+    turbine.end_time = turbine.time_step
+
+    turbine.run()
+
+    print('Turbine power [MW] = %.3f'%(turbine.turbine_power/unit.mega))
+    print('%-14s %12s %12s'%('extraction', 'P [MPa]', 'heat [MW]'))
+    for (k, (press, heat_pwr)) in enumerate(zip(turbine.extraction_pressures,
+                                                turbine.extraction_heat_pwrs)):
+        print('%-14s %12.4f %12.3f'%('extraction-%i'%(k+1), press/unit.mega/unit.pascal,
+                                     heat_pwr/unit.mega))
+    print('Stage exhaust qualities: %s'%np.round(turbine.stage_qualities, 4))
+
+    # Cost vs number of stages
+    p_in = inflow_pressure/unit.mega/unit.pascal
+    p_out = vent_pressure/unit.mega/unit.pascal
+
+    inflow = steam_table._Region2(inflow_temp, p_in)
+
+    print('\nTime per expansion line [us]:')
+    print('%8s %12s %12s %14s'%('stages', 'vectorised', 'IAPWS97', 'max |dh| [kJ/kg]'))
+
+    for n_stages in (1, 2, 4, 8, 16, 32, 64):
+
+        press = np.geomspace(p_in, p_out, n_stages+1)
+        efficiencies = np.full(n_stages, efficiency)
+        sat = stage_saturation(press)
+
+        start = time.time()
+        for _ in range(n_repeat):
+            (enthalpy, _, _) = expansion_line(inflow['h'], inflow['s'], press,
+                                              efficiencies, sat)
+        line_time = (time.time() - start)/n_repeat
+
+        # One IAPWS97 object per stage
+        start = time.time()
+        state = WaterProps(T=inflow_temp, P=p_in)
+        enthalpy_ref = [state.h]
+        for j in range(n_stages):
+            h_ideal = WaterProps(P=press[j+1], s=state.s).h
+            state = WaterProps(P=press[j+1], h=state.h - efficiencies[j]*(state.h - h_ideal))
+            enthalpy_ref.append(state.h)
+        ref_time = time.time() - start
+
+        print('%8i %12.1f %12.1f %14.2e'%(n_stages, line_time*1e6, ref_time*1e6,
+                                          np.max(np.abs(enthalpy - enthalpy_ref))))
+
+if __name__ == '__main__':
+    main()
@@ -11,10 +11,15 @@ from cortix import Cortix
 from cortix import Network
 
 from reactor import SMPWR
+from water_table import WaterTable
 from steamer import Steamer
 from turbine import Turbine
 from condenser import Condenser
 from water_heater import WaterHeater
+from steady_state import primary_loop_steady_state
+from history import set_recording
+from history import stream_histories
+from shared_port import share_ports
 
 def main():
 
@@ -27,6 +32,26 @@ def main():
     time_step = 1.5*unit.second
     show_time = (True, 5*unit.minute)
 
+    # Start the reactor and steamer at the primary loop equilibrium with the
+    # nominal secondary inflow (see `steady_state.primary_loop_steady_state()`)
+    # instead of the cold start; the water heater starts at the nominal
+    # feedwater temperature, the other modules from their own state
+    steady_start = False
+
+    # Phase history recording (see `history.PhaseHistory.set_recording()`):
+    # {module name: {phase: (policy, value)}}; other phases keep every step
+    recording = dict()
+    #recording['SM-PWR'] = {'neutron_phase': ('interval', 10*unit.second)}
+
+    # Stream the phase histories to on-disk stores during the run (see
+    # `history.PhaseHistory.stream_to()`): (on/off, directory)
+    history_stores = (False, 'histories')
+
+    # Port messages as records in shared memory instead of pickled through
+    # pipes (see `shared_port.SharedPort`): (on/off, message keys)
+    shared_ports = (False, ('temperature', 'pressure', 'mass_flowrate', 'quality',
+                            'time_step', 'total_heat_power', ('breakpoints', 8)))
+
     plant = Cortix(use_mpi=False, splash=True) # System top level
 
     plant_net = plant.network = Network() # Network
@@ -35,8 +60,15 @@ def main():
     reactor = SMPWR()  # Create reactor module
     reactor.name = "SM-PWR"
 
+    # Tabulated coolant properties (12-14 MPa subcooled liquid)
+    reactor.water_props = WaterTable(temp_range=(280, 595), press_range=(12.0, 14.0))
+    reactor.ode_method = 'lsoda' # warm restarted stiff integrator
+
     reactor.shutdown = (True, 60*unit.minute)
 
+    # Network time step set by the reactor: (on/off, min, max)
+    reactor.adaptive_time_step = (True, time_step, 1*unit.minute)
+
     plant_net.module(reactor)  # Add reactor module to network
 
     # Steamer
@@ -45,6 +77,16 @@ def main():
 
     plant_net.module(steamer)  # Add steamer module to network
 
+    if steady_start:
+        # Nominal secondary inflow (NuScale feedwater)
+        steamer.secondary_inflow_temp = (149+273.15)*unit.kelvin
+        steamer.secondary_pressure = 34*unit.bar
+        steamer.secondary_mass_flowrate = 67*unit.kg/unit.second
+
+        reactor.inflow_cool_temp = unit.convert_temperature(497,'F','K') # initial guess
+
+        primary_loop_steady_state(reactor, steamer)
+
     # Turbine
 
     turbine = Turbine()  # Create reactor module
@@ -63,6 +105,9 @@ def main():
 
     water_heater.malfunction = (True, 30*unit.minute, 45*unit.minute)
 
+    if steady_start:
+        water_heater.set_state(steamer.secondary_inflow_temp)
+
     plant_net.module(water_heater)  # Add water_heater module to network
 
     # Balance of Plant Network Connectivity
@@ -85,6 +130,15 @@ def main():
             module.end_time = end_time
             module.show_time = show_time
 
+            for (phase, (policy, value)) in recording.get(module.name, dict()).items():
+                set_recording(module, policy, value, phases=[phase])
+
+            if history_stores[0]:
+                stream_histories(module, history_stores[1])
+
+        if shared_ports[0] and plant.use_multiprocessing:
+            share_ports(plant_net, shared_ports[1])
+
         plant.run()  # Run network dynamics simulation
 
     # Cortix run closure
@@ -316,6 +370,13 @@ def main():
         plt.grid()
         plt.savefig('condenser-outflow-temp.png', dpi=300)
 
+        (quant, time_unit) = condenser.state_phase.get_quantity_history('pressure')
+
+        quant.plot(x_scaling=1/unit.minute, y_scaling=1/unit.kilo, x_label='Time [m]',
+                   y_label=quant.latex_name+' [kPa]')
+        plt.grid()
+        plt.savefig('condenser-pressure.png', dpi=300)
+
         # Water heater plots
         water_heater = plant_net.modules[4]
 
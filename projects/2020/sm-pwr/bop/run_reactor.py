@@ -11,12 +11,14 @@ from cortix import Cortix
 from cortix import Network
 
 from reactor import SMPWR
+from water_table import WaterTable
 
 def main():
 
     # Debugging
     make_plots = True
     make_run   = True
+    steady_start = False # start from the steady state; no start up transient
 
     # Preamble
     end_time = 60*unit.minute
@@ -31,6 +33,10 @@ def main():
     reactor = SMPWR()  # Create reactor module
     reactor.name = "SM-PWR"
 
+    # Tabulated coolant properties (12-14 MPa subcooled liquid)
+    reactor.water_props = WaterTable(temp_range=(280, 595), press_range=(12.0, 14.0))
+    reactor.ode_method = 'lsoda' # warm restarted stiff integrator
+
     reactor.time_step = time_step
     reactor.end_time = end_time
     reactor.show_time = show_time
@@ -38,6 +44,10 @@ def main():
     # Steady state condition for NuScale case
     reactor.inflow_cool_temp = unit.convert_temperature(497,'F','K')
 
+    if steady_start:
+        (u_vec, rho_0) = reactor.steady_state()
+        reactor.set_state(u_vec, reactor.inflow_cool_temp, rho_0)
+
     reactor.shutdown = (True, 45*unit.minute)
 
     plant_net.module(reactor)  # Add reactor module to network
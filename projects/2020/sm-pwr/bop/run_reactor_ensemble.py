@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment
+# https://cortix.org
+"""SMPWR parameter sweep run file"""
+
+import time
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+import unit
+
+from reactor import SMPWR
+from reactor_ensemble import SMPWREnsemble
+from water_table import WaterTable
+
+def main():
+
+    # Debugging
+    make_plots = True
+
+    # Preamble
+    end_time = 60*unit.minute
+    time_step = 1.5*unit.second
+    n_workers = 1
+
+    # Prototype reactor
+    reactor = SMPWR()
+
+    reactor.water_props = WaterTable(temp_range=(280, 595), press_range=(12.0, 14.0))
+
+    reactor.time_step = time_step
+    reactor.end_time = end_time
+
+    # Steady state condition for NuScale case
+    reactor.inflow_cool_temp = unit.convert_temperature(497,'F','K')
+
+    reactor.shutdown = (True, 45*unit.minute)
+
+    # Sweep: control rod worth x shutdown time
+    alpha_n = np.linspace(-1e-5, -2e-5, 10)
+    shutdown_time = np.array([30, 45])*unit.minute
+
+    (alpha_n, shutdown_time) = [a.ravel() for a in np.meshgrid(alpha_n, shutdown_time)]
+
+    ensemble = SMPWREnsemble({'alpha_n': alpha_n, 'shutdown_time': shutdown_time},
+                             reactor=reactor)
+
+    # Run
+    start = time.time()
+    ensemble.run(n_workers=n_workers)
+    print('Ensemble of %i reactors; wall clock time [s] = %.1f'%
+          (ensemble.n_members, time.time()-start))
+
+    power = ensemble.history('power')
+    core_temp = ensemble.history('core-temp')
+
+    print('\n%12s %12s %16s %14s'%('alpha_n', 'shutdown [m]', 'max power [MW]',
+                                   'max T_f [C]'))
+    for i in range(ensemble.n_members):
+        print('%12.2e %12.1f %16.2f %14.2f'%(alpha_n[i], shutdown_time[i]/unit.minute,
+                                              power[:, i].max()/unit.mega,
+                                              core_temp[:, i].max()-273.15))
+
+    # Plots
+    if make_plots:
+
+        plt.figure()
+        plt.plot(ensemble.times/unit.minute, power/unit.mega)
+        plt.xlabel('Time [m]')
+        plt.ylabel(r'$P_{th}$ [MW]')
+        plt.grid()
+        plt.savefig('reactor-ensemble-power.png', dpi=300)
+
+        plt.figure()
+        plt.plot(ensemble.times/unit.minute, core_temp-273.15)
+        plt.xlabel('Time [m]')
+        plt.ylabel(r'$T_f$ [C]')
+        plt.grid()
+        plt.savefig('reactor-ensemble-core-temp.png', dpi=300)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment
+# https://cortix.org
+"""Check and timing of the shared-memory port transport: a ping-pong with an echo
+   process round-trips the messages in order, through the records or the pipe"""
+
+import multiprocessing as multiproc
+import time
+
+import numpy as np
+
+from cortix import Port
+
+from shared_port import SharedPort
+
+def main():
+
+    # Preamble
+    fields = ('temperature', 'pressure', 'mass_flowrate', 'quality', 'time_step',
+              'total_heat_power', ('breakpoints', 8))
+    n_slots = 4
+    n_repeat = 2000
+
+    # Messages of the modules' port exchange and messages off the schema (pipe)
+    messages = [
+        1.5,                                                    # time stamp
+        (3.0, 1.25e8),                                          # time, number
+        (4.5, {'temperature': 531.5, 'pressure': 12.8e6,        # time, dict
+               'mass_flowrate': 667.0, 'quality': 0.0}),
+        (6.0, {'time_step': 1.5}),                              # absent keys
+        (7.5, {'total_heat_power': 1.6e8, 'breakpoints': (900.0, 1800.0)}),
+        (9.0, {'breakpoints': ()}),                             # empty tuple
+        (10.5, {'temperature': 3}),                             # int as float
+        (12.0, {'temperature': 531.5, 'steam': 'dry'}),         # other key
+        (13.5, {'breakpoints': (60.0,)*9}),                     # tuple too long
+        (15.0, {'quality': True}),                              # bool
+        (16.5, np.linspace(0.0, 1.0, 5)),                       # array
+        'done?',                                                # other object
+        (18.0, [1.0, 2.0]),                                     # list
+        (19.5, {'temperature': 540.0}),
+    ]
+
+    # Ports connected as in a Cortix network, then shared
+    (port, other_port) = (Port('a', use_mpi=False), Port('b', use_mpi=False))
+    port.connect(other_port)
+
+    (port, other_port) = (SharedPort(port, fields), SharedPort(other_port, fields))
+    port.share(other_port, n_slots)
+
+    context = multiproc.get_context('spawn') # as Cortix starts the modules
+    echo_process = context.Process(target=_echo, args=(other_port,), daemon=True)
+    echo_process.start()
+
+    # Ping-pong: one message at a time
+    for message in messages:
+        port.send(message)
+        reply = port.recv()
+        assert _same(reply, message), 'ping-pong: sent %r, received %r'%(message, reply)
+
+    # Bursts filling the ring: order kept across the records and the pipe
+    for start in range(0, len(messages), n_slots):
+        burst = messages[start:start+n_slots]
+        for message in burst:
+            port.send(message)
+        for message in burst:
+            reply = port.recv()
+            assert _same(reply, message), 'burst: sent %r, received %r'%(message, reply)
+
+    print('%i messages round-tripped in order (ping-pong and bursts of %i)'%
+          (2*len(messages), n_slots))
+
+    # Timing of the per-step messages: shared records vs the pipe
+    message = messages[2]
+
+    start = time.time()
+    for _ in range(n_repeat):
+        port.send(message)
+        port.recv()
+    shared_time = (time.time() - start)/n_repeat
+
+    port.send(None) # stop the echo
+    echo_process.join()
+
+    assert echo_process.exitcode == 0, 'echo process exit code %r'%echo_process.exitcode
+
+    (pipe_port, other_pipe_port) = (Port('a', use_mpi=False), Port('b', use_mpi=False))
+    pipe_port.connect(other_pipe_port)
+
+    echo_process = context.Process(target=_echo, args=(other_pipe_port,),
+                                   daemon=True)
+    echo_process.start()
+
+    start = time.time()
+    for _ in range(n_repeat):
+        pipe_port.send(message)
+        pipe_port.recv()
+    pipe_time = (time.time() - start)/n_repeat
+
+    pipe_port.send(None)
+    echo_process.join()
+
+    print('\nRound trip time [us]: shared %.1f, pipe %.1f'%(shared_time*1e6,
+                                                            pipe_time*1e6))
+
+    print('\nThe shared port round-trips all messages in order.')
+
+def _echo(port):
+    """Send back every message received until None.
+    """
+
+    while True:
+        message = port.recv()
+        if message is None:
+            port.send(None)
+            return
+        port.send(message)
+
+def _same(reply, message):
+    """`reply` equals `message` as sent through a shared port: numbers as
+       float and tuples of floats in records, any value through the pipe.
+    """
+
+    if isinstance(message, np.ndarray):
+        return isinstance(reply, np.ndarray) and np.array_equal(reply, message)
+
+    if isinstance(message, dict):
+        return isinstance(reply, dict) and reply.keys() == message.keys() and \
+               all(_same(reply[key], value) for (key, value) in message.items())
+
+    if isinstance(message, (tuple, list)):
+        return type(reply) is type(message) and len(reply) == len(message) and \
+               all(_same(r, m) for (r, m) in zip(reply, message))
+
+    if type(message) is int:
+        return type(reply) is float and reply == message
+
+    return type(reply) is type(message) and reply == message
+
+if __name__ == '__main__':
+    main()
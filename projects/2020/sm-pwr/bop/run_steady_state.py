@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment
+# https://cortix.org
+"""Check of the primary loop steady state: the coupled reactor and steamer started
+   at the solved equilibrium stay there"""
+
+import time
+
+import numpy as np
+
+import unit
+
+from cortix import Cortix
+from cortix import Network
+
+from reactor import SMPWR
+from water_table import WaterTable
+from steamer import Steamer
+from steady_state import primary_loop_steady_state
+
+def main():
+
+    # Preamble
+    end_time = 20*unit.minute
+    time_step = 1.5*unit.second
+
+    # Largest drift allowed from the equilibrium: relative power, temperatures [K]
+    tolerances = (1e-6, 1e-4*unit.K, 1e-4*unit.K, 1e-4*unit.K)
+
+    plant = Cortix(use_mpi=False, splash=False) # System top level
+
+    plant_net = plant.network = Network() # Network
+
+    reactor = SMPWR()
+    reactor.name = 'SM-PWR'
+    reactor.water_props = WaterTable(temp_range=(280, 595), press_range=(12.0, 14.0))
+    reactor.shutdown = (False, end_time)
+    reactor.inflow_cool_temp = unit.convert_temperature(497, 'F', 'K') # initial guess
+
+    # Nominal secondary inflow; the secondary ports are left open and held there
+    steamer = Steamer()
+    steamer.name = 'Steamer'
+    steamer.secondary_inflow_temp = (149+273.15)*unit.kelvin
+    steamer.secondary_pressure = 34*unit.bar
+    steamer.secondary_mass_flowrate = 67*unit.kg/unit.second
+
+    start = time.time()
+    inflow_temp = primary_loop_steady_state(reactor, steamer)
+    solve_time = time.time() - start
+
+    equilibrium = _primary_loop_values(reactor, steamer, reactor.initial_time)
+
+    for module in (reactor, steamer):
+        module.time_step = time_step
+        module.end_time = end_time
+        module.show_time = (False, 5*unit.minute)
+        plant_net.module(module)
+
+    plant_net.connect([reactor, 'coolant-outflow'], [steamer, 'primary-inflow'])
+    plant_net.connect([steamer, 'primary-outflow'], [reactor, 'coolant-inflow'])
+
+    plant.run()
+
+    (reactor, steamer) = plant_net.modules
+
+    print('Steady state solve wall clock time [s]: %.2f'%solve_time)
+    print('Reactor coolant inflow temp [K]: %.4f'%inflow_temp)
+
+    # Largest drift from the equilibrium over the run
+    time_stamps = reactor.state_phase.time_stamps
+    values = np.array([_primary_loop_values(reactor, steamer, time_stamp)
+                       for time_stamp in time_stamps])
+
+    drift = np.max(np.abs(values - equilibrium), axis=0)
+    drift[0] /= equilibrium[0]
+
+    names = ('reactor power [W]', 'coolant outflow temp [K]', 'steamer primary temp [K]',
+             'steamer secondary temp [K]')
+
+    print('\n%-28s %16s %12s %10s'%('quantity', 'equilibrium', 'max drift', 'tolerance'))
+    for (name, value, d, tol) in zip(names, equilibrium, drift, tolerances):
+        print('%-28s %16.6e %12.3e %10.1e'%(name, value, d, tol))
+
+    plant.close()
+
+    assert len(time_stamps) > 1, 'no time steps run'
+
+    for (name, d, tol) in zip(names, drift, tolerances):
+        assert d <= tol, '%s drifted by %r from the equilibrium'%(name, d)
+
+    print('\nThe coupled primary loop stays at the solved equilibrium.')
+
+def _primary_loop_values(reactor, steamer, time_stamp):
+    """Reactor power, coolant outflow temperature, steamer primary and secondary
+       outflow temperatures at `time_stamp`.
+    """
+
+    return np.array([reactor.state_phase.get_value('power', time_stamp),
+                     reactor.coolant_outflow_phase.get_value('temp', time_stamp),
+                     steamer.primary_outflow_phase.get_value('temp', time_stamp),
+                     steamer.secondary_outflow_phase.get_value('temp', time_stamp)])
+
+if __name__ == '__main__':
+    main()
@@ -23,6 +23,7 @@ def main():
     end_time = 10*unit.minute
     time_step = 1.5*unit.second
     show_time = (True, 5*unit.minute)
+    axial_nodes = 0 # > 0: axial model (e.g. 20 nodes); 0: lumped model
 
     plant = Cortix(use_mpi=False, splash=True) # System top level
 
@@ -42,6 +43,7 @@ def main():
     steamer.time_step = time_step
     steamer.end_time = end_time
     steamer.show_time = show_time
+    steamer.axial_nodes = axial_nodes
 
     plant_net.module(steamer)  # Add steamer module to network
 
@@ -145,6 +147,15 @@ def main():
         plt.grid()
         plt.savefig('steamer-nusselt_s.png', dpi=300)
 
+        if axial_nodes > 0:
+
+            (quant, time_unit) = steamer.state_phase.get_quantity_history('dryout')
+
+            quant.plot(x_scaling=1/unit.minute, x_label='Time [m]',
+                       y_label=quant.latex_name+' ['+quant.unit+']')
+            plt.grid()
+            plt.savefig('steamer-dryout.png', dpi=300)
+
 
 if __name__ == '__main__':
     main()
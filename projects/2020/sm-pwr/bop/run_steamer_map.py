@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment
+# https://cortix.org
+"""Steamer performance map run file"""
+
+import time
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+import unit
+
+from steamer import Steamer
+from steamer_map import SteamerMap
+
+def main():
+
+    # Debugging
+    make_plots = True
+
+    # Preamble
+    n_workers = 1
+    filename = 'steamer-map.npz'
+
+    # Prototype steamer
+    steamer = Steamer()
+
+    # Smooth boiling onset: with the sharp onset the steamer does not settle when
+    # the wall superheat approaches the onset value (low primary inflow
+    # temperatures, high secondary pressures)
+    steamer.regime_blend = (0.0, 0.5*unit.K)
+
+    # Grid of inflow conditions
+    axes = dict()
+    axes['primary_inflow_temp'] = np.linspace(550, 590, 9)
+    axes['primary_mass_flowrate'] = np.linspace(500, 620, 4)
+    axes['secondary_pressure'] = np.array([30, 34, 38])*unit.bar
+    axes['secondary_inflow_temp'] = np.linspace(400, 430, 4)
+
+    # Build
+    start = time.time()
+    steamer_map = SteamerMap(axes, steamer, n_workers=n_workers)
+    print('Steamer map of %i points (%i failed); wall clock time [s] = %.1f'%
+          (np.prod([a.size for a in axes.values()]), steamer_map.n_failed,
+           time.time()-start))
+
+    steamer_map.save(filename)
+
+    steamer_map = SteamerMap.load(filename)
+
+    # Lookup vs steady state off the grid
+    inflow = {'primary_inflow_temp': 567.0, 'primary_mass_flowrate': 587.15,
+              'secondary_pressure': 34*unit.bar, 'secondary_inflow_temp': 410.5}
+
+    start = time.time()
+    outflow = steamer_map(**inflow)
+    lookup_time = time.time() - start
+
+    for (name, value) in inflow.items():
+        setattr(steamer, name, value)
+
+    start = time.time()
+    steamer.set_state(steamer.steady_state())
+    steady_state_time = time.time() - start
+
+    exact = (steamer.primary_outflow_temp, steamer.secondary_outflow_temp,
+             steamer.secondary_outflow_quality, -steamer.heat_sink_pwr)
+
+    print('\n%-26s %14s %14s'%('output', 'map', 'steady state'))
+    for (name, value) in zip(steamer_map.output_names, exact):
+        print('%-26s %14.5g %14.5g'%(name, outflow[name], value))
+    print('%-26s %14.2e %14.2e'%('time [s]', lookup_time, steady_state_time))
+
+    # Plots
+    if make_plots:
+
+        temps = np.linspace(550, 590, 81)
+        outflow = steamer_map(primary_inflow_temp=temps, primary_mass_flowrate=587.15,
+                              secondary_pressure=34*unit.bar, secondary_inflow_temp=410.5)
+
+        plt.figure()
+        plt.plot(temps-273.15, outflow['secondary_outflow_temp']-273.15)
+        plt.xlabel(r'$T_{1,in}$ [C]')
+        plt.ylabel(r'$T_2$ [C]')
+        plt.grid()
+        plt.savefig('steamer-map-secondary-outflow-temp.png', dpi=300)
+
+        plt.figure()
+        plt.plot(temps-273.15, outflow['heat_transfer_pwr']/unit.mega)
+        plt.xlabel(r'$T_{1,in}$ [C]')
+        plt.ylabel(r'$\dot{Q}$ [MW]')
+        plt.grid()
+        plt.savefig('steamer-map-heat-transfer-pwr.png', dpi=300)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment
+# https://cortix.org
+"""Accuracy and timing report of the tabulated water properties against IAPWS97"""
+
+import time
+
+import numpy as np
+
+from iapws import IAPWS97 as WaterProps
+
+from water_table import WaterTable
+
+def main():
+
+    # Preamble
+    temp_range = (280, 595) # K
+    press_range = (12.0, 14.0) # MPa
+    n_samples = 1000
+
+    start = time.time()
+    table = WaterTable(temp_range=temp_range, press_range=press_range)
+    build_time = time.time() - start
+
+    print('Table grid (T x P): %i x %i; build time [s] = %.2f'%
+          (table.n_temp, table.n_press, build_time))
+
+    # Accuracy
+    report = table.accuracy_report(n_samples=n_samples)
+
+    print('\n%-14s %14s %14s'%('property', 'max rel. err', 'mean rel. err'))
+    for (name, (max_err, mean_err)) in report.items():
+        print('%-14s %14.3e %14.3e'%(name, max_err, mean_err))
+
+    # Timing
+    rng = np.random.default_rng(2)
+    temps = rng.uniform(*temp_range, n_samples)
+    presses = rng.uniform(*press_range, n_samples)
+
+    start = time.time()
+    for (temp, press) in zip(temps, presses):
+        WaterProps(T=temp, P=press)
+    exact_time = (time.time() - start)/n_samples
+
+    start = time.time()
+    for (temp, press) in zip(temps, presses):
+        table(T=temp, P=press)
+    table_time = (time.time() - start)/n_samples
+
+    start = time.time()
+    table.evaluate(temps, presses)
+    vector_time = (time.time() - start)/n_samples
+
+    print('\nTime per (T, P) query [us]:')
+    print('  IAPWS97          %10.2f'%(exact_time*1e6))
+    print('  table (scalar)   %10.2f  speedup %6.1f'%(table_time*1e6, exact_time/table_time))
+    print('  table (vector)   %10.2f  speedup %6.1f'%(vector_time*1e6, exact_time/vector_time))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Saturation-state cache shared by the BOP modules.
+
+   Saturated liquid (x=0) and saturated vapor (x=1) states are memoized on the
+   pressure quantized to `press_tol`. The state is evaluated at the quantized
+   pressure so the result does not depend on the order of the queries.
+
+   Each process (Cortix module) gets its own `saturation_cache` instance.
+"""
+
+from collections import OrderedDict
+
+from iapws import IAPWS97 as WaterProps
+
+class SaturationCache:
+    """Bounded LRU cache of saturation states.
+
+    Parameters
+    ----------
+    press_tol: float
+        Pressure quantization tolerance [MPa].
+    max_size: int
+        Maximum number of cached states.
+    water_props: callable
+        Property backend with the IAPWS97 `(P=, x=)` signature.
+
+    Attributes
+    ----------
+    hits: int
+        Number of queries served from the cache.
+    misses: int
+        Number of queries that required a saturation solve.
+    """
+
+    def __init__(self, press_tol=1e-6, max_size=64, water_props=WaterProps):
+
+        assert press_tol > 0.0
+        assert max_size > 0
+
+        self.press_tol = press_tol
+        self.max_size = max_size
+        self.water_props = water_props
+
+        self.hits = 0
+        self.misses = 0
+
+        self.__states = OrderedDict()
+
+    def __call__(self, P, x):
+        """Saturation state at pressure `P` [MPa]; `x` must be 0 or 1.
+        """
+
+        assert x in (0, 1), 'x = %r; only saturation end points are cached'%x
+
+        key = (round(P/self.press_tol), int(x))
+
+        state = self.__states.get(key)
+
+        if state is not None:
+            self.hits += 1
+            self.__states.move_to_end(key)
+            return state
+
+        self.misses += 1
+
+        state = self.water_props(P=key[0]*self.press_tol, x=float(x))
+
+        self.__states[key] = state
+        if len(self.__states) > self.max_size:
+            self.__states.popitem(last=False)
+
+        return state
+
+    def liquid(self, P):
+        """Saturated liquid state at pressure `P` [MPa].
+        """
+
+        return self(P, 0)
+
+    def vapor(self, P):
+        """Saturated vapor state at pressure `P` [MPa].
+        """
+
+        return self(P, 1)
+
+    def clear(self):
+        """Drop all cached states and reset the counters.
+        """
+
+        self.__states.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+
+        return len(self.__states)
+
+    def __str__(self):
+
+        return 'SaturationCache: size=%i/%i, hits=%i, misses=%i, press_tol=%r MPa'%\
+               (len(self), self.max_size, self.hits, self.misses, self.press_tol)
+
+saturation_cache = SaturationCache()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Steady state initialisation of the primary loop (SMPWR and steamer).
+
+   Instead of marching the start up transient until the plant settles, the
+   equilibrium of the reactor-steamer loop is solved for and both modules are
+   seeded with it.
+
+   The loop is closed on the reactor coolant inflow temperature `T_in`: the
+   reactor equilibrium at `T_in` gives the coolant outflow temperature and
+   flowrate, the steamer equilibrium at those inflow conditions gives its
+   primary outflow temperature `T_p`, and the secant method solves
+   `T_p(T_in) - T_in = 0`. Each inner equilibrium is a bracketed (reactor) or
+   safeguarded Newton (steamer) solve; a single Newton-Krylov solve of the
+   whole system does not converge reliably across the boiling onset
+   discontinuities of the heat transfer correlations.
+
+   The primary pressure of the steamer is set to the reactor coolant pressure
+   (the steamer returns it to the reactor); the secondary inflow conditions of
+   the steamer are taken as given and must be subcooled.
+"""
+
+from scipy.optimize import newton
+
+def primary_loop_steady_state(reactor, steamer, power=None, inflow_temp=None, xtol=1e-8):
+    """Solve for the primary loop equilibrium and seed the modules.
+
+    Parameters
+    ----------
+    reactor: SMPWR
+    steamer: Steamer
+    power: float or None
+        Reactor thermal power [W]; if given the reference reactivity of the
+        reactor is adjusted, otherwise it is kept and the power follows.
+    inflow_temp: float or None
+        Initial guess of the reactor coolant inflow temperature [K]; default
+        `reactor.inflow_cool_temp`.
+    xtol: float
+        Tolerance of the coolant inflow temperature [K].
+
+    Returns
+    -------
+    inflow_temp: float
+        Reactor coolant inflow temperature [K].
+    """
+
+    def loop(inflow_temp):
+
+        (u_vec, rho_0) = reactor.steady_state(inflow_temp, power)
+
+        steamer.primary_inflow_temp = u_vec[-1]
+        steamer.primary_mass_flowrate = u_vec[-3]
+        steamer.primary_pressure = reactor.coolant_pressure
+
+        u_steamer = steamer.steady_state()
+
+        return (u_vec, rho_0, u_steamer)
+
+    if inflow_temp is None:
+        inflow_temp = reactor.inflow_cool_temp
+
+    inflow_temp = newton(lambda temp: loop(temp)[2][0] - temp, inflow_temp, tol=xtol)
+
+    (u_vec, rho_0, u_steamer) = loop(inflow_temp)
+
+    reactor.set_state(u_vec, inflow_temp, rho_0)
+    steamer.set_state(u_steamer)
+
+    return inflow_temp
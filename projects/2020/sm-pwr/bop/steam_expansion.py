@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Steam expansion to a fixed outflow pressure for the turbine module.
+
+   The IAPWS-97 region and backward equations used by the expansion are
+   evaluated once per state and memoized: the inflow state on the (T, P)
+   quantized to (`temp_tol`, `press_tol`), the outflow state on the enthalpy
+   quantized to `enthalpy_tol`. As in `saturation`, the states are evaluated at
+   the quantized values so the results do not depend on the order of the
+   queries.
+
+   The saturation end points at the outflow pressure are computed once, and the
+   isentropic outflow enthalpy h(s) of the single phase regions is tabulated
+   (cubic splines on the region 1 and 2 equations); entropies outside the
+   tables fall back to the backward equations.
+
+   Units follow iapws.iapws97: T [K], P [MPa], h [kJ/kg], s [kJ/kg-K].
+"""
+
+import logging
+from collections import OrderedDict
+
+import numpy as np
+from scipy.interpolate import CubicSpline
+
+import iapws.iapws97 as steam_table
+
+class SteamExpansion:
+    """Memoized steam expansion engine.
+
+    Parameters
+    ----------
+    outflow_press: float
+        Outflow (vent) pressure [MPa].
+    temp_tol: float
+        Inflow temperature quantization tolerance [K].
+    press_tol: float
+        Inflow pressure quantization tolerance [MPa].
+    enthalpy_tol: float
+        Outflow enthalpy quantization tolerance [kJ/kg].
+    max_size: int
+        Maximum number of memoized states of each kind.
+    n_table: int
+        Number of temperature nodes of each h(s) table.
+    rtol: float
+        Maximum relative error of the h(s) tables at the cell midpoints; a
+        warning is logged if it is not met.
+
+    Attributes
+    ----------
+    bubl: dict
+        Saturated liquid state (region 4) at the outflow pressure.
+    dew: dict
+        Saturated vapor state (region 4) at the outflow pressure.
+    hits: int
+        Number of queries served from the memo.
+    misses: int
+        Number of queries that required an IAPWS-97 evaluation.
+
+    Examples
+    --------
+    >>> expansion = SteamExpansion(0.008066866)
+    >>> (h_in, s_in) = expansion.inflow_state(580.0, 3.4)
+    >>> (temp_out, quality) = expansion.outflow_state(expansion.isentropic_enthalpy(s_in))
+    """
+
+    def __init__(self, outflow_press, temp_tol=1e-6, press_tol=1e-6, enthalpy_tol=1e-6,
+                 max_size=256, n_table=201, rtol=1e-8):
+
+        assert temp_tol > 0.0 and press_tol > 0.0 and enthalpy_tol > 0.0
+        assert max_size > 0
+
+        self.log = logging.getLogger('cortix')
+
+        self.outflow_press = outflow_press
+        self.temp_tol = temp_tol
+        self.press_tol = press_tol
+        self.enthalpy_tol = enthalpy_tol
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+
+        self.bubl = steam_table._Region4(outflow_press, 0)
+        self.dew = steam_table._Region4(outflow_press, 1)
+
+        self.__inflow_states = OrderedDict()
+        self.__outflow_states = OrderedDict()
+
+        # h(s) at the outflow pressure: region 1 below the bubble point, region 2
+        # above the dew point up to the region 2 temperature limit
+        temps_1 = np.linspace(273.15, self.bubl['T'], n_table)
+        temps_2 = np.linspace(self.dew['T'], 1073.15, n_table)
+
+        self.__table_1 = self.__build_table(steam_table._Region1, temps_1, rtol)
+        self.__table_2 = self.__build_table(steam_table._Region2, temps_2, rtol)
+
+    def inflow_state(self, temp, press):
+        """Enthalpy and entropy of steam (region 2) at `temp` [K] and `press`
+           [MPa].
+
+        Returns
+        -------
+        (h, s): tuple
+        """
+
+        key = (round(temp/self.temp_tol), round(press/self.press_tol))
+
+        def evaluate():
+            state = steam_table._Region2(key[0]*self.temp_tol, key[1]*self.press_tol)
+            return (state['h'], state['s'])
+
+        return self.__memo(self.__inflow_states, key, evaluate)
+
+    def isentropic_enthalpy(self, entropy):
+        """Enthalpy at the outflow pressure and the specific entropy `entropy`.
+        """
+
+        bubl = self.bubl
+        dew = self.dew
+
+        # Two phase mixture
+        if bubl['s'] < entropy < dew['s']:
+            quality = (entropy - bubl['s']) / (dew['s'] - bubl['s'])
+            return bubl['h'] + quality * (dew['h'] - bubl['h'])
+
+        # Superheated
+        if entropy >= dew['s']:
+            (table, backward, region) = (self.__table_2, steam_table._Backward2_T_Ps,
+                                         steam_table._Region2)
+        # Subcooled
+        else:
+            (table, backward, region) = (self.__table_1, steam_table._Backward1_T_Ps,
+                                         steam_table._Region1)
+
+        if table.x[0] <= entropy <= table.x[-1]:
+            return float(table(entropy))
+
+        temp = backward(self.outflow_press, entropy)
+
+        return region(temp, self.outflow_press)['h']
+
+    def outflow_state(self, enthalpy):
+        """Temperature and quality at the outflow pressure and the specific
+           enthalpy `enthalpy`.
+
+        Returns
+        -------
+        (temp, quality): tuple
+        """
+
+        bubl = self.bubl
+        dew = self.dew
+
+        # Two phase mixture
+        if bubl['h'] <= enthalpy <= dew['h']:
+            quality = (enthalpy - bubl['h'])/(dew['h'] - bubl['h'])
+            return (bubl['T'], quality)
+
+        key = round(enthalpy/self.enthalpy_tol)
+
+        # Subcooled liquid
+        if enthalpy < bubl['h']:
+            evaluate = lambda: (steam_table._Backward1_T_Ph(self.outflow_press,
+                                                            key*self.enthalpy_tol), 0)
+        # Superheated steam
+        else:
+            evaluate = lambda: (steam_table._Backward2_T_Ph(self.outflow_press,
+                                                            key*self.enthalpy_tol), 1)
+
+        return self.__memo(self.__outflow_states, key, evaluate)
+
+    def clear(self):
+        """Drop all memoized states and reset the counters.
+        """
+
+        self.__inflow_states.clear()
+        self.__outflow_states.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __memo(self, states, key, evaluate):
+        """Memoized `evaluate()` on `key` in the LRU dict `states`.
+        """
+
+        value = states.get(key)
+
+        if value is not None:
+            self.hits += 1
+            states.move_to_end(key)
+            return value
+
+        self.misses += 1
+
+        value = evaluate()
+
+        states[key] = value
+        if len(states) > self.max_size:
+            states.popitem(last=False)
+
+        return value
+
+    def __build_table(self, region, temps, rtol):
+        """Cubic spline of h(s) at the outflow pressure on the `region` states at
+           `temps`.
+        """
+
+        states = [region(temp, self.outflow_press) for temp in temps]
+
+        table = CubicSpline([state['s'] for state in states],
+                            [state['h'] for state in states])
+
+        # Accuracy at the cell midpoints
+        max_err = 0.0
+        for temp in (temps[:-1] + temps[1:])/2:
+            state = region(temp, self.outflow_press)
+            max_err = max(max_err, abs(table(state['s']) - state['h'])/abs(state['h']))
+
+        if max_err > rtol:
+            self.log.warning('SteamExpansion: h(s) table rtol = %r not met; '
+                             'max rel. error = %r'%(rtol, max_err))
+
+        return table
+
+    def __str__(self):
+
+        return 'SteamExpansion: P_out=%r MPa, size=%i+%i/%i, hits=%i, misses=%i'%\
+               (self.outflow_press, len(self.__inflow_states), len(self.__outflow_states),
+                self.max_size, self.hits, self.misses)
@@ -31,16 +31,32 @@ import logging
 
 import math
 from scipy.integrate import odeint
+from scipy.optimize import root
 import numpy as np
 
 import unit
 
 from iapws import IAPWS97 as WaterProps
 
+from saturation import saturation_cache
+from integrator import Integrator, Event
+from heat_transfer import zukauskas, jens_lottes, nucleate_boiling, smooth_step
+
 from cortix import Module
-from cortix.support.phase_new import PhaseNew as Phase
+from history import PhaseHistory as Phase
+from history import reserve_histories
+from history import flush_histories
 from cortix import Quantity
 
+DRYOUT_TRANSITION = 0.05 # quality width of the transition boiling (axial model)
+
+# Secondary flow regimes of the lumped model (see _outflow_quality())
+FLOW_REGIMES = ('subcooled', 'two-phase', 'slowed-superheated', 'superheated')
+
+# Divides the lumped model heat transfer rate for the correlation to work with
+# the NuScale specs (steamer_rhs() and steamer_jac())
+HEAT_TRANSFER_CALIBRATION = 2.61
+
 class Steamer(Module):
     """Steam generator.
 
@@ -50,6 +66,31 @@ class Steamer(Module):
     modules: reactor, turbine.
     See instance attribute `port_names_expected`.
 
+    The model equations are the pure functions `steamer_rhs()` and
+    `steamer_jac()` of the state and of the parameters returned by
+    `parameters()`; the module records their diagnostics at the end of each
+    time step.
+
+    The secondary flow regime of the lumped model (`flow_regime`, one of
+    `FLOW_REGIMES`) sets the outflow quality and residence time formulas. It is
+    a discrete state: fixed within the integration, so that the right-hand side
+    is smooth, and switched at the events where the state leaves the regime by
+    more than the hysteresis band `regime_hysteresis`, or between time steps
+    when the inflow conditions moved the state out of it.
+
+    With `axial_nodes > 0` the lumped model is replaced by the axial model
+    `axial_steamer_rhs()`: the coil is divided into nodes along its length,
+    each with the primary temperature and the secondary specific enthalpy as
+    unknowns. The primary flows from the last node to the first (counter flow)
+    and the secondary from the first to the last, through the subcooled,
+    nucleate boiling, post dryout and superheated zones. The heat transfer
+    needs no calibration and the dryout position is tracked. The Jacobian is
+    banded (2 lower and 2 upper diagonals) and the cost of a time step is
+    linear in the number of nodes.
+
+    With a `performance_map` (see `steamer_map`) the steamer is quasi-static:
+    its outflow is the tabulated steady state at the current inflow conditions.
+
     """
 
     def __init__(self, primary_inflow_temp=20+273.15, secondary_inflow_temp=20+273.15):
@@ -104,6 +145,39 @@ class Steamer(Module):
         # Ratio of the tube bundle pithc transverse to flow to parallel to flow
         self.tube_bundle_pitch_ratio = 1.5  # st/sl
 
+        # Half widths of the regime transitions of the heat transfer correlations
+        # (see heat_transfer): (ln Re, wall superheat [K]); 0 for sharp switches
+        self.regime_blend = (0.0, 0.0)
+
+        # Secondary flow regime (lumped model) and the hysteresis band of its
+        # changes: (equilibrium quality, secondary temperature [K])
+        self.flow_regime = 'subcooled'
+        self.regime_hysteresis = (0.01, 1.0*unit.K)
+
+        # Axial model: number of nodes along the coil; 0 selects the lumped model
+        self.axial_nodes = 0
+        self.dryout_quality = 0.9 # critical quality of the boiling crisis
+        self.dryout_position = 0.0 # distance from the secondary inlet
+
+        self.__axial_state = None # axial profiles at the current time
+
+        # Steady state performance map (steamer_map.SteamerMap); when set the
+        # outflow follows the map at the inflow conditions instead of the dynamics
+        self.performance_map = None
+
+        # Water property backend: IAPWS97 or any callable with its signature
+        # (e.g. water_table.WaterTable). Properties are evaluated once per time
+        # step at the outflow temperatures and kept over the step; only the
+        # boiling heat transfer coefficient follows the state within the step.
+        self.water_props = WaterProps
+
+        # ODE integrator: one of integrator.Integrator.methods; cold restarted
+        # every time step (the properties change); the Jacobian is analytic
+        self.ode_method = 'odeint'
+        self.integrator = None
+
+        self.__params = None # model parameters over the time step
+
         # Initialization
         self.primary_inflow_temp = primary_inflow_temp
 
@@ -122,6 +196,8 @@ class Steamer(Module):
 
         self.secondary_outflow_quality = 0 # running value of quality
 
+        self.__breakpoints = () # secondary loop event times
+
         # Derived quantities
         self.rho_p = 0.0
         self.cp_p = 0.0
@@ -141,6 +217,9 @@ class Steamer(Module):
 
         self.heat_sink_pwr = 0.0
 
+        self.tau_p = 0.0
+        self.tau_s = 0.0
+
         # Primary outflow phase history
         quantities = list()
 
@@ -266,15 +345,41 @@ class Steamer(Module):
 
         quantities.append(nusselt_s)
 
+        dryout = Quantity(name='dryout',
+                        formal_name='z_d', unit='m',
+                        value=0.0,
+                        latex_name=r'$z_{d}$',
+                        info='Steamer Dryout Position (axial model)')
+
+        quantities.append(dryout)
+
         self.state_phase = Phase(time_stamp=self.initial_time,
                                  time_unit='s', quantities=quantities)
 
     def run(self, *args):
 
+        max_n_steps_per_time_step = 1500 # max number of nonlinear algebraic solver
+                                         # iterations per time step
+
+        if self.axial_nodes > 0:
+            self.integrator = Integrator(self.__f_vec_axial, self.__jac_axial,
+                                         method=self.ode_method, rtol=1e-7, atol=1e-8,
+                                         max_n_steps=max_n_steps_per_time_step,
+                                         band=(2, 2))
+        else:
+            regime_change = Event(self.__regime_exit, self.__regime_transition,
+                                  direction=1, once=False)
+            self.integrator = Integrator(self.__f_vec, self.__jac, method=self.ode_method,
+                                         rtol=1e-7, atol=1e-8,
+                                         max_n_steps=max_n_steps_per_time_step,
+                                         events=[regime_change])
+
         # Some logic for logging time stamps
         if self.initial_time + self.time_step > self.end_time:
             self.end_time = self.initial_time + self.time_step
 
+        reserve_histories(self)
+
         time = self.initial_time
 
         print_time = self.initial_time
@@ -308,6 +413,416 @@ class Steamer(Module):
 
         self.end_time = time # correct the final time if needed
 
+        flush_histories(self) # on-disk stores, if streamed
+
+        if self.show_time[0]:
+            self.log.info(self.name+'::run(): '+str(saturation_cache))
+            self.log.info(self.name+'::run(): '+str(self.integrator))
+
+        self.integrator.close() # keep the counters only
+
+    def steady_state(self, max_time=40*unit.minute, min_time_step=0.1*unit.second):
+        """Equilibrium outflow temperatures at the current inflow conditions.
+
+        The boiling regime makes the balance equations multivalued (e.g. a dry
+        out branch at quality 1) so a Newton (hybrid Powell) solve from a
+        nominal guess is accepted only in the two-phase regime; otherwise the
+        ODE system is marched in time (pseudo-transient) towards its attractor
+        before the Newton solve.
+
+        An interval of the march the integrator fails on (e.g. a stiff boiling
+        onset) is retried shorter, down to `min_time_step`.
+
+        The axial model is marched in time until its profiles settle.
+
+        Parameters
+        ----------
+        max_time: float
+            Duration of the pseudo-transient [s].
+        min_time_step: float
+            Shortest interval of the pseudo-transient [s].
+
+        Returns
+        -------
+        u_vec: numpy.ndarray
+            Primary and secondary outflow temperatures [K]; with the axial model
+            the profiles (see `axial_steamer_rhs()`), whose first entry is also
+            the primary outflow temperature.
+
+        Raises
+        ------
+        ValueError
+            Secondary inflow not subcooled, or no equilibrium found.
+        """
+
+        press_s_MPa = self.secondary_pressure/unit.mega/unit.pascal
+        temp_s_sat = saturation_cache.liquid(press_s_MPa).T
+
+        if not self.secondary_inflow_temp < temp_s_sat:
+            raise ValueError('secondary inflow temp %.2f K not subcooled at P = %.2f MPa (Tsat = %.2f K)'%
+                             (self.secondary_inflow_temp, press_s_MPa, temp_s_sat))
+
+        if self.axial_nodes > 0:
+            return self.__axial_steady_state()
+
+        def residual(u_vec):
+            (_, f_vec, _) = self.__consistent_state(u_vec)
+            return f_vec
+
+        u_0 = np.array([self.primary_inflow_temp - 40*unit.K,
+                        self.primary_inflow_temp + 35*unit.K])
+
+        try:
+            sol = root(residual, u_0, method='hybr', options={'xtol':1e-10})
+            if sol.success:
+                (_, _, diagnostics) = self.__consistent_state(sol.x)
+                if 0.0 < diagnostics['secondary_outflow_quality'] < 1.0:
+                    return sol.x
+        except NotImplementedError: # IAPWS97 out of bounds trial state
+            pass
+
+        time = 0.0
+        time_step = 10*unit.second
+
+        while time < max_time:
+            # flow regime held over the interval (smooth right-hand side)
+            (self.__params, _, diagnostics) = self.__consistent_state(u_0)
+            self.__params['flow_regime'] = diagnostics['flow_regime']
+            (u_vec_hist, info_dict) = odeint(self.__f_vec, u_0, [time, time+time_step],
+                                             Dfun=self.__jac, rtol=1e-7, atol=1e-8,
+                                             mxstep=5000, full_output=True)
+            if info_dict['message'] != 'Integration successful.':
+                time_step /= 4
+                if time_step < min_time_step:
+                    raise ValueError('steamer pseudo-transient failed at t = %r s: %s'%
+                                     (time, info_dict['message']))
+                continue
+            u_0 = u_vec_hist[1, :]
+            time += time_step
+            time_step = min(2*time_step, 1*unit.minute)
+
+        try:
+            sol = root(residual, u_0, method='hybr', options={'xtol':1e-10})
+        except NotImplementedError: # IAPWS97 out of bounds trial state
+            raise ValueError('steamer steady state out of the property bounds near %s K'%u_0)
+
+        if not sol.success:
+            raise ValueError('steamer steady state not converged: %s'%sol.message)
+
+        return sol.x
+
+    def set_state(self, u_vec):
+        """Start the run from the outflow temperatures `u_vec` (e.g. a steady
+           state).
+        """
+
+        time = self.initial_time
+
+        if self.axial_nodes > 0:
+            params = self.axial_parameters(u_vec)
+            (_, diagnostics) = axial_steamer_rhs(u_vec, params)
+            self.__axial_state = np.array(u_vec)
+            u_vec = [diagnostics['primary_outflow_temp'],
+                     diagnostics['secondary_outflow_temp']]
+        else:
+            (params, _, diagnostics) = self.__consistent_state(u_vec)
+
+        self.__update_derived(params, diagnostics)
+
+        self.primary_outflow_temp = u_vec[0]
+        self.secondary_outflow_temp = u_vec[1]
+
+        self.primary_outflow_phase.set_value('temp', u_vec[0], time)
+        self.primary_outflow_phase.set_value('flowrate', self.primary_mass_flowrate, time)
+
+        self.secondary_inflow_phase.set_value('temp', self.secondary_inflow_temp, time)
+        self.secondary_inflow_phase.set_value('flowrate', self.secondary_mass_flowrate, time)
+
+        self.secondary_outflow_phase.set_value('temp', u_vec[1], time)
+        self.secondary_outflow_phase.set_value('flowrate', self.secondary_mass_flowrate, time)
+        self.secondary_outflow_phase.set_value('pressure', self.secondary_pressure, time)
+        self.secondary_outflow_phase.set_value('quality', self.secondary_outflow_quality, time)
+
+        self.state_phase.set_value('tau_p', self.tau_p, time)
+        self.state_phase.set_value('tau_s', self.tau_s, time)
+        self.state_phase.set_value('heatflux', -self.heat_sink_pwr/self.heat_transfer_area, time)
+        self.state_phase.set_value('nusselt_p', self.nusselt_p, time)
+        self.state_phase.set_value('nusselt_s', self.nusselt_s, time)
+        self.state_phase.set_value('dryout', self.dryout_position, time)
+
+    def parameters(self, u_vec, quality=None):
+        """Parameters of the steamer model `steamer_rhs()` at the outflow
+           temperatures `u_vec`.
+
+        The design data, the inflow conditions, the flow regime and its
+        hysteresis band, and the thermophysical properties evaluated at `u_vec`
+        (the secondary ones for the flow regime of `quality`; default the
+        current outflow quality). The parameters are kept over a time step.
+
+        Returns
+        -------
+        params: dict
+        """
+
+        temp_p = u_vec[0]
+        temp_s = u_vec[1]
+
+        if quality is None:
+            quality = self.secondary_outflow_quality
+
+        params = dict()
+
+        # Design data
+        params['heat_transfer_area'] = self.heat_transfer_area
+        params['primary_volume'] = self.primary_volume
+        params['secondary_volume'] = self.secondary_volume
+        params['helicoil_inner_radius'] = self.helicoil_inner_radius
+        params['wall_temp_delta'] = self.wall_temp_delta_primary + \
+                                    self.wall_temp_delta_secondary
+        params['boiling_blend'] = self.regime_blend[1]
+
+        # Flow regime (None for the equilibrium regime without hysteresis)
+        params['flow_regime'] = self.flow_regime
+        params['regime_hysteresis'] = self.regime_hysteresis
+
+        # Inflow conditions
+        params['primary_inflow_temp'] = self.primary_inflow_temp
+        params['primary_mass_flowrate'] = self.primary_mass_flowrate
+        params['secondary_inflow_temp'] = self.secondary_inflow_temp
+        params['secondary_mass_flowrate'] = self.secondary_mass_flowrate
+        params['secondary_pressure'] = self.secondary_pressure
+
+        #-------------------------------------------
+        # Primary properties and heat transfer
+        #-------------------------------------------
+
+        h_p = self.__heat_transfer_coeff_primary(temp_p, params)
+
+        params['resistance_p'] = self.__resistance_primary(h_p)
+
+        radius_inner = self.helicoil_inner_radius
+
+        #-------------------------------------------
+        # Secondary properties
+        #-------------------------------------------
+
+        press_s_MPa = self.secondary_pressure/unit.mega/unit.pascal
+
+        if quality in (0, 1):
+            water_s = self.water_props(T=temp_s, P=press_s_MPa)
+            params['rho_s'] = water_s.rho
+            cp_s = water_s.cp
+            params['mu_s'] = water_s.mu
+            params['k_s'] = water_s.k
+            params['prtl_s'] = water_s.Prandt
+        else:
+            w_sat = self.water_props(P=press_s_MPa, x=quality)
+            #mass_frac_v = w_sat.Vapor.rho / (w_sat.Liquid.rho + w_sat.Vapor.rho)
+            #rho_s = (1-mass_frac_v)*w_sat.Liquid.rho + mass_frac_v*w_sat.Vapor.rho
+            #cp_s = (1-mass_frac_v)*w_sat.Liquid.cp + mass_frac_v*w_sat.Vapor.cp
+            #mu_s = (1-mass_frac_v)*w_sat.Liquid.mu + mass_frac_v*w_sat.Vapor.mu
+            #k_s = (1-mass_frac_v)*w_sat.Liquid.k + mass_frac_v*w_sat.Vapor.k
+
+            params['rho_s'] = w_sat.rho
+            cp_s = (1-quality)*w_sat.Liquid.cp + quality*w_sat.Vapor.cp
+            params['mu_s'] = (1-quality)*w_sat.Liquid.mu + quality*w_sat.Vapor.mu
+            params['k_s'] = (1-quality)*w_sat.Liquid.k + quality*w_sat.Vapor.k
+
+            params['prtl_s'] = cp_s*unit.kj/unit.kg/unit.K*params['mu_s']/params['k_s']
+
+        params['cp_s'] = cp_s*unit.kj/unit.kg/unit.K
+
+        params['rey_s'] = self.secondary_mass_flowrate * 2*radius_inner / params['mu_s']
+
+        # Saturation
+        sat_liq = saturation_cache.liquid(press_s_MPa)
+        sat_vap = saturation_cache.vapor(press_s_MPa)
+
+        params['temp_s_sat'] = sat_liq.T
+        params['h_vap_s'] = (sat_vap.h - sat_liq.h) * unit.kj/unit.kg
+
+        # Heat of vaporization power per unit quality and mass flowrate
+        press_p_MPa = self.primary_pressure/unit.mega/unit.pascal
+
+        params['h_vap_p'] = (saturation_cache.vapor(press_p_MPa).h -
+                             saturation_cache.liquid(press_p_MPa).h) * unit.kj/unit.kg
+
+        # Sensible heat of the secondary inflow
+        temp_s_in = self.secondary_inflow_temp
+
+        assert temp_s_in < sat_liq.T
+        sensible_water = self.water_props(T=(temp_s_in + sat_liq.T)/2, P=press_s_MPa)
+        cp_sensible = sensible_water.Liquid.cp*unit.kj/unit.kg/unit.K
+
+        params['q_sensible'] = (sat_liq.T - temp_s_in)*cp_sensible
+
+        # Single phase secondary heat transfer coefficient
+        temp_s_w = temp_p - params['wall_temp_delta'] # wall temperature
+
+        water_s_w = self.water_props(T=temp_s_w, P=press_s_MPa) # @ wall
+        assert water_s_w.phase != 'Two phases' # sanity check
+        if water_s_w.phase == 'Liquid':
+            prtl_w = water_s_w.Liquid.Prandt
+        elif water_s_w.phase == 'Vapour':
+            prtl_w = water_s_w.Vapor.Prandt
+        else:
+            assert False
+        st_over_sl = self.tube_bundle_pitch_ratio
+        (nusselt_s, _) = zukauskas(params['rey_s'], params['prtl_s'], prtl_w, st_over_sl,
+                                   self.regime_blend[0])
+        params['h_s_single_phase'] = nusselt_s * params['k_s'] / (2*radius_inner)
+
+        return params
+
+    def axial_parameters(self, u_vec):
+        """Parameters of the axial steamer model `axial_steamer_rhs()` at the
+           axial profiles `u_vec`.
+
+        The design data, the inflow conditions, and the node thermophysical
+        properties evaluated at `u_vec`, kept over a time step. The secondary
+        temperature of a single phase node follows its enthalpy along the secant
+        between the node state at `u_vec` and the saturation state.
+
+        Returns
+        -------
+        params: dict
+        """
+
+        n_nodes = self.axial_nodes
+        assert n_nodes > 0
+        assert len(u_vec) == 2*n_nodes
+
+        temp_p = u_vec[0::2]
+        enthalpy_s = u_vec[1::2]
+
+        params = dict()
+
+        # Design data
+        params['n_nodes'] = n_nodes
+        params['heat_transfer_area'] = self.heat_transfer_area
+        params['primary_volume'] = self.primary_volume
+        params['secondary_volume'] = self.secondary_volume
+        params['helicoil_inner_radius'] = self.helicoil_inner_radius
+        params['helicoil_length'] = self.helicoil_length
+        params['wall_temp_delta'] = self.wall_temp_delta_primary + \
+                                    self.wall_temp_delta_secondary
+        params['dryout_quality'] = self.dryout_quality
+
+        # Inflow conditions
+        press_s_MPa = self.secondary_pressure/unit.mega/unit.pascal
+
+        params['primary_inflow_temp'] = self.primary_inflow_temp
+        params['primary_mass_flowrate'] = self.primary_mass_flowrate
+        params['secondary_inflow_enthalpy'] = self.water_props(T=self.secondary_inflow_temp,
+                                                               P=press_s_MPa).h * \
+                                              unit.kj/unit.kg
+        params['secondary_mass_flowrate'] = self.secondary_mass_flowrate
+        params['secondary_pressure'] = self.secondary_pressure
+
+        #-------------------------------------------
+        # Primary properties and heat transfer
+        #-------------------------------------------
+
+        names_p = ('rho_p', 'cp_p', 'mu_p', 'k_p', 'prtl_p', 'rey_p', 'nusselt_p')
+        names_s = ('rho_s', 'cp_s', 'mu_s', 'k_s', 'prtl_s', 'cp_liq_s', 'cp_vap_s')
+
+        for name in names_p + names_s:
+            params[name] = np.empty(n_nodes, dtype=np.float64)
+
+        h_p = np.empty(n_nodes, dtype=np.float64)
+        node = dict()
+
+        for i in range(n_nodes):
+            h_p[i] = self.__heat_transfer_coeff_primary(temp_p[i], node)
+            for name in names_p:
+                params[name][i] = node[name]
+
+        params['resistance_p'] = self.__resistance_primary(h_p)
+
+        #-------------------------------------------
+        # Secondary properties
+        #-------------------------------------------
+
+        sat_liq = saturation_cache.liquid(press_s_MPa)
+        sat_vap = saturation_cache.vapor(press_s_MPa)
+
+        temp_sat = sat_liq.T
+        enthalpy_liq = sat_liq.h * unit.kj/unit.kg
+        enthalpy_vap = sat_vap.h * unit.kj/unit.kg
+        cp_liq_sat = sat_liq.cp * unit.kj/unit.kg/unit.K
+        cp_vap_sat = sat_vap.cp * unit.kj/unit.kg/unit.K
+
+        params['temp_s_sat'] = temp_sat
+        params['enthalpy_liq_s'] = enthalpy_liq
+        params['enthalpy_vap_s'] = enthalpy_vap
+
+        radius_inner = self.helicoil_inner_radius
+        prtl_w = np.empty(n_nodes, dtype=np.float64)
+
+        # Subcooled temperature estimate: chord from the inflow to saturation
+        temp_s_in = self.secondary_inflow_temp
+        enthalpy_s_in = params['secondary_inflow_enthalpy']
+        if enthalpy_liq - enthalpy_s_in > 1*unit.kj/unit.kg:
+            cp_chord = (enthalpy_liq - enthalpy_s_in)/(temp_sat - temp_s_in)
+        else:
+            cp_chord = cp_liq_sat
+
+        for i in range(n_nodes):
+
+            params['cp_liq_s'][i] = cp_liq_sat
+            params['cp_vap_s'][i] = cp_vap_sat
+
+            if enthalpy_s[i] < enthalpy_liq or enthalpy_s[i] > enthalpy_vap:
+
+                if enthalpy_s[i] < enthalpy_liq: # subcooled
+                    temp = temp_sat - (enthalpy_liq - enthalpy_s[i])/cp_chord
+                else: # superheated
+                    temp = temp_sat + (enthalpy_s[i] - enthalpy_vap)/cp_vap_sat
+
+                water_s = self.water_props(T=temp, P=press_s_MPa)
+                cp_s = water_s.cp * unit.kj/unit.kg/unit.K
+                (rho_s, mu_s, k_s, prtl_s) = (water_s.rho, water_s.mu, water_s.k,
+                                              water_s.Prandt)
+
+                # Newton correction of the node temperature and secant heat
+                # capacity to saturation
+                temp += (enthalpy_s[i] - water_s.h*unit.kj/unit.kg)/cp_s
+
+                if temp < temp_sat - 0.1*unit.K:
+                    params['cp_liq_s'][i] = (enthalpy_liq - enthalpy_s[i])/(temp_sat - temp)
+                elif temp > temp_sat + 0.1*unit.K:
+                    params['cp_vap_s'][i] = (enthalpy_s[i] - enthalpy_vap)/(temp - temp_sat)
+
+            else: # two phase, homogeneous mixture
+                quality = (enthalpy_s[i] - enthalpy_liq)/(enthalpy_vap - enthalpy_liq)
+                rho_s = 1/((1-quality)/sat_liq.rho + quality/sat_vap.rho)
+                if quality < self.dryout_quality - DRYOUT_TRANSITION: # wetted wall
+                    cp_s = (1-quality)*cp_liq_sat + quality*cp_vap_sat
+                    mu_s = (1-quality)*sat_liq.mu + quality*sat_vap.mu
+                    k_s = (1-quality)*sat_liq.k + quality*sat_vap.k
+                    prtl_s = cp_s*mu_s/k_s
+                else: # post dryout: vapor film at the wall
+                    (cp_s, mu_s, k_s, prtl_s) = (cp_vap_sat, sat_vap.mu, sat_vap.k,
+                                                 sat_vap.Prandt)
+
+            params['rho_s'][i] = rho_s
+            params['cp_s'][i] = cp_s
+            params['mu_s'][i] = mu_s
+            params['k_s'][i] = k_s
+            params['prtl_s'][i] = prtl_s
+
+            prtl_w[i] = self.water_props(T=temp_p[i] - params['wall_temp_delta'],
+                                         P=press_s_MPa).Prandt # @ wall
+
+        params['rey_s'] = self.secondary_mass_flowrate * 2*radius_inner / params['mu_s']
+
+        # Single phase heat transfer coefficient
+        (nusselt_s, _) = zukauskas(params['rey_s'], params['prtl_s'], prtl_w,
+                                   self.tube_bundle_pitch_ratio, self.regime_blend[0])
+        params['h_s_single_phase'] = nusselt_s * params['k_s'] / (2*radius_inner)
+
+        return params
+
     def __call_ports(self, time):
 
         # Interactions in the primary-inflow port
@@ -326,6 +841,9 @@ class Steamer(Module):
             self.primary_ressure = primary_inflow['pressure']
             self.primary_mass_flowrate = primary_inflow['mass_flowrate']
 
+            # Adaptive time step set by the reactor
+            self.time_step = primary_inflow.get('time_step', self.time_step)
+
         # Interactions in the secondary-inflow port
         #----------------------------------------
         # One way "from" secondary-inflow
@@ -342,6 +860,9 @@ class Steamer(Module):
             self.secondary_pressure = secondary_inflow['pressure']
             self.secondary_mass_flowrate = secondary_inflow['mass_flowrate']
 
+            # Events of the secondary loop relayed to the reactor
+            self.__breakpoints = secondary_inflow.get('breakpoints', ())
+
         # Interactions in the primary-outflow port
         #-----------------------------------------
         # One way "to" primary-outflow
@@ -358,6 +879,7 @@ class Steamer(Module):
             primary_outflow['pressure'] = self.primary_pressure
             primary_outflow['mass_flowrate'] = self.primary_mass_flowrate
             primary_outflow['quality'] = 0.0
+            primary_outflow['breakpoints'] = self.__breakpoints
 
             self.send((msg_time, primary_outflow), 'primary-outflow')
 
@@ -379,6 +901,7 @@ class Steamer(Module):
             secondary_outflow['pressure'] = press
             secondary_outflow['mass_flowrate'] = flowrate
             secondary_outflow['total_heat_power'] = -self.heat_sink_pwr
+            secondary_outflow['time_step'] = self.time_step
 
             self.send((msg_time, secondary_outflow), 'secondary-outflow')
 
@@ -386,25 +909,62 @@ class Steamer(Module):
         """ODE IVP problem.
         """
 
-        # Get state values
-        u_0 = self.__get_state_vector(time)
+        if self.performance_map is not None:
 
-        t_interval_sec = np.linspace(time, time+self.time_step, num=2)
+            outflow = self.performance_map(primary_inflow_temp=self.primary_inflow_temp,
+                                           primary_mass_flowrate=self.primary_mass_flowrate,
+                                           secondary_pressure=self.secondary_pressure,
+                                           secondary_inflow_temp=self.secondary_inflow_temp)
 
-        max_n_steps_per_time_step = 1500 # max number of nonlinear algebraic solver
-                                         # iterations per time step
+            self.secondary_outflow_quality = float(outflow['secondary_outflow_quality'])
+            self.heat_sink_pwr = -float(outflow['heat_transfer_pwr'])
 
-        (u_vec_hist, info_dict) = odeint(self.__f_vec, u_0, t_interval_sec,
-                                         rtol=1e-7, atol=1e-8,
-                                         mxstep=max_n_steps_per_time_step,
-                                         full_output=True, tfirst=False)
+            temp_p = float(outflow['primary_outflow_temp'])
+            temp_s = float(outflow['secondary_outflow_temp'])
+
+        elif self.axial_nodes > 0:
+
+            if self.__axial_state is None:
+                self.__axial_state = self.__initial_axial_state(time)
+
+            u_0 = self.__axial_state
+
+            self.__params = self.axial_parameters(u_0)
+
+            self.integrator.reset(time, u_0)
+
+            u_vec = self.integrator.advance(time + self.time_step)
+
+            (_, diagnostics) = axial_steamer_rhs(u_vec, self.__params)
+            self.__update_derived(self.__params, diagnostics)
+
+            self.__axial_state = u_vec
+
+            temp_p = diagnostics['primary_outflow_temp']
+            temp_s = diagnostics['secondary_outflow_temp']
 
-        assert info_dict['message'] == 'Integration successful.', info_dict['message']
+        else:
+
+            # Get state values
+            u_0 = self.__get_state_vector(time)
+
+            # Model parameters (thermophysical properties) kept over the time step
+            self.__params = self.parameters(u_0)
+
+            # Regime change between time steps (new inflow conditions)
+            if self.__regime_exit(u_0, time) > 0.0:
+                self.__regime_transition(time, u_0)
+
+            self.integrator.reset(time, u_0)
 
-        u_vec = u_vec_hist[1, :]  # solution vector at final time step
+            u_vec = self.integrator.advance(time + self.time_step)
 
-        temp_p = u_vec[0] # primary outflow temp
-        temp_s = u_vec[1] # secondary outflow temp
+            # Diagnostics of the accepted solution
+            (_, diagnostics) = steamer_rhs(u_vec, self.__params)
+            self.__update_derived(self.__params, diagnostics)
+
+            temp_p = u_vec[0] # primary outflow temp
+            temp_s = u_vec[1] # secondary outflow temp
 
         # Update phases
         primary_outflow = self.primary_outflow_phase.get_row(time)
@@ -444,6 +1004,8 @@ class Steamer(Module):
 
         self.state_phase.set_value('nusselt_s', self.nusselt_s, time)
 
+        self.state_phase.set_value('dryout', self.dryout_position, time)
+
         return time
 
     def __get_state_vector(self, time):
@@ -462,112 +1024,149 @@ class Steamer(Module):
 
     def __f_vec(self, u_vec, time):
 
-        temp_p = u_vec[0] # get temperature of primary outflow
+        (f_vec, _) = steamer_rhs(u_vec, self.__params)
 
-        temp_s = u_vec[1] # get temperature of secondary outflow
+        return f_vec
 
-        # initialize f_vec to zero
-        f_tmp = np.zeros(2, dtype=np.float64) # vector for f_vec return
+    def __jac(self, u_vec, time):
 
-        # Heat transfered
-        self.heat_sink_pwr = self.__heat_sink_pwr(temp_p, temp_s)
+        return steamer_jac(u_vec, self.__params)
 
-        #-----------------------
-        # primary energy balance
-        #-----------------------
+    def __regime_exit(self, u_vec, time):
+        """Event function of the flow regime: positive when the state is out of
+           the current regime by more than the hysteresis band.
+        """
 
-        temp_p_in = self.primary_inflow_temp
+        (_, diagnostics) = steamer_rhs(u_vec, self.__params)
 
-        vol_p = self.primary_volume
-        q_p = self.primary_mass_flowrate/self.rho_p
+        (exit_dist, _) = _regime_exit(diagnostics['equilibrium_quality'], u_vec[1],
+                                      self.__params)
 
-        if q_p > 0:
-            tau_p = vol_p/q_p
-        else:
-            tau_p = 1*unit.hour
+        return exit_dist
+
+    def __regime_transition(self, time, u_vec):
+        """Event action: switch to the flow regime the state entered, and
+           re-evaluate the secondary properties for it. The state is kept.
+        """
 
-        self.tau_p = tau_p
+        params = self.__params
 
-        #-------------------------
-        # Secondary energy balance
-        #-------------------------
+        # The state left the regime; it may cross more than one regime at once
+        for _ in FLOW_REGIMES:
+            (_, diagnostics) = steamer_rhs(u_vec, params)
+            (_, params['flow_regime']) = _regime_exit(diagnostics['equilibrium_quality'],
+                                                      u_vec[1], params)
 
-        temp_s_in = self.secondary_inflow_temp
+            (_, diagnostics) = steamer_rhs(u_vec, params)
+            (exit_dist, _) = _regime_exit(diagnostics['equilibrium_quality'], u_vec[1],
+                                          params)
+            if exit_dist <= 0.0:
+                break
 
-        vol_s = self.secondary_volume
-        q_s = self.secondary_mass_flowrate/self.rho_s
-
-        if q_s > 0:
-            if self.secondary_outflow_quality == 0:
-                tau_s = vol_s/q_s  # liquid residence time
-            elif self.secondary_outflow_quality == 1:
-                #tau_s = 0.85*vol_s/q_s # faster moving gas with higher flow losses
-                # this controls how high temp_s will jumpt to
-                tau_s = 0.35*vol_s/q_s # vapor flow acceleration
-            else: # vapor/liquid mix
-                # This factor controls the onset of the transition jump in temp_s
-                tau_s = 0.9*vol_s/q_s # vapor/liquid flow acceleration
-        else:
-            tau_s = 1*unit.hour
+        self.flow_regime = params['flow_regime']
 
-        self.tau_s = tau_s
+        self.__params = self.parameters(u_vec, diagnostics['secondary_outflow_quality'])
 
-        #----------------------------
-        # Compute ODE right-hand side
-        #----------------------------
+    def __f_vec_axial(self, u_vec, time):
 
-        heat_sink_pwr_dens = self.heat_sink_pwr/vol_p
+        (f_vec, _) = axial_steamer_rhs(u_vec, self.__params)
 
-        f_tmp[0] = - 1/tau_p * (temp_p - temp_p_in) + \
-                   heat_sink_pwr_dens/(self.rho_p*self.cp_p)
+        return f_vec
 
-        heat_source_pwr = - self.heat_sink_pwr
+    def __jac_axial(self, u_vec, time):
 
-        heat_source_pwr -= self.__heat_vaporization_pwr()
+        return axial_steamer_jac(u_vec, self.__params)
 
-        heat_source_pwr_dens = heat_source_pwr/vol_s
+    def __initial_axial_state(self, time):
+        """Uniform axial profiles at the outflow temperatures at `time`.
+        """
 
-        f_tmp[1] = - 1/tau_s * (temp_s - temp_s_in) + \
-                   heat_source_pwr_dens/(self.rho_s*self.cp_s)
+        press_s_MPa = self.secondary_pressure/unit.mega/unit.pascal
 
-        #-----------------------
-        # Wrap up
-        #-----------------------
+        temp_p = self.primary_outflow_phase.get_value('temp', time)
+        temp_s = self.secondary_outflow_phase.get_value('temp', time)
 
-        self.__update_quality(temp_p, temp_s)
+        enthalpy_s = self.water_props(T=temp_s, P=press_s_MPa).h * unit.kj/unit.kg
 
-        return f_tmp
+        u_vec = np.empty(2*self.axial_nodes, dtype=np.float64)
+        u_vec[0::2] = temp_p
+        u_vec[1::2] = enthalpy_s
 
-    def __heat_sink_pwr(self, temp_p, temp_s):
-        """Cooling rate of the primary side.
+        return u_vec
 
-           Assumptions
-           -----------
+    def __axial_steady_state(self, max_time=2*unit.hour, xtol=1e-9):
+        """Steady axial profiles: pseudo-transient march with the properties
+           updated over increasing time intervals until the profiles settle.
+        """
 
-           + primary side: overall single phase heat transfer. Locally there may be
-             either partial nucleate boiling or fully developed nucleate boiling
-             but the model will not capture this.
+        u_0 = self.__axial_state
+        if u_0 is None:
+            # primary at the inflow temperature, secondary at the inflow enthalpy
+            press_s_MPa = self.secondary_pressure/unit.mega/unit.pascal
+            u_0 = np.empty(2*self.axial_nodes, dtype=np.float64)
+            u_0[0::2] = self.primary_inflow_temp
+            u_0[1::2] = self.water_props(T=self.secondary_inflow_temp,
+                                         P=press_s_MPa).h * unit.kj/unit.kg
+
+        time = 0.0
+        time_step = 10*unit.second
+
+        while time < max_time:
+            self.__params = self.axial_parameters(u_0)
+            (u_vec_hist, info_dict) = odeint(self.__f_vec_axial, u_0, [time, time+time_step],
+                                             Dfun=self.__jac_axial, ml=2, mu=2,
+                                             rtol=1e-9, atol=1e-8, mxstep=50000,
+                                             full_output=True)
+            assert info_dict['message'] == 'Integration successful.', info_dict['message']
+            u_vec = u_vec_hist[1, :]
+            time += time_step
+            time_step = min(2*time_step, 5*unit.minute)
+
+            converged = np.max(np.abs(u_vec - u_0)/np.abs(u_vec)) < xtol
+            u_0 = u_vec
+            if converged:
+                break
+        else:
+            assert False, 'axial steady state not reached in %r s'%max_time
 
-           + secondary side: overall ranging from one phase heat transfer to fully
-             developed nucleate boiling.
+        return u_0
+
+    def __consistent_state(self, u_vec):
+        """Parameters, right-hand side and diagnostics at `u_vec` with the
+           secondary properties evaluated for the equilibrium flow regime at
+           `u_vec` (no hysteresis).
         """
 
-        ###########################################
-        # Heat transfer coefficient on primary side
-        ###########################################
+        params = self.parameters(u_vec)
+        params['flow_regime'] = None
+        (_, diagnostics) = steamer_rhs(u_vec, params)
 
-        h_p = self.__heat_transfer_coeff_primary(temp_p)
+        params = self.parameters(u_vec, diagnostics['secondary_outflow_quality'])
+        params['flow_regime'] = None
+        (f_vec, diagnostics) = steamer_rhs(u_vec, params)
 
-        #############################################
-        # Heat transfer coefficient on secondary side
-        #############################################
+        return (params, f_vec, diagnostics)
 
-        h_s = self.__heat_transfer_coeff_secondary(temp_p, temp_s)
+    def __update_derived(self, params, diagnostics):
+        """Set the derived quantities from the model parameters and diagnostics.
+        """
 
-        ###################################################
-        # Overall heat transfer
-        ###################################################
-        # This is based on the secondary side
+        for name in ('rho_p', 'cp_p', 'mu_p', 'k_p', 'prtl_p', 'rey_p', 'nusselt_p',
+                     'rho_s', 'cp_s', 'mu_s', 'k_s', 'prtl_s', 'rey_s'):
+            setattr(self, name, np.mean(params[name])) # node average (axial model)
+
+        self.heat_sink_pwr = diagnostics['heat_sink_pwr']
+        self.secondary_outflow_quality = diagnostics['secondary_outflow_quality']
+        self.flow_regime = diagnostics.get('flow_regime', self.flow_regime)
+        self.tau_p = diagnostics['tau_p']
+        self.tau_s = diagnostics['tau_s']
+        self.nusselt_s = diagnostics['nusselt_s']
+        self.dryout_position = diagnostics.get('dryout_position', self.dryout_position)
+
+    def __resistance_primary(self, h_p):
+        """Primary film, tube wall and fouling resistance based on the secondary
+           side. SI units: m2-K/W.
+        """
 
         # Cross section geometry
         area_outer = math.pi * self.helicoil_outer_radius**2
@@ -580,56 +1179,34 @@ class Steamer(Module):
 
         fouling = 0.0003 * unit.F*unit.ft**2*unit.hour/unit.Btu
 
-        # Secondary side based heat transfer resistance
-        if h_s > 1:
-            one_over_U = 1.0/h_p * area_outer/area_inner + \
-            (radius_outer-radius_inner)/therm_cond_wall * area_outer/area_mean + \
-            fouling + \
-            1/h_s
-        else:
-            one_over_U = 1.0/h_p * area_outer/area_inner + \
+        return 1.0/h_p * area_outer/area_inner + \
             (radius_outer-radius_inner)/therm_cond_wall * area_outer/area_mean + \
             fouling
 
-        # Total area of heat transfer
-        #area = 2*math.pi*radius_mean* self.n_helicoil_tubes * self.helicoil_length
-        area = self.heat_transfer_area
-
-        temp_p_avg = (self.primary_inflow_temp + temp_p)/2
-        temp_s_avg = (self.secondary_inflow_temp + temp_s)/2
-
-        qdot = - area * 1/one_over_U * (temp_p_avg - temp_s_avg)
-
-        qdot /= 2.61 # calibration factor for correlation to work with NuScale specs
-
-        #print(qdot, -95482.27 * 1665.57)
-        #qdot = - 95482.27 * 1665.57
-
-        return qdot
-
-    def __heat_transfer_coeff_primary(self, temp_p):
+    def __heat_transfer_coeff_primary(self, temp_p, params):
         """Heat transfer coefficient in the primary flow. SI units: W/m2-K.
+           The primary properties are stored in `params`.
         """
 
         # Primary props
         press_p_MPa = self.primary_pressure/unit.mega/unit.pascal
-        water_p = WaterProps(T=temp_p, P=press_p_MPa)
+        water_p = self.water_props(T=temp_p, P=press_p_MPa)
 
         assert water_p.phase == 'Liquid' # sanity check
 
-        self.rho_p = water_p.rho
-        self.cp_p = water_p.Liquid.cp * unit.kj/unit.kg/unit.K
-        self.mu_p = water_p.Liquid.mu
-        self.k_p = water_p.Liquid.k
-        self.prtl_p = water_p.Liquid.Prandt
+        params['rho_p'] = water_p.rho
+        params['cp_p'] = water_p.Liquid.cp * unit.kj/unit.kg/unit.K
+        params['mu_p'] = water_p.Liquid.mu
+        params['k_p'] = water_p.Liquid.k
+        params['prtl_p'] = water_p.Liquid.Prandt
 
         radius_outer = self.helicoil_outer_radius
 
-        self.rey_p = self.primary_mass_flowrate * 2*radius_outer / self.mu_p
+        params['rey_p'] = self.primary_mass_flowrate * 2*radius_outer / params['mu_p']
 
         temp_p_w = temp_p - self.wall_temp_delta_primary # wall temperature
 
-        water_p_w = WaterProps(T=temp_p_w, P=press_p_MPa) # @ wall
+        water_p_w = self.water_props(T=temp_p_w, P=press_p_MPa) # @ wall
 
         assert water_p_w.phase == 'Liquid' # sanity check
 
@@ -637,203 +1214,496 @@ class Steamer(Module):
 
         st_over_sl = self.tube_bundle_pitch_ratio
 
-        self.nusselt_p = self.__mean_nusselt_single_phase(self.rey_p, self.prtl_p, prtl_w, st_over_sl)
+        (params['nusselt_p'], _) = zukauskas(params['rey_p'], params['prtl_p'], prtl_w,
+                                             st_over_sl, self.regime_blend[0])
 
-        h_p = self.nusselt_p * self.k_p / (2*radius_outer)
+        h_p = params['nusselt_p'] * params['k_p'] / (2*radius_outer)
 
         return h_p
 
-    def __mean_nusselt_single_phase(self, rey, prtl, prtl_w, st_sl):
-        """Mean Nusselt number for turbulent one-phase flow.
-           Staggered tube bundle.
-           A. Zukauskas 1987,
-           Convective Heat Transfer in Cross Flows
-           Handbook of Single-Phase Convective Heat Transfer, Chap 6.
-           S. Kakac, R. Shah, and W. Aung Eds.
-           J. Wiley & Sons, New York 1987
-
-           Parameters
-           ----------
-
-           rey: float
-               Reynolds number based on diameter
-           prtl: float
-               Prandtl number
-           prtl_w: float
-               Prandtl number based on wall temperature.
-           st_sl: float
-               Ratio of tube pitch transversal to flow to the tube pitch along flow.
-        """
+def steamer_rhs(u_vec, params):
+    """Steamer model: time derivatives of the outflow temperatures.
+
+    Pure function of the primary and secondary outflow temperatures `u_vec` and
+    of the parameters `params` (see `Steamer.parameters()`); it can be evaluated
+    concurrently and for any number of designs.
+
+    Returns
+    -------
+    (f_vec, diagnostics): tuple
+        Time derivatives [K/s], and a dict with the heat sink power
+        (`heat_sink_pwr`), the secondary outflow quality
+        (`secondary_outflow_quality`), the flow regime (`flow_regime`), the
+        equilibrium quality of the heat transfered (`equilibrium_quality`), the
+        residence times (`tau_p`, `tau_s`) and the secondary Nusselt number
+        (`nusselt_s`) at `u_vec`. The flow regime is `params['flow_regime']`,
+        or the equilibrium regime at `u_vec` if None.
+    """
 
-        if rey < 1:
-            nusselt_p = 4.0
-        elif 1 <= rey <= 5e2:
-            nusselt_p = 1.04 * rey**0.4 * prtl**0.36 * \
-                        (prtl/prtl_w)**0.25
-        elif 5e2 < rey <= 1e3:
-            nusselt_p = 0.71 * rey**0.5 * prtl**0.36 * \
-                        (prtl/prtl_w)**0.25
-        elif 1e3 < rey <= 2e5:
-            nusselt_p = 0.35 * (st_sl)**0.2 * rey**0.6 * prtl**0.36 * \
-                        (prtl/prtl_w)**0.25
-        elif 2e5 < rey <= 2e6:
-            nusselt_p = 0.031 * (st_sl)**0.2 * rey**0.8 * prtl**0.36 * \
-                        (prtl/prtl_w)**0.25
-        else:
-            assert False
+    temp_p = u_vec[0] # primary outflow temperature
+    temp_s = u_vec[1] # secondary outflow temperature
 
-        return nusselt_p
+    (h_s, _) = _heat_transfer_coeff_secondary(temp_p, params)
 
-    def __heat_transfer_coeff_secondary(self, temp_p, temp_s):
-        """Heat transfer coefficient in the secondary flow. SI units: W/m2-K.
-        """
+    # Heat transfered
+    heat_sink_pwr = _heat_sink_pwr(temp_p, temp_s, h_s, params)
 
-        press_s_MPa = self.secondary_pressure/unit.mega/unit.pascal
+    qual_eq = _equilibrium_quality(heat_sink_pwr, params)
 
-        if self.secondary_outflow_quality == 0:
-            water_s = WaterProps(T=temp_s, P=press_s_MPa)
-            self.rho_s = water_s.rho
-            cp_s = water_s.cp
-            self.mu_s = water_s.mu
-            self.k_s = water_s.k
-            self.prtl_s = water_s.Prandt
-        elif self.secondary_outflow_quality == 1:
-            water_s = WaterProps(T=temp_s, P=press_s_MPa)
-            self.rho_s = water_s.rho
-            cp_s = water_s.cp
-            self.mu_s = water_s.mu
-            self.k_s = water_s.k
-            self.prtl_s = water_s.Prandt
-        else:
-            qual = self.secondary_outflow_quality
-            w_sat = WaterProps(P=press_s_MPa, x=qual)
-            #mass_frac_v = w_sat.Vapor.rho / (w_sat.Liquid.rho + w_sat.Vapor.rho)
-            #self.rho_s = (1-mass_frac_v)*w_sat.Liquid.rho + mass_frac_v*w_sat.Vapor.rho
-            #cp_s = (1-mass_frac_v)*w_sat.Liquid.cp + mass_frac_v*w_sat.Vapor.cp
-            #self.mu_s = (1-mass_frac_v)*w_sat.Liquid.mu + mass_frac_v*w_sat.Vapor.mu
-            #self.k_s = (1-mass_frac_v)*w_sat.Liquid.k + mass_frac_v*w_sat.Vapor.k
+    regime = params['flow_regime']
+    if regime is None:
+        regime = _equilibrium_regime(qual_eq, temp_s, params)
 
-            self.rho_s = w_sat.rho
-            cp_s = (1-qual)*w_sat.Liquid.cp + qual*w_sat.Vapor.cp
-            self.mu_s = (1-qual)*w_sat.Liquid.mu + qual*w_sat.Vapor.mu
-            self.k_s = (1-qual)*w_sat.Liquid.k + qual*w_sat.Vapor.k
+    quality = _outflow_quality(qual_eq, temp_s, regime, params)
 
-            self.prtl_s = cp_s*unit.kj/unit.kg/unit.K*self.mu_s/self.k_s
+    tau_p = _residence_time_primary(params)
+    tau_s = _residence_time_secondary(regime, params)
 
-        cp_s *= unit.kj/unit.kg/unit.K
-        self.cp_s = cp_s
+    f_vec = np.empty(2, dtype=np.float64)
 
-        radius_inner = self.helicoil_inner_radius
+    #-----------------------
+    # primary energy balance
+    #-----------------------
 
-        self.rey_s = self.secondary_mass_flowrate * 2*radius_inner / self.mu_s
+    heat_sink_pwr_dens = heat_sink_pwr/params['primary_volume']
 
-        water_s_sat = WaterProps(P=press_s_MPa, x=0.5)
-        temp_s_sat = water_s_sat.T
+    f_vec[0] = - 1/tau_p * (temp_p - params['primary_inflow_temp']) + \
+               heat_sink_pwr_dens/(params['rho_p']*params['cp_p'])
 
-        # Overall condition on the secondary
-        #assert temp_s <= temp_s_sat + 80*unit.kelvin # CHF calc neeeded
+    #-------------------------
+    # Secondary energy balance
+    #-------------------------
 
-        temp_p_w = temp_p - self.wall_temp_delta_primary # wall temperature
-        temp_s_w = temp_p_w - self.wall_temp_delta_secondary
-
-        #assert temp_s_w >= temp_s, 'temp_s = %r, temp_s_w = %r'%(temp_s,temp_s_w)
-        #print('saturated temp = ', temp_s_sat)
-
-        if (temp_s_w - temp_s_sat) > 5: # nucleate boiling (allow for development)
-        # Jens and Lottes correlation for subcooled/saturated nucleate boiling
-        # 3.5 <= P <= 14 MPa
-            q2prime = ((temp_s_w - temp_s_sat)*math.exp(self.secondary_pressure/unit.mega/unit.pascal/6.2)/0.79)**4
-            h_s = q2prime/(temp_s_w - temp_s_sat)
-            self.nusselt_s = h_s * 2*radius_inner / self.k_s
-            #print('q2prime=',q2prime/unit.kilo,'DT=',temp_s_w-temp_s_sat)
-            #print('h_s JL=',h_s)
-        else: # single phase transfer
-            #print(temp_s_w-273.15, press_s_MPa)
-            water_s_w = WaterProps(T=temp_s_w, P=press_s_MPa) # @ wall
-            assert water_s_w.phase != 'Two phases' # sanity check
-            if water_s_w.phase == 'Liquid':
-                prtl_w = water_s_w.Liquid.Prandt
-            elif water_s_w.phase == 'Vapour':
-                prtl_w = water_s_w.Vapor.Prandt
-            else:
-                assert False
-            st_over_sl = self.tube_bundle_pitch_ratio
-            self.nusselt_s = self.__mean_nusselt_single_phase(self.rey_s, self.prtl_s, prtl_w, st_over_sl)
-            h_s = self.nusselt_s * self.k_s / (2*radius_inner)
+    heat_source_pwr = - heat_sink_pwr
 
-        return h_s
+    # Heat of vaporization
+    heat_source_pwr -= quality * params['h_vap_p'] * params['secondary_mass_flowrate']
 
-    def __heat_vaporization_pwr(self):
-        """Heat of vaporization in the secondary.
-        """
+    heat_source_pwr_dens = heat_source_pwr/params['secondary_volume']
 
-        press_p_MPa = self.primary_pressure/unit.mega/unit.pascal
+    f_vec[1] = - 1/tau_s * (temp_s - params['secondary_inflow_temp']) + \
+               heat_source_pwr_dens/(params['rho_s']*params['cp_s'])
 
-        sat_liq = WaterProps(P=press_p_MPa, x=0.0)
-        sat_vap = WaterProps(P=press_p_MPa, x=1.0)
+    diagnostics = dict()
+    diagnostics['heat_sink_pwr'] = heat_sink_pwr
+    diagnostics['secondary_outflow_quality'] = quality
+    diagnostics['flow_regime'] = regime
+    diagnostics['equilibrium_quality'] = qual_eq
+    diagnostics['tau_p'] = tau_p
+    diagnostics['tau_s'] = tau_s
+    diagnostics['nusselt_s'] = h_s * 2*params['helicoil_inner_radius'] / params['k_s']
 
-        h_v = sat_vap.h
-        h_l = sat_liq.h
-        h_vap = h_v - h_l
+    return (f_vec, diagnostics)
 
-        return self.secondary_outflow_quality * h_vap*unit.kj * self.secondary_mass_flowrate
+def steamer_jac(u_vec, params):
+    """Jacobian of `steamer_rhs()`; df_i/du_j in row i, column j, within the flow
+       regime.
+    """
 
-    def __update_quality(self, temp_p, temp_s):
+    temp_p = u_vec[0]
+    temp_s = u_vec[1]
 
-        press_s_MPa = self.secondary_pressure/unit.mega/unit.pascal
+    (h_s, dh_s_dtemp_p) = _heat_transfer_coeff_secondary(temp_p, params)
 
-        # Secondary steam quality
-        sat_liq = WaterProps(P=press_s_MPa, x=0.0)
-        sat     = WaterProps(P=press_s_MPa, x=0.5)
-        sat_vap = WaterProps(P=press_s_MPa, x=1.0)
+    heat_sink_pwr = _heat_sink_pwr(temp_p, temp_s, h_s, params)
 
-        temp_s_in = self.secondary_inflow_temp
+    qual_eq = _equilibrium_quality(heat_sink_pwr, params)
 
-        assert temp_s_in < sat.T
-        sensible_water = WaterProps(T=(temp_s_in + sat_liq.T)/2 , P=press_s_MPa)
-        cp_sensible = sensible_water.Liquid.cp*unit.kj/unit.kg/unit.K
+    regime = params['flow_regime']
+    if regime is None:
+        regime = _equilibrium_regime(qual_eq, temp_s, params)
 
-        q_sensible = (sat_liq.T - temp_s_in)*cp_sensible
-
-        spcf_heat_transfered = - self.heat_sink_pwr/self.secondary_mass_flowrate
-        #print("q''[kW/m2]=",-self.heat_sink_pwr/self.heat_transfer_area/unit.kilo)
-
-        h_v = sat_vap.h * unit.kj/unit.kg
-        h_l = sat_liq.h * unit.kj/unit.kg
-        h_vap = h_v - h_l
-
-        if spcf_heat_transfered < 0.0: # subcooled
-            self.secondary_outflow_quality = 0
-        elif spcf_heat_transfered < q_sensible and temp_s > sat.T: # subcooled
-            self.secondary_outflow_quality = 0
-        elif spcf_heat_transfered < q_sensible and temp_s < sat.T: # subcooled
-            self.secondary_outflow_quality = 0
-        elif spcf_heat_transfered > q_sensible + h_vap and temp_s > sat.T: # superheated
-            self.secondary_outflow_quality = 1
-        elif spcf_heat_transfered > q_sensible + h_vap and temp_s <= sat.T: # slowed superheated
-            # Heat transfered is sufficient in equilibrium but in non-equilibrium,
-            # there is inertia.
-            qual = temp_s/sat.T
-            self.secondary_outflow_quality = min(qual,0.999)
-            qual = self.secondary_outflow_quality
-            w_sat = WaterProps(P=press_s_MPa, x=qual)
-            #mass_frac_v = w_sat.Vapor.rho / (w_sat.Liquid.rho + w_sat.Vapor.rho)
-            #cp_s = (1-mass_frac_v)*w_sat.Liquid.cp + mass_frac_v*w_sat.Vapor.cp
-            cp_s = (1-qual)*w_sat.Liquid.cp + qual*w_sat.Vapor.cp
-            cp_s *= unit.kj/unit.kg/unit.K
-            #rho_s = (1-mass_frac_v)*w_sat.Liquid.rho + mass_frac_v*w_sat.Vapor.rho
-            rho_s = w_sat.rho
+    # Heat sink power derivatives
+    one_over_U = params['resistance_p']
+    dU_dtemp_p = 0.0
 
-        elif q_sensible <= spcf_heat_transfered <= q_sensible + h_vap:
-            self.secondary_outflow_quality = (spcf_heat_transfered - q_sensible)/ h_vap
-            qual = self.secondary_outflow_quality
-            w_sat = WaterProps(P=press_s_MPa, x=qual)
-            #mass_frac_v = w_sat.Vapor.rho / (w_sat.Liquid.rho + w_sat.Vapor.rho)
-            #cp_s = (1-mass_frac_v)*w_sat.Liquid.cp + mass_frac_v*w_sat.Vapor.cp
-            cp_s = (1-qual)*w_sat.Liquid.cp + qual*w_sat.Vapor.cp
-            cp_s *= unit.kj/unit.kg
-            #rho_s = (1-mass_frac_v)*w_sat.Liquid.rho + mass_frac_v*w_sat.Vapor.rho
-            rho_s = w_sat.rho
-        else:
-            print('ht %r, q_sens %r, h_vap %r, temp_s %r, temp_sat %r'%(spcf_heat_transfered,q_sensible,h_vap,temp_s,sat.T))
-            assert False, 'bailing out; unknown case.'
+    if h_s > 1:
+        one_over_U += 1/h_s
+        dU_dtemp_p = dh_s_dtemp_p / (h_s*one_over_U)**2
+
+    area = params['heat_transfer_area']/HEAT_TRANSFER_CALIBRATION
+
+    temp_p_avg = (params['primary_inflow_temp'] + temp_p)/2
+    temp_s_avg = (params['secondary_inflow_temp'] + temp_s)/2
+
+    dqdot_dtemp_p = - area * (dU_dtemp_p*(temp_p_avg - temp_s_avg) + 0.5/one_over_U)
+    dqdot_dtemp_s = area * 0.5/one_over_U
+
+    # Quality derivatives (see _outflow_quality())
+    temp_sat = params['temp_s_sat']
+
+    if regime == 'two-phase' and 0.0 <= qual_eq <= 1.0:
+        dqual_dqdot = - 1/params['secondary_mass_flowrate']/params['h_vap_s']
+        (dqual_dtemp_p, dqual_dtemp_s) = (dqual_dqdot*dqdot_dtemp_p,
+                                          dqual_dqdot*dqdot_dtemp_s)
+    elif regime == 'slowed-superheated' and temp_s/temp_sat < 0.999:
+        (dqual_dtemp_p, dqual_dtemp_s) = (0.0, 1/temp_sat)
+    else:
+        (dqual_dtemp_p, dqual_dtemp_s) = (0.0, 0.0)
+
+    vap_pwr = params['h_vap_p'] * params['secondary_mass_flowrate']
+
+    heat_cap_p = params['primary_volume']*params['rho_p']*params['cp_p']
+    heat_cap_s = params['secondary_volume']*params['rho_s']*params['cp_s']
+
+    jac = np.empty((2, 2), dtype=np.float64)
+
+    jac[0, 0] = - 1/_residence_time_primary(params) + dqdot_dtemp_p/heat_cap_p
+    jac[0, 1] = dqdot_dtemp_s/heat_cap_p
+
+    jac[1, 0] = - (dqdot_dtemp_p + vap_pwr*dqual_dtemp_p)/heat_cap_s
+    jac[1, 1] = - 1/_residence_time_secondary(regime, params) - \
+                (dqdot_dtemp_s + vap_pwr*dqual_dtemp_s)/heat_cap_s
+
+    return jac
+
+def _heat_sink_pwr(temp_p, temp_s, h_s, params):
+    """Cooling rate of the primary side.
+
+       Assumptions
+       -----------
+
+       + primary side: overall single phase heat transfer. Locally there may be
+         either partial nucleate boiling or fully developed nucleate boiling
+         but the model will not capture this.
+
+       + secondary side: overall ranging from one phase heat transfer to fully
+         developed nucleate boiling.
+    """
+
+    # Overall heat transfer based on the secondary side
+    one_over_U = params['resistance_p']
+
+    # Secondary side based heat transfer resistance
+    if h_s > 1:
+        one_over_U += 1/h_s
+
+    # Total area of heat transfer
+    area = params['heat_transfer_area']
+
+    temp_p_avg = (params['primary_inflow_temp'] + temp_p)/2
+    temp_s_avg = (params['secondary_inflow_temp'] + temp_s)/2
+
+    qdot = - area * 1/one_over_U * (temp_p_avg - temp_s_avg)
+
+    qdot /= HEAT_TRANSFER_CALIBRATION
+
+    return qdot
+
+def _heat_transfer_coeff_secondary(temp_p, params):
+    """Heat transfer coefficient in the secondary flow and its derivative with
+       respect to the primary outflow temperature. SI units: W/m2-K.
+    """
+
+    temp_s_w = temp_p - params['wall_temp_delta'] # wall temperature
+
+    # Nucleate boiling above 5 K of wall superheat (allow for development);
+    # single phase coefficient kept over the time step
+    (h_s, dh_s_dtemp_p, _) = nucleate_boiling(params['h_s_single_phase'],
+                                              temp_s_w - params['temp_s_sat'],
+                                              params['secondary_pressure'],
+                                              onset=5*unit.K,
+                                              blend=params['boiling_blend'])
+
+    return (h_s, dh_s_dtemp_p)
+
+def _equilibrium_quality(heat_sink_pwr, params):
+    """Secondary steam quality in equilibrium with the heat transfered; negative
+       when subcooled, greater than 1 when superheated.
+    """
+
+    spcf_heat_transfered = - heat_sink_pwr/params['secondary_mass_flowrate']
+
+    return (spcf_heat_transfered - params['q_sensible'])/params['h_vap_s']
+
+def _equilibrium_regime(qual_eq, temp_s, params):
+    """Secondary flow regime of the equilibrium quality `qual_eq`.
+    """
+
+    if qual_eq < 0.0:
+        regime = 'subcooled'
+    elif qual_eq <= 1.0:
+        regime = 'two-phase'
+    elif temp_s > params['temp_s_sat']:
+        regime = 'superheated'
+    else:
+        regime = 'slowed-superheated'
+
+    return regime
+
+def _outflow_quality(qual_eq, temp_s, regime, params):
+    """Secondary steam quality in the flow `regime` given the equilibrium
+       quality of the heat transfered.
+    """
+
+    if regime == 'subcooled':
+        quality = 0
+    elif regime == 'two-phase':
+        quality = min(max(qual_eq, 0.0), 1.0)
+    elif regime == 'slowed-superheated':
+        # Heat transfered is sufficient in equilibrium but in non-equilibrium,
+        # there is inertia.
+        quality = min(temp_s/params['temp_s_sat'], 0.999)
+    elif regime == 'superheated':
+        quality = 1
+    else:
+        assert False, 'unknown flow regime %r'%regime
+
+    return quality
+
+def _regime_exit(qual_eq, temp_s, params):
+    """Distance of the state out of the flow regime `params['flow_regime']`
+       widened by the hysteresis band (positive outside), and the regime it
+       leaves to. Quality units; temperatures relative to saturation.
+    """
+
+    (dqual, dtemp) = params['regime_hysteresis']
+    temp_sat = params['temp_s_sat']
+
+    regime = params['flow_regime']
+
+    if regime == 'subcooled':
+        bounds = [(qual_eq - dqual, 'two-phase')]
+    elif regime == 'two-phase':
+        bounds = [(- dqual - qual_eq, 'subcooled'),
+                  (qual_eq - 1 - dqual,
+                   'superheated' if temp_s > temp_sat else 'slowed-superheated')]
+    elif regime == 'slowed-superheated':
+        bounds = [(1 - dqual - qual_eq, 'two-phase'),
+                  ((temp_s - temp_sat - dtemp)/temp_sat, 'superheated')]
+    elif regime == 'superheated':
+        bounds = [(1 - dqual - qual_eq, 'two-phase'),
+                  ((temp_sat - dtemp - temp_s)/temp_sat, 'slowed-superheated')]
+    else:
+        assert False, 'unknown flow regime %r'%regime
+
+    return max(bounds, key=lambda bound: bound[0])
+
+def _residence_time_primary(params):
+
+    q_p = params['primary_mass_flowrate']/params['rho_p']
+
+    if q_p > 0:
+        tau_p = params['primary_volume']/q_p
+    else:
+        tau_p = 1*unit.hour
+
+    return tau_p
+
+def _residence_time_secondary(regime, params):
+
+    vol_s = params['secondary_volume']
+    q_s = params['secondary_mass_flowrate']/params['rho_s']
+
+    if q_s > 0:
+        if regime == 'subcooled':
+            tau_s = vol_s/q_s  # liquid residence time
+        elif regime == 'superheated':
+            #tau_s = 0.85*vol_s/q_s # faster moving gas with higher flow losses
+            # this controls how high temp_s will jumpt to
+            tau_s = 0.35*vol_s/q_s # vapor flow acceleration
+        else: # vapor/liquid mix
+            # This factor controls the onset of the transition jump in temp_s
+            tau_s = 0.9*vol_s/q_s # vapor/liquid flow acceleration
+    else:
+        tau_s = 1*unit.hour
+
+    return tau_s
+
+def axial_steamer_rhs(u_vec, params):
+    """Axial steamer model: time derivatives of the axial profiles.
+
+    Pure function of the profiles `u_vec` and of the parameters `params` (see
+    `Steamer.axial_parameters()`). The unknowns are interleaved per node,
+    `u_vec[2*i]` the primary temperature [K] and `u_vec[2*i+1]` the secondary
+    specific enthalpy [J/kg] of node `i`, numbered from the secondary inlet
+    (primary outlet) to the secondary outlet (primary inlet). The node balances
+    are upwinded in each flow direction and coupled through the tube wall.
+
+    Returns
+    -------
+    (f_vec, diagnostics): tuple
+        Time derivatives [K/s, J/kg-s], and a dict with the heat sink power
+        (`heat_sink_pwr`), the outflow temperatures (`primary_outflow_temp`,
+        `secondary_outflow_temp`) and quality (`secondary_outflow_quality`), the
+        residence times (`tau_p`, `tau_s`), the mean secondary Nusselt number
+        (`nusselt_s`), the dryout position (`dryout_position`), and the secondary
+        temperature and quality profiles (`temp_s`, `quality`) at `u_vec`.
+    """
+
+    n_nodes = params['n_nodes']
+
+    temp_p = u_vec[0::2]
+    enthalpy_s = u_vec[1::2]
+
+    (temp_s, quality, _) = _axial_secondary_temp(enthalpy_s, params)
+
+    (h_s, _, _) = _axial_heat_transfer_coeff_secondary(temp_p, quality, params)
+
+    one_over_U = params['resistance_p'] + 1/h_s
+
+    # Heat transfered from the primary to the secondary in each node
+    qdot = params['heat_transfer_area']/n_nodes * (temp_p - temp_s)/one_over_U
+
+    # Upstream values: the primary enters at the last node, the secondary at
+    # the first
+    temp_p_up = np.append(temp_p[1:], params['primary_inflow_temp'])
+    enthalpy_s_up = np.insert(enthalpy_s[:-1], 0, params['secondary_inflow_enthalpy'])
+
+    heat_cap_p = params['rho_p']*params['primary_volume']/n_nodes*params['cp_p']
+    mass_s = params['rho_s']*params['secondary_volume']/n_nodes
+
+    mass_flowrate_p = params['primary_mass_flowrate']
+    mass_flowrate_s = params['secondary_mass_flowrate']
+
+    f_vec = np.empty(2*n_nodes, dtype=np.float64)
+
+    f_vec[0::2] = (mass_flowrate_p*params['cp_p']*(temp_p_up - temp_p) - qdot)/heat_cap_p
+
+    f_vec[1::2] = (mass_flowrate_s*(enthalpy_s_up - enthalpy_s) + qdot)/mass_s
+
+    diagnostics = dict()
+    diagnostics['heat_sink_pwr'] = - np.sum(qdot)
+    diagnostics['primary_outflow_temp'] = temp_p[0]
+    diagnostics['secondary_outflow_temp'] = temp_s[-1]
+    diagnostics['secondary_outflow_quality'] = quality[-1]
+    diagnostics['tau_p'] = np.sum(heat_cap_p/params['cp_p'])/mass_flowrate_p \
+                           if mass_flowrate_p > 0 else 1*unit.hour
+    diagnostics['tau_s'] = np.sum(mass_s)/mass_flowrate_s \
+                           if mass_flowrate_s > 0 else 1*unit.hour
+    diagnostics['nusselt_s'] = np.mean(h_s * 2*params['helicoil_inner_radius'] /
+                                       params['k_s'])
+    diagnostics['dryout_position'] = _dryout_position(quality, params)
+    diagnostics['temp_s'] = temp_s
+    diagnostics['quality'] = quality
+
+    return (f_vec, diagnostics)
+
+def axial_steamer_jac(u_vec, params):
+    """Jacobian of `axial_steamer_rhs()` in packed banded form (2 lower and 2
+       upper diagonals): `jac[2+i-j, j]` = df_i/du_j. The flow regime of each
+       node is taken as constant.
+    """
+
+    n_nodes = params['n_nodes']
+
+    temp_p = u_vec[0::2]
+    enthalpy_s = u_vec[1::2]
+
+    (temp_s, quality, dtemp_s_denthalpy) = _axial_secondary_temp(enthalpy_s, params)
+
+    (h_s, dh_s_dtemp_p, dh_s_dquality) = \
+        _axial_heat_transfer_coeff_secondary(temp_p, quality, params)
+
+    one_over_U = params['resistance_p'] + 1/h_s
+    dU_dh_s = 1/(h_s*one_over_U)**2
+
+    # Quality derivative in the two phase nodes
+    two_phase = (0.0 < quality) & (quality < 1.0)
+    dquality_denthalpy_s = np.where(two_phase, 1/(params['enthalpy_vap_s'] -
+                                                  params['enthalpy_liq_s']), 0.0)
+
+    area = params['heat_transfer_area']/n_nodes
+
+    dqdot_dtemp_p = area * (1/one_over_U + (temp_p - temp_s)*dU_dh_s*dh_s_dtemp_p)
+    dqdot_denthalpy_s = area * (- dtemp_s_denthalpy/one_over_U + (temp_p - temp_s) *
+                                dU_dh_s*dh_s_dquality*dquality_denthalpy_s)
+
+    heat_cap_p = params['rho_p']*params['primary_volume']/n_nodes*params['cp_p']
+    mass_s = params['rho_s']*params['secondary_volume']/n_nodes
+
+    flow_p = params['primary_mass_flowrate']*params['cp_p']/heat_cap_p
+    flow_s = params['secondary_mass_flowrate']/mass_s
+
+    jac = np.zeros((5, 2*n_nodes), dtype=np.float64)
+
+    # Primary node balances
+    jac[2, 0::2] = - flow_p - dqdot_dtemp_p/heat_cap_p
+    jac[1, 1::2] = - dqdot_denthalpy_s/heat_cap_p
+    jac[0, 2::2] = flow_p[:-1]
+
+    # Secondary node balances
+    jac[2, 1::2] = - flow_s + dqdot_denthalpy_s/mass_s
+    jac[3, 0::2] = dqdot_dtemp_p/mass_s
+    jac[4, 1:-1:2] = flow_s[1:]
+
+    return jac
+
+def _axial_secondary_temp(enthalpy_s, params):
+    """Secondary temperature, quality and temperature derivative with respect to
+       the enthalpy of the nodes.
+    """
+
+    temp_sat = params['temp_s_sat']
+    enthalpy_liq = params['enthalpy_liq_s']
+    enthalpy_vap = params['enthalpy_vap_s']
+
+    subcooled = enthalpy_s < enthalpy_liq
+    superheated = enthalpy_s > enthalpy_vap
+
+    dtemp_denthalpy = np.where(subcooled, 1/params['cp_liq_s'], 0.0)
+    dtemp_denthalpy = np.where(superheated, 1/params['cp_vap_s'], dtemp_denthalpy)
+
+    temp_s = np.where(subcooled, temp_sat + (enthalpy_s - enthalpy_liq)*dtemp_denthalpy,
+                      temp_sat)
+    temp_s = np.where(superheated, temp_sat + (enthalpy_s - enthalpy_vap)*dtemp_denthalpy,
+                      temp_s)
+
+    quality = np.clip((enthalpy_s - enthalpy_liq)/(enthalpy_vap - enthalpy_liq), 0.0, 1.0)
+
+    return (temp_s, quality, dtemp_denthalpy)
+
+def _axial_heat_transfer_coeff_secondary(temp_p, quality, params):
+    """Heat transfer coefficient in the secondary flow of the nodes and its
+       derivatives with respect to the primary temperature and to the quality.
+       SI units: W/m2-K. Nucleate boiling up to the dryout quality, single phase
+       otherwise; the transition is smooth (C1) over `DRYOUT_TRANSITION` in
+       quality.
+       The boiling coefficient is bounded below by the single phase one so that
+       the onset of nucleate boiling is continuous (development of the boiling
+       within a few kelvin of wall superheat).
+    """
+
+    temp_excess = temp_p - params['wall_temp_delta'] - params['temp_s_sat']
+
+    h_single_phase = params['h_s_single_phase']
+
+    (h_jens_lottes, dh_jens_lottes) = jens_lottes(temp_excess, params['secondary_pressure'])
+
+    boiling = (h_jens_lottes > h_single_phase) & (quality < params['dryout_quality'])
+
+    h_boiling = np.where(boiling, h_jens_lottes, h_single_phase)
+    dh_boiling_dtemp_p = np.where(boiling, dh_jens_lottes, 0.0)
+
+    # Wetted fraction of the wall
+    (wetted, dwetted) = smooth_step(2*(params['dryout_quality'] - quality)/
+                                    DRYOUT_TRANSITION - 1)
+    dwetted_dquality = - 2*dwetted/DRYOUT_TRANSITION
+
+    h_s = wetted*h_boiling + (1-wetted)*h_single_phase
+    dh_s_dtemp_p = wetted*dh_boiling_dtemp_p
+    dh_s_dquality = dwetted_dquality*(h_boiling - h_single_phase)
+
+    return (h_s, dh_s_dtemp_p, dh_s_dquality)
+
+def _dryout_position(quality, params):
+    """Distance from the secondary inlet where the quality reaches the dryout
+       quality; the coil length if it does not.
+    """
+
+    n_nodes = params['n_nodes']
+    length = params['helicoil_length']
+
+    dry = np.nonzero(quality >= params['dryout_quality'])[0]
+
+    if dry.size == 0:
+        return length
+
+    i = dry[0]
+    if i == 0:
+        return 0.0
+
+    # Linear interpolation between the node centers
+    frac = (params['dryout_quality'] - quality[i-1])/(quality[i] - quality[i-1])
+
+    return (i - 0.5 + frac)*length/n_nodes
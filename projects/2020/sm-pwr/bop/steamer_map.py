@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Steady state performance map of the steamer.
+
+   The steady state outflow conditions of a prototype `Steamer` are computed on
+   a grid of inflow conditions (`SteamerMap.axis_names`), in parallel over a
+   process pool, and stored as a compressed N-D table. Where the steady state
+   solve fails (e.g. near the boiling onset) the steamer dynamics are marched
+   until the outflow settles. The map is interpolated
+   (multilinear) at any point inside the grid; a `Steamer` with a
+   `performance_map` follows the map instead of integrating its dynamics.
+"""
+
+import copy
+import logging
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+
+import unit
+
+from steamer import Steamer
+
+class SteamerMap:
+    """Tabulated steamer steady states.
+
+    Parameters
+    ----------
+    axes: dict
+        Axis name (see `axis_names`) to the increasing sequence of its grid
+        values; axes not given are fixed at the value of the prototype steamer.
+    steamer: Steamer or None
+        Prototype steamer holding all other data (design, secondary mass
+        flowrate, water properties, axial model); a default `Steamer()` if None.
+    n_workers: int
+        Number of processes over which the grid points are spread.
+
+    Attributes
+    ----------
+    values: dict(numpy.ndarray)
+        Output name (see `output_names`) to its table over the grid; NaN where
+        the steady state was not found.
+    n_failed: int
+        Number of grid points without a steady state.
+
+    Examples
+    --------
+    >>> steamer_map = SteamerMap({'primary_inflow_temp': [555, 565, 575]})
+    >>> steamer_map.save('steamer-map.npz')
+    >>> outflow = SteamerMap.load('steamer-map.npz')(primary_inflow_temp=560.0)
+    """
+
+    axis_names = ('primary_inflow_temp', 'primary_mass_flowrate', 'secondary_pressure',
+                  'secondary_inflow_temp')
+
+    output_names = ('primary_outflow_temp', 'secondary_outflow_temp',
+                    'secondary_outflow_quality', 'heat_transfer_pwr')
+
+    def __init__(self, axes, steamer=None, n_workers=1):
+
+        self.log = logging.getLogger('cortix')
+
+        unknown = set(axes) - set(self.axis_names)
+        assert not unknown, 'unknown axes: %r'%sorted(unknown)
+
+        if steamer is None:
+            steamer = Steamer()
+
+        self.axes = dict()
+        for name in self.axis_names:
+            grid = np.atleast_1d(np.asarray(axes.get(name, getattr(steamer, name)),
+                                            dtype=np.float64))
+            assert np.all(np.diff(grid) > 0), 'axis %r not increasing'%name
+            self.axes[name] = grid
+
+        shape = tuple(grid.size for grid in self.axes.values())
+        points = list(itertools.product(*self.axes.values()))
+
+        # Prototype without Cortix runtime state nor run state
+        steamer = copy.deepcopy(steamer)
+        steamer.integrator = None
+
+        chunk = max(1, len(points)//(4*n_workers))
+
+        if n_workers > 1:
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                outflows = list(pool.map(_steady_state, itertools.repeat(steamer),
+                                         points, chunksize=chunk))
+        else:
+            outflows = [_steady_state(steamer, point) for point in points]
+
+        outflows = np.array(outflows, dtype=np.float64).reshape(shape+(-1,))
+
+        self.values = {name: outflows[..., i] for (i, name) in enumerate(self.output_names)}
+
+        self.n_failed = int(np.count_nonzero(np.isnan(outflows[..., 0])))
+        if self.n_failed:
+            self.log.warning('SteamerMap: no steady state at %i of %i grid points'%
+                             (self.n_failed, len(points)))
+
+        self.__build_interpolant()
+
+    def __call__(self, **inflow):
+        """Interpolated steady state outflow conditions.
+
+        Parameters
+        ----------
+        inflow: float or numpy.ndarray
+            Values of the axes by name; axes with a single grid value may be
+            omitted.
+
+        Returns
+        -------
+        outflow: dict
+            Output name (see `output_names`) to its value, with the broadcast
+            shape of the inflow values.
+        """
+
+        values = list()
+        for (name, grid) in self.axes.items():
+            if grid.size == 1:
+                value = np.asarray(inflow.get(name, grid[0]), dtype=np.float64)
+            else:
+                value = np.asarray(inflow[name], dtype=np.float64)
+            assert np.all((grid[0] <= value) & (value <= grid[-1])), \
+                   '%s = %r out of the map range [%r, %r]'%(name, value, grid[0], grid[-1])
+            values.append(value)
+
+        values = np.broadcast_arrays(*values)
+        points = np.stack(values, axis=-1).reshape(-1, len(values))
+
+        outflows = self.__interpolant(points)
+
+        return {name: outflows[:, i].reshape(values[0].shape)[()]
+                for (i, name) in enumerate(self.output_names)}
+
+    def save(self, filename):
+        """Write the map to a compressed NumPy archive.
+        """
+
+        arrays = {'axis-'+name: grid for (name, grid) in self.axes.items()}
+        arrays.update({'value-'+name: table for (name, table) in self.values.items()})
+
+        np.savez_compressed(filename, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        """Read a map written by `save()`.
+        """
+
+        steamer_map = cls.__new__(cls)
+        steamer_map.log = logging.getLogger('cortix')
+
+        with np.load(filename) as arrays:
+            steamer_map.axes = {name: arrays['axis-'+name] for name in cls.axis_names}
+            steamer_map.values = {name: arrays['value-'+name] for name in cls.output_names}
+
+        steamer_map.n_failed = int(np.count_nonzero(
+            np.isnan(steamer_map.values[cls.output_names[0]])))
+
+        steamer_map.__build_interpolant()
+
+        return steamer_map
+
+    def __build_interpolant(self):
+
+        tables = np.stack([self.values[name] for name in self.output_names], axis=-1)
+
+        self.__interpolant = RegularGridInterpolator(list(self.axes.values()), tables)
+
+def _steady_state(steamer, point):
+    """Process pool worker: steady state outflow conditions of the prototype
+       `steamer` at the inflow conditions `point` (values of the map axes).
+    """
+
+    steamer = copy.deepcopy(steamer)
+
+    for (name, value) in zip(SteamerMap.axis_names, point):
+        setattr(steamer, name, value)
+
+    try:
+        steamer.set_state(steamer.steady_state())
+    except (AssertionError, NotImplementedError, ValueError):
+        if not _settle(steamer):
+            return [np.nan]*len(SteamerMap.output_names)
+
+    return [steamer.primary_outflow_temp, steamer.secondary_outflow_temp,
+            steamer.secondary_outflow_quality, -steamer.heat_sink_pwr]
+
+def _settle(steamer, max_time=30*unit.minute, time_step=10*unit.second, xtol=1e-4):
+    """March the steamer dynamics from its inflow temperatures for `max_time`;
+       True if the outflow temperatures changed less than `xtol` [K] over the
+       last minute.
+    """
+
+    try:
+        steamer.set_state(np.array([steamer.primary_inflow_temp,
+                                    steamer.secondary_inflow_temp]))
+        steamer.time_step = time_step
+        steamer.end_time = steamer.initial_time + max_time
+        steamer.run()
+    except (AssertionError, NotImplementedError, ValueError):
+        return False
+
+    n_last = int(round(1*unit.minute/time_step)) + 1
+
+    for (phase, name) in ((steamer.primary_outflow_phase, 'temp'),
+                          (steamer.secondary_outflow_phase, 'temp')):
+        (quant, _) = phase.get_quantity_history(name)
+        if np.ptp(quant.value.values[-n_last:].astype(np.float64)) > xtol:
+            return False
+
+    return True
@@ -6,12 +6,15 @@
 
 import logging
 
-import iapws.iapws97 as steam_table
+from saturation import saturation_cache
+from steam_expansion import SteamExpansion
 
 import unit
 
 from cortix import Module
-from cortix.support.phase_new import PhaseNew as Phase
+from history import PhaseHistory as Phase
+from history import reserve_histories
+from history import flush_histories
 from cortix import Quantity
 
 class Turbine(Module):
@@ -23,6 +26,10 @@ class Turbine(Module):
     modules: reactor, turbine.
     See instance attribute `port_names_expected`.
 
+    The expansion to the vent pressure is evaluated with a memoized
+    `SteamExpansion` engine (see `steam_expansion`), rebuilt when the vent
+    pressure changes.
+
     """
 
     def __init__(self):
@@ -57,6 +64,8 @@ class Turbine(Module):
         self.vent_pressure = 0.008066866*unit.mega*unit.pascal
         #self.vent_pressure = 1*unit.bar
 
+        self.expansion = None # SteamExpansion at the vent pressure
+
         # Initialization
 
         self.inflow_temp = 20+273.15 #K
@@ -139,6 +148,8 @@ class Turbine(Module):
         if self.initial_time + self.time_step > self.end_time:
             self.end_time = self.initial_time + self.time_step
 
+        reserve_histories(self)
+
         time = self.initial_time
 
         print_time = self.initial_time
@@ -171,6 +182,11 @@ class Turbine(Module):
 
         self.end_time = time # correct the final time if needed
 
+        flush_histories(self) # on-disk stores, if streamed
+
+        if self.show_time[0] and self.expansion is not None:
+            self.log.info(self.name+'::run(): '+str(self.expansion))
+
     def __call_ports(self, time):
 
 
@@ -191,6 +207,9 @@ class Turbine(Module):
             self.inflow_mass_flowrate = inflow['mass_flowrate']
             self.inflow_total_heat_pwr = inflow['total_heat_power']
 
+            # Adaptive time step set upstream
+            self.time_step = inflow.get('time_step', self.time_step)
+
         # Interactions in the outflow port
         #-----------------------------------------
         # One way "to" outflow
@@ -207,6 +226,8 @@ class Turbine(Module):
             outflow['pressure'] = self.vent_pressure
             self.outflow_mass_flowrate = self.inflow_mass_flowrate
             outflow['mass_flowrate'] = self.outflow_mass_flowrate
+            outflow['quality'] = self.outflow_phase.get_value('quality', msg_time)
+            outflow['time_step'] = self.time_step
 
             self.send((msg_time, outflow), 'outflow')
 
@@ -235,37 +256,19 @@ class Turbine(Module):
         p_out_MPa = self.vent_pressure/unit.mega/unit.pascal
 
         # If entering stream is not steam (valve closed scenario)
-        if self.inflow_temp < steam_table._TSat_P(p_in_MPa):
+        if self.inflow_temp < saturation_cache.liquid(p_in_MPa).T:
             t_runoff = self.inflow_temp
             turbine_power = 0
             quality = 0
 
         else:
-            s_out_prime = steam_table._Region2(self.inflow_temp, p_in_MPa)['s']
-            h_in = steam_table._Region2(self.inflow_temp, p_in_MPa)['h']
-            bubl = steam_table._Region4(p_out_MPa, 0)
-            dew = steam_table._Region4(p_out_MPa, 1)
-            bubl_entropy = bubl['s']
-            dew_entropy = dew['s']
-            bubl_enthalpy = bubl['h']
-            dew_enthalpy = dew['h']
-
-            # If the ideal runoff is two-phase mixture:
-            if bubl_entropy < s_out_prime < dew_entropy:
-                quality = (s_out_prime - bubl_entropy) / (dew_entropy - bubl_entropy)
-                h_out_prime = bubl_enthalpy + quality * (dew_enthalpy - bubl_enthalpy)
-
-            # If ideal run off is superheated
-            elif s_out_prime > dew_entropy:
-                t_ideal = steam_table._Backward2_T_Ps(p_out_MPa, s_out_prime)
-                h_out_prime = steam_table._Region2(t_ideal, p_out_MPa)['h']
-                quality = 1
-
-            # Else ideal run off is subcooled
-            else:
-                t_ideal = steam_table._Backward1_T_Ps(p_out_MPa, s_out_prime)
-                h_out_prime = steam_table._Region1(t_ideal, p_out_MPa)['h']
-                quality = 0
+            if self.expansion is None or self.expansion.outflow_press != p_out_MPa:
+                self.expansion = SteamExpansion(p_out_MPa)
+
+            (h_in, s_out_prime) = self.expansion.inflow_state(self.inflow_temp, p_in_MPa)
+
+            # Ideal (isentropic) run off
+            h_out_prime = self.expansion.isentropic_enthalpy(s_out_prime)
 
             # Calculate the real runoff enthalpy
             w_ideal = h_in - h_out_prime  #on a per mass basis
@@ -276,20 +279,8 @@ class Turbine(Module):
             if w_real < 0:
                 w_real = 0
 
-            # If run off is actually subcooled
-            if h_out_real < bubl_enthalpy:
-                t_runoff = steam_table._Backward1_T_Ph(p_out_MPa, h_out_real)
-                quality = 0  # subcooled liquid
-
-            # If run off is actually superheated
-            elif h_out_real > dew_enthalpy:
-                t_runoff = steam_table._Backward2_T_Ph(p_out_MPa, h_out_real)
-                quality = 1 # superheated steam
-
-            # Else run off is actually in two phase region
-            else:
-                quality = (h_out_real - bubl_enthalpy)/(dew_enthalpy - bubl_enthalpy)
-                t_runoff = steam_table._Region4(p_out_MPa, quality)['T']
+            # Run off: subcooled, two phase or superheated
+            (t_runoff, quality) = self.expansion.outflow_state(h_out_real)
 
             turbine_power = self.inflow_mass_flowrate * w_real * unit.kilo*unit.watt
 
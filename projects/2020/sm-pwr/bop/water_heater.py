@@ -5,6 +5,7 @@
 """Cortix module"""
 
 import logging
+import math
 
 from iapws import IAPWS97 as steam_table
 
@@ -14,7 +15,9 @@ import numpy as np
 import unit
 
 from cortix import Module
-from cortix.support.phase_new import PhaseNew as Phase
+from history import PhaseHistory as Phase
+from history import reserve_histories
+from history import flush_histories
 from cortix import Quantity
 
 class WaterHeater(Module):
@@ -26,6 +29,11 @@ class WaterHeater(Module):
     modules: reactor, turbine.
     See instance attribute `port_names_expected`.
 
+    The outflow temperature relaxes exponentially to the inflow temperature plus
+    the heating temperature rise; with `exponential_update` on, each step uses
+    the exact solution with frozen water properties and integrates the energy
+    balance only where the estimated error exceeds the tolerance.
+
     """
 
     def __init__(self):
@@ -58,6 +66,12 @@ class WaterHeater(Module):
 
         self.volume = 5*unit.meter**3
 
+        # Closed form step with frozen water properties: (on/off, temperature
+        # error tolerance); integrate the energy balance where the estimated
+        # error is larger
+        self.exponential_update = (True, 1e-3*unit.K)
+        self.n_integrated_steps = 0
+
         # Initialization
 
         self.inflow_temp = (20+273)*unit.kelvin
@@ -140,6 +154,8 @@ class WaterHeater(Module):
         if self.initial_time + self.time_step > self.end_time:
             self.end_time = self.initial_time + self.time_step
 
+        reserve_histories(self)
+
         time = self.initial_time
 
         print_time = self.initial_time
@@ -173,6 +189,16 @@ class WaterHeater(Module):
 
         self.end_time = time # correct the final time if needed
 
+        flush_histories(self) # on-disk stores, if streamed
+
+    def set_state(self, temp):
+        """Start the run from the outflow temperature `temp` (e.g. the nominal
+           feedwater temperature of a steady start).
+        """
+
+        self.outflow_temp = temp
+        self.outflow_phase.set_value('temp', temp, self.initial_time)
+
     def __call_ports(self, time):
 
         # Interactions in the feed water outflow port
@@ -201,6 +227,9 @@ class WaterHeater(Module):
             outflow['temperature'] = temp
             outflow['pressure'] = pressure
             outflow['mass_flowrate'] = outflow_mass_flowrate
+            if self.malfunction[0]:
+                # time steps of the network land on the malfunction start/end
+                outflow['breakpoints'] = self.malfunction[1:]
             self.send((msg_time, outflow), 'outflow')
 
         # Interactions in the inflow port
@@ -219,6 +248,9 @@ class WaterHeater(Module):
             self.inflow_pressure = inflow['pressure']
             self.inflow_mass_flowrate = inflow['mass_flowrate']
 
+            # adaptive time step set upstream
+            self.time_step = inflow.get('time_step', self.time_step)
+
         # Interactions in the external-heat port
         #----------------------------------------
         # one way "from" external-heat
@@ -239,21 +271,32 @@ class WaterHeater(Module):
         # Get state values
         u_0 = self.__get_state_vector(time)
 
-        t_interval_sec = np.linspace(time, time+self.time_step, num=2)
+        temp = None
+
+        if self.exponential_update[0]:
+            (temp, error) = self.__exponential_step(u_0[0])
+            if error > self.exponential_update[1]:
+                temp = None
+
+        if temp is None:
 
-        max_n_steps_per_time_step = 1500 # max number of nonlinear algebraic solver
-                                         # iterations per time step
+            self.n_integrated_steps += 1
 
-        (u_vec_hist, info_dict) = odeint(self.__f_vec, u_0, t_interval_sec,
-                                         #rtol=1e-4, atol=1e-8,
-                                         mxstep=max_n_steps_per_time_step,
-                                         full_output=True, tfirst=False)
+            t_interval_sec = np.linspace(time, time+self.time_step, num=2)
 
-        assert info_dict['message'] == 'Integration successful.', info_dict['message']
+            max_n_steps_per_time_step = 1500 # max number of nonlinear algebraic solver
+                                             # iterations per time step
 
-        u_vec = u_vec_hist[1, :]  # solution vector at final time step
+            (u_vec_hist, info_dict) = odeint(self.__f_vec, u_0, t_interval_sec,
+                                             #rtol=1e-4, atol=1e-8,
+                                             mxstep=max_n_steps_per_time_step,
+                                             full_output=True, tfirst=False)
 
-        temp = u_vec[0] # primary outflow temp
+            assert info_dict['message'] == 'Integration successful.', info_dict['message']
+
+            u_vec = u_vec_hist[1, :]  # solution vector at final time step
+
+            temp = u_vec[0] # primary outflow temp
 
         # Update state variables
         outflow = self.outflow_phase.get_row(time)
@@ -296,6 +339,22 @@ class WaterHeater(Module):
         #-----------------------
         # primary energy balance
         #-----------------------
+        (tau, heat_rise) = self.__coefficients(temp)
+
+        temp_in = self.inflow_temp
+
+        #-----------------------
+        # calculations
+        #-----------------------
+        f_tmp[0] = - 1/tau * (temp - temp_in - heat_rise)
+
+        return f_tmp
+
+    def __coefficients(self, temp):
+        """Residence time and heating temperature rise of the energy balance
+           dT/dt = -(T - T_in - dT_q)/tau at the outflow temperature `temp`.
+        """
+
         water = steam_table(T=temp,
                             P=self.inflow_pressure/unit.mega/unit.pascal)
 
@@ -303,20 +362,43 @@ class WaterHeater(Module):
 
         rho = water.rho
         cp = water.Liquid.cp*unit.kj/unit.kg/unit.K
-        vol = self.volume
-
-        temp_in = self.inflow_temp
 
-        tau = vol/(self.inflow_mass_flowrate/rho)
+        tau = self.volume/(self.inflow_mass_flowrate/rho)
 
-        #-----------------------
-        # calculations
-        #-----------------------
         heat_source_pwr = self.external_heat_source_rate + \
                           self.electric_heat_source_rate
 
-        heat_source_pwr_dens = heat_source_pwr/vol
+        heat_rise = heat_source_pwr/self.inflow_mass_flowrate/cp
 
-        f_tmp[0] = - 1/tau * (temp - temp_in) + 1./rho/cp * heat_source_pwr_dens
+        return (tau, heat_rise)
 
-        return f_tmp
+    def __exponential_step(self, temp_0):
+        """Exact solution of the energy balance over the time step with frozen
+           water properties.
+
+        The properties are frozen at the initial temperature and then at the
+        predicted final temperature; the mean of the two solutions is returned
+        with half their difference as the error estimate.
+
+        Returns
+        -------
+        (temp, error): tuple
+        """
+
+        temps = list()
+        temp = temp_0
+
+        for _ in range(2):
+            (tau, heat_rise) = self.__coefficients(temp)
+            temp = _exponential_relaxation(temp_0, self.inflow_temp + heat_rise, tau,
+                                           self.time_step)
+            temps.append(temp)
+
+        return ((temps[0] + temps[1])/2, abs(temps[0] - temps[1])/2)
+
+def _exponential_relaxation(temp_0, temp_eq, tau, time_step):
+    """Temperature after `time_step` relaxing from `temp_0` to `temp_eq` with
+       time constant `tau`.
+    """
+
+    return temp_eq + (temp_0 - temp_eq)*math.exp(-time_step/tau)
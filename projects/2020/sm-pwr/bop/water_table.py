@@ -0,0 +1,439 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Tabulated IAPWS-97 water properties for the BOP modules.
+
+   A `WaterTable` is a drop-in replacement for `iapws.IAPWS97` in the module hot
+   loops. Subcooled liquid properties are tabulated on a (T, P) grid and
+   interpolated with bicubic patches; saturation properties are tabulated along
+   P with cubic splines and mixed with the quality x. Queries outside the tables
+   fall back to the exact IAPWS-97 formulation.
+
+   Units follow IAPWS97: T [K], P [MPa], h [kJ/kg], cp [kJ/kg-K], mu [Pa-s],
+   k [W/m-K], rho [kg/m^3].
+"""
+
+import logging
+
+import numpy as np
+from scipy.interpolate import RectBivariateSpline, CubicSpline
+
+from iapws import IAPWS97 as WaterProps
+
+class WaterState:
+    """Water state returned by `WaterTable`.
+
+    Mirrors the subset of the `IAPWS97` attributes used in the BOP modules:
+    `T`, `P`, `x`, `phase`, `rho`, `h`, `cp`, `mu`, `k`, `Prandt`, and the
+    `Liquid` and `Vapor` phase states.
+    """
+
+    def __init__(self, T, P, x, phase, rho, h, cp, mu, k, Prandt,
+                 liquid=None, vapor=None):
+
+        self.T = T
+        self.P = P
+        self.x = x
+        self.phase = phase
+
+        self.rho = rho
+        self.h = h
+        self.cp = cp
+        self.mu = mu
+        self.k = k
+        self.Prandt = Prandt
+
+        self.Liquid = liquid if liquid is not None else self
+        self.Vapor = vapor
+
+class WaterTable:
+    """Tabulated IAPWS-97 property engine.
+
+    Parameters
+    ----------
+    temp_range: tuple(float)
+        Liquid table temperature range [K]. Every node must be subcooled at the
+        lowest table pressure.
+    press_range: tuple(float)
+        Table pressure range [MPa].
+    n_temp: int
+        Initial number of temperature nodes.
+    n_press: int
+        Initial number of pressure nodes.
+    rtol: float
+        Maximum relative interpolation error allowed at the cell midpoints. The
+        grid is refined (doubled) until the bound is met or `max_refinements` is
+        reached.
+    max_refinements: int
+        Maximum number of grid refinements.
+
+    Attributes
+    ----------
+    n_table_calls: int
+        Number of queries served by the tables.
+    n_exact_calls: int
+        Number of queries that fell back to IAPWS97.
+    max_rel_error: dict
+        Maximum relative error per property found at the cell midpoints.
+
+    Examples
+    --------
+    >>> table = WaterTable()
+    >>> water = table(T=550.0, P=12.76)
+    >>> sat_liq = table(P=12.76, x=0.0)
+    """
+
+    liquid_names = ('rho', 'h', 'cp', 'mu', 'k', 'Prandt')
+    saturation_names = ('T', 'rho_l', 'rho_v', 'h_l', 'h_v', 'cp_l', 'cp_v',
+                        'mu_l', 'mu_v', 'k_l', 'k_v', 'Prandt_l', 'Prandt_v')
+
+    # Hermite basis: p(t) = [1,t,t^2,t^3] @ M @ [p(0), p(1), p'(0), p'(1)]
+    __hermite = np.array([[ 1.,  0.,  0.,  0.],
+                          [ 0.,  0.,  1.,  0.],
+                          [-3.,  3., -2., -1.],
+                          [ 2., -2.,  1.,  1.]])
+
+    def __init__(self, temp_range=(280.0, 580.0), press_range=(10.0, 16.0),
+                 n_temp=31, n_press=13, rtol=2e-4, max_refinements=2):
+
+        assert temp_range[0] < temp_range[1]
+        assert press_range[0] < press_range[1]
+
+        self.log = logging.getLogger('cortix')
+
+        self.temp_range = temp_range
+        self.press_range = press_range
+        self.rtol = rtol
+
+        water_sat = WaterProps(P=press_range[0], x=0.0)
+        if temp_range[1] >= water_sat.T:
+            raise ValueError('temp_range max %r K not subcooled at P = %r MPa (Tsat = %r K)'%
+                             (temp_range[1], press_range[0], water_sat.T))
+
+        for _ in range(max_refinements+1):
+
+            self.__build(n_temp, n_press)
+
+            self.max_rel_error = self.__midpoint_error()
+
+            if max(self.max_rel_error.values()) <= rtol:
+                break
+
+            n_temp = 2*n_temp - 1
+            n_press = 2*n_press - 1
+
+        else:
+            self.log.warning('WaterTable: rtol = %r not met; max rel. error = %r'%
+                             (rtol, self.max_rel_error))
+
+        self.n_table_calls = 0
+        self.n_exact_calls = 0
+
+    def __call__(self, T=None, P=None, x=None):
+        """Drop-in replacement of `IAPWS97(T=, P=)` and `IAPWS97(P=, x=)`.
+
+        Returns
+        -------
+        water: WaterState or IAPWS97
+            The exact IAPWS97 object is returned when the query is outside the
+            tables.
+        """
+
+        assert P is not None
+
+        if x is not None:
+            assert T is None
+            if self.press_range[0] <= P <= self.press_range[1]:
+                self.n_table_calls += 1
+                return self.__saturation_state(P, x)
+            self.n_exact_calls += 1
+            return WaterProps(P=P, x=x)
+
+        assert T is not None
+
+        if self.press_range[0] <= P <= self.press_range[1] and \
+           self.temp_range[0] <= T <= self.temp_range[1]:
+            self.n_table_calls += 1
+            (rho, h, cp, mu, k, prtl) = self.__liquid_point(T, P).tolist()
+            return WaterState(T, P, 0, 'Liquid', rho, h, cp, mu, k, prtl)
+
+        self.n_exact_calls += 1
+        return WaterProps(T=T, P=P)
+
+    def evaluate(self, temp, press):
+        """Vectorised evaluation of liquid and saturation properties.
+
+        Parameters
+        ----------
+        temp: float or numpy.ndarray
+            Temperature [K].
+        press: float or numpy.ndarray
+            Pressure [MPa].
+
+        Returns
+        -------
+        props: dict(numpy.ndarray)
+            Keys: `rho`, `h`, `cp`, `mu`, `k`, `Prandt`, `phase` (IAPWS97 phase
+            name), `T_sat`, `h_l`, `h_v`, `rho_l`, `rho_v`. Points outside the
+            tables are evaluated with IAPWS97.
+        """
+
+        (temp, press) = np.broadcast_arrays(np.asarray(temp, dtype=np.float64),
+                                            np.asarray(press, dtype=np.float64))
+        temp = temp.ravel()
+        press = press.ravel()
+
+        in_table = (self.temp_range[0] <= temp) & (temp <= self.temp_range[1]) & \
+                   (self.press_range[0] <= press) & (press <= self.press_range[1])
+
+        values = np.empty((len(self.liquid_names), temp.size), dtype=np.float64)
+        values[:, in_table] = self.__liquid_values(temp[in_table], press[in_table])
+
+        props = dict(zip(self.liquid_names, values))
+        props['phase'] = np.full(temp.size, 'Liquid', dtype=object)
+
+        for i in np.flatnonzero(~in_table):
+            water = WaterProps(T=temp[i], P=press[i])
+            state = water.Liquid if water.phase == 'Liquid' else water
+            for name in self.liquid_names:
+                props[name][i] = getattr(state, name)
+            props['phase'][i] = water.phase
+
+        sat = self.saturation(press)
+        props['T_sat'] = sat['T']
+        for name in ('h_l', 'h_v', 'rho_l', 'rho_v'):
+            props[name] = sat[name]
+
+        self.n_table_calls += int(np.count_nonzero(in_table))
+        self.n_exact_calls += int(np.count_nonzero(~in_table))
+
+        return props
+
+    def saturation(self, press):
+        """Vectorised saturation properties.
+
+        Parameters
+        ----------
+        press: float or numpy.ndarray
+            Pressure [MPa].
+
+        Returns
+        -------
+        sat: dict(numpy.ndarray)
+            Keys in `saturation_names`.
+        """
+
+        press = np.atleast_1d(np.asarray(press, dtype=np.float64)).ravel()
+
+        in_table = (self.press_range[0] <= press) & (press <= self.press_range[1])
+
+        values = np.empty((press.size, len(self.saturation_names)), dtype=np.float64)
+        values[in_table] = self.__saturation_spline(press[in_table])
+
+        for i in np.flatnonzero(~in_table):
+            exact = self.__exact_saturation(press[i])
+            values[i] = [exact[name] for name in self.saturation_names]
+
+        return dict(zip(self.saturation_names, values.T))
+
+    def accuracy_report(self, n_samples=1000, seed=1):
+        """Side-by-side comparison against IAPWS97 at random table points.
+
+        Returns
+        -------
+        report: dict
+            For each property name a tuple (maximum relative error, mean
+            relative error). Saturation properties are prefixed with `sat-`.
+        """
+
+        rng = np.random.default_rng(seed)
+
+        temp = rng.uniform(*self.temp_range, n_samples)
+        press = rng.uniform(*self.press_range, n_samples)
+
+        table = self.evaluate(temp, press)
+        sat = self.saturation(press)
+
+        rel_err = dict()
+        for name in self.liquid_names:
+            rel_err[name] = np.empty(n_samples)
+        for name in self.saturation_names:
+            rel_err['sat-'+name] = np.empty(n_samples)
+
+        for i in range(n_samples):
+            water = WaterProps(T=temp[i], P=press[i])
+            for name in self.liquid_names:
+                exact = getattr(water, name)
+                rel_err[name][i] = abs(table[name][i] - exact)/abs(exact)
+            for (name, exact) in self.__exact_saturation(press[i]).items():
+                rel_err['sat-'+name][i] = abs(sat[name][i] - exact)/abs(exact)
+
+        report = {name: (err.max(), err.mean()) for (name, err) in rel_err.items()}
+
+        return report
+
+    def __liquid_point(self, temp, press):
+        """Scalar fast path of `__liquid_values`.
+        """
+
+        t = (temp - self.temp_range[0])/self.__d_temp
+        u = (press - self.press_range[0])/self.__d_press
+
+        i = min(max(int(t), 0), self.n_temp-2)
+        j = min(max(int(u), 0), self.n_press-2)
+        t -= i
+        u -= j
+
+        t_vec = np.array((1.0, t, t*t, t*t*t))
+        u_vec = np.array((1.0, u, u*u, u*u*u))
+
+        return self.__coeffs[i, j] @ u_vec @ t_vec
+
+    def __liquid_values(self, temp, press):
+        """Bicubic patch evaluation of all liquid properties.
+
+        Returns
+        -------
+        values: numpy.ndarray
+            Shape (n_properties,) for scalar arguments, (n_properties, n)
+            otherwise.
+        """
+
+        t = (np.asarray(temp) - self.temp_range[0])/self.__d_temp
+        u = (np.asarray(press) - self.press_range[0])/self.__d_press
+
+        i = np.clip(np.floor(t).astype(int), 0, self.n_temp-2)
+        j = np.clip(np.floor(u).astype(int), 0, self.n_press-2)
+        t = t - i
+        u = u - j
+
+        t_vec = np.stack([np.ones_like(t), t, t*t, t*t*t])
+        u_vec = np.stack([np.ones_like(u), u, u*u, u*u*u])
+
+        # coeffs[i, j] shape (..., n_properties, 4, 4)
+        return np.einsum('...pab,a...,b...->p...', self.__coeffs[i, j], t_vec, u_vec)
+
+    def __saturation_state(self, press, qual):
+        """Two-phase state at pressure `press` and quality `qual`.
+        """
+
+        sat = dict(zip(self.saturation_names, self.__saturation_spline(press).tolist()))
+
+        liquid = WaterState(sat['T'], press, 0, 'Liquid', sat['rho_l'], sat['h_l'],
+                            sat['cp_l'], sat['mu_l'], sat['k_l'], sat['Prandt_l'])
+        vapor = WaterState(sat['T'], press, 1, 'Vapour', sat['rho_v'], sat['h_v'],
+                           sat['cp_v'], sat['mu_v'], sat['k_v'], sat['Prandt_v'])
+
+        rho = 1/((1-qual)/sat['rho_l'] + qual/sat['rho_v'])
+        h = (1-qual)*sat['h_l'] + qual*sat['h_v']
+        cp = (1-qual)*sat['cp_l'] + qual*sat['cp_v']
+        mu = (1-qual)*sat['mu_l'] + qual*sat['mu_v']
+        k = (1-qual)*sat['k_l'] + qual*sat['k_v']
+        prtl = (1-qual)*sat['Prandt_l'] + qual*sat['Prandt_v']
+
+        if qual == 0:
+            phase = 'Liquid'
+        elif qual == 1:
+            phase = 'Vapour'
+        else:
+            phase = 'Two phases'
+
+        return WaterState(sat['T'], press, qual, phase, rho, h, cp, mu, k, prtl,
+                          liquid=liquid, vapor=vapor)
+
+    def __exact_saturation(self, press):
+
+        water_sat_l = WaterProps(P=press, x=0.0)
+        sat_l = water_sat_l.Liquid
+        sat_v = WaterProps(P=press, x=1.0).Vapor
+
+        sat = dict()
+        sat['T'] = water_sat_l.T
+        for name in ('rho', 'h', 'cp', 'mu', 'k', 'Prandt'):
+            sat[name+'_l'] = getattr(sat_l, name)
+            sat[name+'_v'] = getattr(sat_v, name)
+
+        return sat
+
+    def __build(self, n_temp, n_press):
+        """Tabulate the exact properties on the grid nodes.
+
+        The nodal derivatives of a bicubic spline fit define one Hermite bicubic
+        patch per cell; the 4x4 patch coefficients are stored for all properties.
+        """
+
+        self.n_temp = n_temp
+        self.n_press = n_press
+
+        temps = np.linspace(*self.temp_range, n_temp)
+        presses = np.linspace(*self.press_range, n_press)
+
+        self.__d_temp = temps[1] - temps[0]
+        self.__d_press = presses[1] - presses[0]
+
+        n_props = len(self.liquid_names)
+        values = np.empty((n_props, n_temp, n_press))
+
+        for (i, temp) in enumerate(temps):
+            for (j, press) in enumerate(presses):
+                water = WaterProps(T=temp, P=press)
+                assert water.phase == 'Liquid', 'T = %r, P = %r'%(temp, press)
+                for (p, name) in enumerate(self.liquid_names):
+                    values[p, i, j] = getattr(water.Liquid, name)
+
+        # Nodal values and derivatives scaled to the unit cell
+        nodal = np.empty((4, n_props, n_temp, n_press))
+        for p in range(n_props):
+            spline = RectBivariateSpline(temps, presses, values[p], kx=3, ky=3)
+            nodal[0, p] = values[p]
+            nodal[1, p] = spline(temps, presses, dx=1) * self.__d_temp
+            nodal[2, p] = spline(temps, presses, dy=1) * self.__d_press
+            nodal[3, p] = spline(temps, presses, dx=1, dy=1) * self.__d_temp*self.__d_press
+
+        (f, f_t, f_u, f_tu) = nodal
+        s00 = np.s_[:, :-1, :-1]
+        s10 = np.s_[:, 1:, :-1]
+        s01 = np.s_[:, :-1, 1:]
+        s11 = np.s_[:, 1:, 1:]
+
+        corner = np.array([[f[s00],   f[s01],   f_u[s00],  f_u[s01]],
+                           [f[s10],   f[s11],   f_u[s10],  f_u[s11]],
+                           [f_t[s00], f_t[s01], f_tu[s00], f_tu[s01]],
+                           [f_t[s10], f_t[s11], f_tu[s10], f_tu[s11]]])
+
+        hermite = self.__hermite
+        # coeffs[i, j, p] = M @ corner[:, :, p, i, j] @ M^T
+        self.__coeffs = np.einsum('ac,cdpij,bd->ijpab', hermite, corner, hermite)
+
+        # Saturation line is one-dimensional; use a finer pressure grid
+        sat_presses = np.linspace(*self.press_range, 4*n_press-3)
+
+        values = np.empty((sat_presses.size, len(self.saturation_names)))
+        for (j, press) in enumerate(sat_presses):
+            exact = self.__exact_saturation(press)
+            values[j] = [exact[name] for name in self.saturation_names]
+
+        self.__saturation_spline = CubicSpline(sat_presses, values, axis=0)
+
+    def __midpoint_error(self):
+        """Maximum relative error of the liquid tables at the cell midpoints.
+        """
+
+        temps = np.linspace(*self.temp_range, self.n_temp)
+        presses = np.linspace(*self.press_range, self.n_press)
+
+        temp_mid = (temps[:-1] + temps[1:])/2
+        press_mid = (presses[:-1] + presses[1:])/2
+
+        max_err = {name: 0.0 for name in self.liquid_names}
+
+        for temp in temp_mid:
+            approx = self.__liquid_values(np.full(press_mid.size, temp), press_mid)
+            for (j, press) in enumerate(press_mid):
+                water = WaterProps(T=temp, P=press).Liquid
+                for (p, name) in enumerate(self.liquid_names):
+                    exact = getattr(water, name)
+                    max_err[name] = max(max_err[name], abs(approx[p, j]-exact)/abs(exact))
+
+        return max_err
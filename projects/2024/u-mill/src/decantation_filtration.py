@@ -81,7 +81,10 @@ from scipy.integrate import odeint
 import numpy as np
 
 from cortix import Module
-from cortix.support.phase_new import PhaseNew as Phase
+from history import PhaseHistory as Phase
+from history import reserve_histories
+from history import flush_histories
+from port_window import PortWindow
 from cortix import Quantity
 from cortix import Species
 from cortix import Units as unit
@@ -115,6 +118,11 @@ class DecantationFiltration(Module):
         self.time_step = 10.0*unit.minute
         self.show_time = (True, unit.hour)
         self.save = True
+
+        # Windowed port exchange: (on/off, time steps per message, sweeps per
+        # window); the same in all modules of the network, see `port_window`
+        self.port_window = (False, 60, 1)
+        self.port_exchange = None
         self.name = 'Decantation-Filtration'
 
         self.log = logging.getLogger('cortix')
@@ -549,6 +557,12 @@ class DecantationFiltration(Module):
         if self.initial_time + self.time_step > self.end_time:
             self.end_time = self.initial_time + self.time_step
 
+        reserve_histories(self)
+
+        if self.port_window[0]:
+            self.port_exchange = PortWindow(self, self.__window_ports(), self.__step,
+                                            *self.port_window[1:])
+
         time = self.initial_time
 
         print_time = self.initial_time
@@ -571,6 +585,12 @@ class DecantationFiltration(Module):
             else:
                 self.__logit = False
 
+            if self.port_window[0]:
+                # Evolve a window of time steps and communicate its information
+                #---------------------------------------------------------------
+                time = self.port_exchange.advance(time)
+                continue
+
             # Evolve one time step
             #---------------------
 
@@ -583,6 +603,11 @@ class DecantationFiltration(Module):
 
         self.end_time = time # correct the final time if needed
 
+        flush_histories(self) # on-disk stores, if streamed
+
+        if self.port_window[0] and self.show_time[0]:
+            self.log.info(self.name+'::run(): '+str(self.port_exchange))
+
     def __call_ports(self, time):
 
         # Interactions in the std feed port
@@ -684,6 +709,29 @@ class DecantationFiltration(Module):
 
             self.send((msg_time, self.filtration_filtrate_phase), 'filtrate')
 
+    def __window_ports(self):
+        """Ports of `__call_ports()`, in the same order, for the windowed
+           exchange; see `port_window.PortWindow`.
+        """
+
+        overflow = {'mass-flowrate': 'mass-flowrate', 'mass-density': 'mass-density'}
+
+        ports = list()
+        ports.append(('from', 'std-feed',
+                      {'mass-flowrate': 'std_feed_mass_flowrate',
+                       'mass-density': 'std_feed_mass_density',
+                       'solids-massfrac': 'std_feed_solids_massfrac'}))
+        ports.append(('to', 'ccd-overflow', self.ccd_overflow_phase, dict(overflow)))
+        ports.append(('from', 'ccd-feed',
+                      {'mass-flowrate': 'ccd_feed_mass_flowrate',
+                       'mass-density': 'ccd_feed_mass_density',
+                       'solids-massfrac': 'ccd_feed_solids_massfrac'}))
+        ports.append(('to', 'std-underflow', self.std_underflow_phase, dict(overflow)))
+        ports.append(('from', 'raffinate-feed', dict()))
+        ports.append(('to', 'filtrate', self.filtration_filtrate_phase, None))
+
+        return ports
+
     def __step(self, time=0.0):
         """Stepping Decantation-Filtration in time
         """
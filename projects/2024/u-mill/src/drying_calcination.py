@@ -62,7 +62,10 @@ from scipy.integrate import odeint
 import numpy as np
 
 from cortix import Module
-from cortix.support.phase_new import PhaseNew as Phase
+from history import PhaseHistory as Phase
+from history import reserve_histories
+from history import flush_histories
+from port_window import PortWindow
 from cortix import Quantity
 from cortix import Species
 from cortix import Units as unit
@@ -98,6 +101,11 @@ class DryingCalcination(Module):
         self.show_time = (False, 10.0*unit.second)
         self.save = True
 
+        # Windowed port exchange: (on/off, time steps per message, sweeps per
+        # window); the same in all modules of the network, see `port_window`
+        self.port_window = (False, 60, 1)
+        self.port_exchange = None
+
         self.log = logging.getLogger('cortix')
         self.__logit = True # flag indicating when to log
 
@@ -269,6 +277,12 @@ class DryingCalcination(Module):
 
         self.end_time = max(self.end_time, self.initial_time + self.time_step)
 
+        reserve_histories(self)
+
+        if self.port_window[0]:
+            self.port_exchange = PortWindow(self, self.__window_ports(), self.__step,
+                                            *self.port_window[1:])
+
         time = self.initial_time
 
         print_time = self.initial_time
@@ -290,6 +304,12 @@ class DryingCalcination(Module):
             else:
                 self.__logit = False
 
+            if self.port_window[0]:
+                # Evolve a window of time steps and communicate its information
+                #---------------------------------------------------------------
+                time = self.port_exchange.advance(time)
+                continue
+
             # Evolve one time step
             #---------------------
 
@@ -301,6 +321,11 @@ class DryingCalcination(Module):
 
         self.end_time = time # correct the final time if needed
 
+        flush_histories(self) # on-disk stores, if streamed
+
+        if self.port_window[0] and self.show_time[0]:
+            self.log.info(self.name+'::run(): '+str(self.port_exchange))
+
     def __call_ports(self, time):
 
         # Interactions in the primary-inflow port
@@ -342,6 +367,17 @@ class DryingCalcination(Module):
 
             self.send((msg_time, product), 'product')
 
+    def __window_ports(self):
+        """Ports of `__call_ports()`, in the same order, for the windowed
+           exchange; see `port_window.PortWindow`.
+        """
+
+        ports = list()
+        ports.append(('from', 'adu-feed', dict()))
+        ports.append(('to', 'product', None, dict()))
+
+        return ports
+
     def __step(self, time=0.0):
         """Stepping Decantation-Filtration in time
         """
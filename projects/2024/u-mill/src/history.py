@@ -0,0 +1,537 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Columnar phase history store for the Cortix modules.
+
+   `PhaseHistory` is a drop-in replacement of `cortix.support.phase_new.PhaseNew`
+   for the calls the modules make every time step (`get_row`, `add_row`,
+   `get_value`, `set_value`). Each column is a preallocated NumPy buffer
+   (float64 for scalar quantities and species, object otherwise) grown by
+   doubling, so appending a row is amortised O(1) instead of the O(n) append of
+   a pandas data frame. The pandas `Series` (`get_quantity_history()`), data
+   frame (`to_dataframe()`) or `PhaseNew` (`to_phase()`) are built only when
+   asked for, e.g. for plotting at the end of a run.
+
+   Time stamps are matched as in `PhaseNew`: the nearest time stamp within
+   1e-3 of the mean time step. Rows must be added in increasing time.
+
+   With `stream_to()` the rows are written in chunks to an on-disk store (see
+   `history_store`) on a background thread and dropped from memory, except the
+   last few (live) rows, which the modules read back as their state and port
+   values, or roll back with `truncate()` (see `port_window`).
+"""
+
+import bisect
+import numbers
+import os
+import shutil
+from copy import deepcopy
+
+import numpy as np
+import pandas
+
+from cortix.support.phase_new import PhaseNew
+from cortix.support.species import Species
+from cortix.support.quantity import Quantity
+
+from history_store import HistoryReader
+from history_store import writer
+from history_store import flush_writer
+
+class PhaseHistory:
+    """Phase history with preallocated column buffers.
+
+    Parameters
+    ----------
+    name: str or None
+    time_stamp: float or None
+        First time stamp; default 0.0.
+    time_unit: str or None
+        Default 's'.
+    species: list(Species) or None
+        Species columns (initial value 0.0).
+    quantities: list(Quantity) or None
+        Quantity columns (initial value `quantity.value`).
+    capacity: int
+        Initial number of rows allocated.
+
+    Examples
+    --------
+    >>> phase = PhaseHistory(time_stamp=0.0, quantities=[temp])
+    >>> phase.reserve(57601)
+    >>> phase.add_row(1.5, phase.get_row(0.0))
+    >>> phase.set_value('temp', 300.0, 1.5)
+    """
+
+    def __init__(self, name=None, time_stamp=None, time_unit=None, species=None,
+                 quantities=None, capacity=64):
+
+        self.name = name if name else self.__class__.__name__
+
+        if time_stamp is None:
+            time_stamp = 0.0
+
+        assert isinstance(time_stamp, numbers.Real), 'time_stamp = %r'%time_stamp
+
+        self.__time_unit = 's' if time_unit is None else time_unit
+
+        if species is not None:
+            assert all(isinstance(spc, Species) for spc in species)
+        if quantities is not None:
+            assert all(isinstance(quant, Quantity) for quant in quantities)
+
+        self.__species = deepcopy(species)
+        self.__quantities = deepcopy(quantities)
+
+        names = list()
+        values = list()
+
+        for spc in self.__species or ():
+            names.append(spc.name)
+            values.append(0.0)
+
+        for quant in self.__quantities or ():
+            names.append(quant.name)
+            values.append(quant.value)
+
+        assert len(set(names)) == len(names), 'duplicate names in %r'%names
+
+        self.__names = names
+        self.__column = {name: i for (i, name) in enumerate(names)}
+
+        capacity = max(int(capacity), 1)
+
+        self.__n_rows = 0
+        self.__times = np.empty(capacity, dtype=np.float64)
+        self.__buffers = [np.empty(capacity, dtype=_dtype(value)) for value in values]
+
+        # Rows [0, n_retired) are out of the live window, the others are live
+        self.__live_rows = 4
+        self.__n_retired = 0
+        self.__n_steps = 0         # rows ever added
+        self.__time_0 = float(time_stamp)
+
+        # Streaming: (store path, chunk rows); rows [0, n_spilled) are stored
+        self.__stream = None
+        self.__n_spilled = 0
+
+        self.add_row(float(time_stamp), values)
+
+    def hold_rows(self, n_rows):
+        """Keep at least the last `n_rows` rows live, e.g. to `truncate()` a
+           window of time steps.
+        """
+
+        self.__live_rows = max(self.__live_rows, int(n_rows))
+
+    def truncate(self, try_time_stamp):
+        """Drop the rows after `try_time_stamp`; these must be live rows.
+        """
+
+        row = self.__index(try_time_stamp)
+
+        if row is None:
+            n_keep = bisect.bisect_right(self.__times, try_time_stamp, 0, self.__n_rows)
+        else:
+            n_keep = row + 1
+
+        assert n_keep >= self.__n_retired, 'rows after %r past the live rows; '\
+               'see hold_rows()'%try_time_stamp
+
+        n_drop = self.__n_rows - n_keep
+
+        self.__n_rows -= n_drop
+        self.__n_steps -= n_drop
+        self.__n_spilled = min(self.__n_spilled, self.__n_rows)
+
+    def stream_to(self, path, chunk_rows=4096):
+        """Write the rows out of the live window to the store `path` in chunks of
+           `chunk_rows` and drop them from memory; an existing store at `path`
+           is replaced.
+
+        Notes
+        -----
+        `get_row()`, `get_value()`, `set_value()` and `time_stamps` cover the
+        rows in memory, the last ones; `get_quantity_history()` and
+        `to_dataframe()` the whole history. Call `flush()` at the end of the run.
+        """
+
+        assert isinstance(chunk_rows, numbers.Integral) and chunk_rows >= 1
+
+        path = os.path.abspath(path)
+
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            shutil.rmtree(path)
+
+        self.__stream = (path, int(chunk_rows))
+        self.__n_spilled = 0
+
+    def flush(self):
+        """Write the rows in memory not yet stored, keeping them in memory, and
+           wait for the store.
+        """
+
+        if self.__stream is None:
+            return
+
+        self.__spill(self.__n_rows)
+
+        flush_writer()
+
+    def reserve(self, n_rows):
+        """Allocate room for `n_rows` more rows; a chunk when streamed.
+        """
+
+        if self.__stream is not None:
+            n_rows = min(n_rows, self.__stream[1])
+
+        n_rows += self.__n_rows + self.__live_rows + 1
+
+        if n_rows > self.__times.size:
+            self.__resize(int(n_rows))
+
+    def add_row(self, try_time_stamp, row_values):
+        """Add the row `row_values` (a value per column, in column order) at
+           `try_time_stamp`.
+        """
+
+        assert isinstance(row_values, list)
+        assert len(row_values) == len(self.__names)
+
+        n_rows = self.__n_rows
+
+        if n_rows:
+            assert try_time_stamp > self.__times[n_rows-1] and \
+                   self.__index(try_time_stamp) is None, \
+                   'already used or past time_stamp: %r'%try_time_stamp
+
+        if n_rows == self.__times.size:
+            self.__resize(2*n_rows)
+
+        self.__times[n_rows] = try_time_stamp
+        self.__n_rows += 1
+        self.__n_steps += 1
+
+        for (i, value) in enumerate(row_values):
+            self.__store(i, n_rows, value)
+
+        if self.__n_rows - self.__n_retired > self.__live_rows:
+            self.__n_retired += 1
+
+        if self.__stream is not None and self.__n_retired >= self.__stream[1]:
+            # Rows out to the store, live rows to the front
+            n_retired = self.__n_retired
+            self.__spill(n_retired)
+            self.__move(n_retired, self.__n_rows, 0)
+            self.__n_rows -= n_retired
+            self.__n_spilled = max(self.__n_spilled - n_retired, 0)
+            self.__n_retired = 0
+
+    def get_row(self, try_time_stamp=None):
+        """Values of all columns at `try_time_stamp` (default the last one).
+
+        Returns
+        -------
+        row_values: list
+        """
+
+        row = self.__row(try_time_stamp)
+
+        return [buffer[row] for buffer in self.__buffers]
+
+    def get_value(self, actor, try_time_stamp=None):
+        """Value of column `actor` at `try_time_stamp` (default the last one).
+        """
+
+        assert actor in self.__column, 'actor %r not in %r'%(actor, self.__names)
+
+        return self.__buffers[self.__column[actor]][self.__row(try_time_stamp)]
+
+    def set_value(self, actor, value, try_time_stamp=None):
+        """Set the value of column `actor` at `try_time_stamp` (default the last
+           one).
+        """
+
+        assert actor in self.__column, 'actor = %r not in data frame'%actor
+
+        self.__store(self.__column[actor], self.__row(try_time_stamp), value)
+
+    def get_column(self, actor):
+        """History of column `actor`.
+
+        Returns
+        -------
+        values: list
+        """
+
+        assert actor in self.__column, 'actor %r not in %r'%(actor, self.__names)
+
+        return list(self.__series(actor))
+
+    def has_time_stamp(self, try_time_stamp):
+
+        return self.__index(try_time_stamp) is not None
+
+    def get_quantity_history(self, name):
+        """Quantity `name` with its history (pandas `Series` indexed by time) as
+           value, as `PhaseNew.get_quantity_history()`.
+
+        Returns
+        -------
+        (quantity, time_unit): tuple
+        """
+
+        assert name in self.__column, 'name %r not in %r'%(name, self.__names)
+
+        if self.__quantities is None:
+            return (None, self.__time_unit)
+
+        for quant in self.__quantities:
+            if quant.name == name:
+                quant_history = deepcopy(quant)
+                quant_history.value = self.__series(name)
+                return (quant_history, self.__time_unit)
+
+        return None
+
+    def to_dataframe(self):
+        """History as a pandas data frame indexed by time.
+        """
+
+        return pandas.DataFrame({name: self.__series(name) for name in self.__names})
+
+    def to_phase(self):
+        """History as a `PhaseNew`.
+        """
+
+        phase = PhaseNew(name=self.name, time_stamp=float(self.__times[0]),
+                         time_unit=self.__time_unit, species=self.__species,
+                         quantities=self.__quantities)
+
+        # The data frame is built at once, not row by row
+        phase._PhaseNew__df = self.to_dataframe().astype(object)
+
+        return phase
+
+    def plot(self, *args, **kwargs):
+        """`PhaseNew.plot()` of the exported history.
+        """
+
+        return self.to_phase().plot(*args, **kwargs)
+
+    def __get_df(self):
+
+        return self.to_dataframe()
+    df = property(__get_df, None, None, None)
+
+    def __get_time_stamps(self):
+
+        return list(self.__times[:self.__n_rows])
+    time_stamps = property(__get_time_stamps, None, None, None)
+
+    def __get_time_unit(self):
+
+        return self.__time_unit
+    time_unit = property(__get_time_unit, None, None, None)
+
+    def __len__(self):
+
+        return self.__n_rows
+
+    def __getstate__(self):
+        """Pickle (Cortix results, checkpoints) without the unused capacity.
+        """
+
+        state = self.__dict__.copy()
+
+        n_rows = self.__n_rows
+        state['_PhaseHistory__times'] = self.__times[:n_rows].copy()
+        state['_PhaseHistory__buffers'] = [buffer[:n_rows].copy()
+                                           for buffer in self.__buffers]
+
+        return state
+
+    def __str__(self):
+
+        return 'PhaseHistory: name=%s; %i time stamps (%i added), %i allocated; '\
+               'stream %r; columns %r'%(self.name, self.__n_rows, self.__n_steps,
+                                        self.__times.size, self.__stream, self.__names)
+
+    def __row(self, try_time_stamp):
+
+        if try_time_stamp is None:
+            return self.__n_rows - 1
+
+        assert isinstance(try_time_stamp, numbers.Real), 'time_stamp = %r'%try_time_stamp
+
+        row = self.__index(try_time_stamp)
+        assert row is not None, 'missing try_time_stamp: %r'%try_time_stamp
+
+        return row
+
+    def __index(self, try_time_stamp):
+        """Row of the nearest time stamp within the `PhaseNew` tolerance, or
+           None.
+        """
+
+        n_rows = self.__n_rows
+        times = self.__times
+
+        # 1e-3 * the mean delta t of all rows added, recorded or not
+        tol = 1.0e-3
+        if self.__n_steps >= 2:
+            tol *= (times[n_rows-1] - self.__time_0)/(self.__n_steps - 1)
+
+        # Most queries are on the last rows
+        last = n_rows - 1
+        if abs(times[last] - try_time_stamp) <= tol:
+            return last
+
+        row = bisect.bisect_left(times, try_time_stamp, 0, n_rows)
+
+        nearest = [r for r in (row-1, row) if 0 <= r < n_rows]
+        if not nearest:
+            return None
+
+        row = min(nearest, key=lambda r: abs(times[r] - try_time_stamp))
+
+        return row if abs(times[row] - try_time_stamp) <= tol else None
+
+    def __spill(self, end):
+        """Queue the rows [n_spilled, end) to the store.
+        """
+
+        start = self.__n_spilled
+
+        if end <= start:
+            return
+
+        columns = [buffer[start:end].copy() for buffer in self.__buffers]
+
+        meta = dict(name=self.name, time_unit=self.__time_unit, names=self.__names)
+
+        writer().append(self.__stream[0], meta, self.__times[start:end].copy(), columns)
+
+        self.__n_spilled = end
+
+    def __store(self, column, row, value):
+
+        buffer = self.__buffers[column]
+
+        if buffer.dtype == object:
+            buffer[row] = deepcopy(value)
+            return
+
+        if _dtype(value) == object:
+            # Non-scalar value in a scalar column
+            buffer = buffer.astype(object)
+            self.__buffers[column] = buffer
+            buffer[row] = deepcopy(value)
+        else:
+            buffer[row] = value
+
+    def __move(self, start, end, destination):
+        """Move rows [start, end) to `destination`.
+        """
+
+        if end <= start:
+            return
+
+        size = end - start
+
+        for array in [self.__times] + self.__buffers:
+            array[destination:destination+size] = array[start:end]
+
+    def __resize(self, capacity):
+
+        n_rows = self.__n_rows
+
+        def resized(array):
+            new_array = np.empty(capacity, dtype=array.dtype)
+            new_array[:n_rows] = array[:n_rows]
+            return new_array
+
+        self.__times = resized(self.__times)
+        self.__buffers = [resized(buffer) for buffer in self.__buffers]
+
+    def __series(self, name):
+        """History of column `name`: the stored rows, if any, and the rows in
+           memory.
+        """
+
+        values = self.__buffers[self.__column[name]][:self.__n_rows].copy()
+
+        start = 0
+        stored = None
+
+        if self.__stream is not None:
+            flush_writer()
+            if os.path.exists(os.path.join(self.__stream[0], 'meta.json')):
+                stored = HistoryReader(self.__stream[0]).series(name)
+                start = self.__n_spilled
+
+        series = pandas.Series(values[start:], name=name,
+                               index=pandas.Index(self.__times[start:self.__n_rows].copy(),
+                                                  dtype=np.float64))
+
+        if stored is not None:
+            series = pandas.concat([stored, series]) if len(series) else stored
+
+        return series
+
+def reserve_histories(module, n_rows=None):
+    """Preallocate the `PhaseHistory` attributes of `module` for its run: by
+       default the number of time steps from `module.initial_time` to
+       `module.end_time`, plus the initial and final rows.
+    """
+
+    if n_rows is None:
+        n_rows = int((module.end_time - module.initial_time)/module.time_step) + 2
+
+    for value in vars(module).values():
+        if isinstance(value, PhaseHistory):
+            value.reserve(n_rows)
+
+def stream_histories(module, directory, chunk_rows=4096):
+    """Stream the `PhaseHistory` attributes of `module` to the stores
+       `directory/<module name>/<attribute>`; see `PhaseHistory.stream_to()`.
+    """
+
+    for (name, phase) in vars(module).items():
+        if isinstance(phase, PhaseHistory):
+            phase.stream_to(os.path.join(directory, module.name, name), chunk_rows)
+
+def flush_histories(module):
+    """Flush the `PhaseHistory` attributes of `module` to their stores, if
+       streamed.
+    """
+
+    for phase in vars(module).values():
+        if isinstance(phase, PhaseHistory):
+            phase.flush()
+
+def hold_histories(module, n_rows):
+    """`PhaseHistory.hold_rows()` of the `PhaseHistory` attributes of `module`.
+    """
+
+    for phase in vars(module).values():
+        if isinstance(phase, PhaseHistory):
+            phase.hold_rows(n_rows)
+
+def truncate_histories(module, time):
+    """`PhaseHistory.truncate()` of the `PhaseHistory` attributes of `module`.
+    """
+
+    for phase in vars(module).values():
+        if isinstance(phase, PhaseHistory):
+            phase.truncate(time)
+
+def _dtype(value):
+    """Column type of `value`: float64 for real scalars, object otherwise.
+    """
+
+    if isinstance(value, numbers.Real) and not isinstance(value, bool):
+        return np.float64
+
+    return object
@@ -115,7 +115,10 @@ from scipy.integrate import odeint
 import numpy as np
 
 from cortix import Module
-from cortix.support.phase_new import PhaseNew as Phase
+from history import PhaseHistory as Phase
+from history import reserve_histories
+from history import flush_histories
+from port_window import PortWindow
 from cortix import Quantity
 from cortix import Species
 from cortix import Units as unit
@@ -149,6 +152,11 @@ class Leaching(Module):
         self.time_step = 10.0*unit.minute
         self.show_time = (True, unit.hour)
         self.save = True
+
+        # Windowed port exchange: (on/off, time steps per message, sweeps per
+        # window); the same in all modules of the network, see `port_window`
+        self.port_window = (False, 60, 1)
+        self.port_exchange = None
         self.name = 'Leaching'
 
         self.log = logging.getLogger('cortix')
@@ -497,6 +505,12 @@ class Leaching(Module):
         if self.initial_time + self.time_step > self.end_time:
             self.end_time = self.initial_time + self.time_step
 
+        reserve_histories(self)
+
+        if self.port_window[0]:
+            self.port_exchange = PortWindow(self, self.__window_ports(), self.__step,
+                                            *self.port_window[1:])
+
         time = self.initial_time
 
         print_time = self.initial_time
@@ -519,6 +533,12 @@ class Leaching(Module):
             else:
                 self.__logit = False
 
+            if self.port_window[0]:
+                # Evolve a window of time steps and communicate its information
+                #---------------------------------------------------------------
+                time = self.port_exchange.advance(time)
+                continue
+
             # Evolve one time step
             #---------------------
 
@@ -530,6 +550,11 @@ class Leaching(Module):
 
         self.end_time = time # correct the final time if needed
 
+        flush_histories(self) # on-disk stores, if streamed
+
+        if self.port_window[0] and self.show_time[0]:
+            self.log.info(self.name+'::run(): '+str(self.port_exchange))
+
     def __call_ports(self, time):
 
         # Interactions in the pre-leach-product port
@@ -594,6 +619,26 @@ class Leaching(Module):
             self.acidleach_feed_mass_flowrate = feed['mass-flowrate']
             self.acidleach_feed_mass_density = feed['mass-density']
 
+    def __window_ports(self):
+        """Ports of `__call_ports()`, in the same order, for the windowed
+           exchange; see `port_window.PortWindow`.
+        """
+
+        product = {'mass-flowrate': 'mass-flowrate', 'mass-density': 'mass-density',
+                   'solids-massfrac': 0.0}
+
+        ports = list()
+        ports.append(('to', 'pre-leach-product', self.preleach_phase, dict(product)))
+        ports.append(('from', 'pre-leach-feed',
+                      {'mass-flowrate': 'preleach_feed_mass_flowrate',
+                       'mass-density': 'preleach_feed_mass_density'}))
+        ports.append(('to', 'acid-leach-product', self.acidleach_phase, dict(product)))
+        ports.append(('from', 'acid-leach-feed',
+                      {'mass-flowrate': 'acidleach_feed_mass_flowrate',
+                       'mass-density': 'acidleach_feed_mass_density'}))
+
+        return ports
+
     def __step(self, time=0.0):
         """Stepping Leaching in time
         """
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Windowed port exchange (waveform relaxation) for the u-mill modules.
+
+   In the lockstep exchange of the modules' `__call_ports()`, one value per port
+   is traded every time step. With a window of K steps, each module advances K
+   steps on the inflow data it holds, then trades the histories over the window
+   (NumPy arrays at the K time stamps) with one message per port, in the same
+   port order as the lockstep exchange; this cuts the number of messages by K.
+
+   With more than one sweep the window is rolled back (see
+   `history.truncate_histories()`) and repeated on the inflow histories
+   received: step k of the window uses the inflow at the end of step k-1, as in
+   the lockstep exchange, so enough sweeps (the depth of a feed-forward chain at
+   most) reproduce its results. The number of sweeps is fixed and the same in
+   all modules, which keeps the exchange in step; `residual` is the largest
+   relative change of the inflow histories in the last sweep.
+
+   All modules of a network must use the same window (see `port_window` of the
+   modules).
+"""
+
+import numpy as np
+
+from history import hold_histories
+from history import truncate_histories
+
+class PortWindow:
+    """Windowed port exchange of a module.
+
+    Parameters
+    ----------
+    module: Module
+    ports: list
+        Ports in the order of the module's lockstep exchange:
+        ('from', port name, {message key: module attribute}) or
+        ('to', port name, phase, {message key: phase column or constant});
+        ('to', port name, phase, None) sends the phase itself.
+    step: callable
+        `step(time)` advances the module one time step and returns the new time.
+    n_steps: int
+        Time steps per window (K).
+    n_sweeps: int
+        Passes over each window.
+    """
+
+    def __init__(self, module, ports, step, n_steps, n_sweeps=1):
+
+        assert n_steps >= 1 and n_sweeps >= 1
+
+        self.module = module
+        self.ports = ports
+        self.step = step
+        self.n_steps = int(n_steps)
+        self.n_sweeps = int(n_sweeps)
+
+        self.n_windows = 0
+        self.n_exchanges = 0
+        self.residual = 0.0
+
+        if self.n_sweeps > 1:
+            hold_histories(module, self.n_steps + 2) # rows kept for the rollback
+
+    def advance(self, time):
+        """Advance the module over the window starting at `time`, exchanging the
+           port data; return the time at the end of the window.
+        """
+
+        module = self.module
+
+        start_time = time
+        start_inflows = self.__get_inflows()
+
+        inflows = None # inflow histories of the last sweep
+
+        for sweep in range(self.n_sweeps):
+
+            if sweep:
+                truncate_histories(module, start_time)
+
+            self.__set_inflows(start_inflows)
+
+            time = start_time
+            times = list()
+
+            while len(times) < self.n_steps and time <= module.end_time:
+
+                if inflows is not None and times:
+                    self.__set_inflows(inflows, len(times)-1)
+
+                time = self.step(time)
+                times.append(time)
+
+            new_inflows = self.__exchange(np.array(times))
+
+            if inflows is not None:
+                self.residual = _max_change(inflows, new_inflows)
+
+            inflows = new_inflows
+
+        # Hold the last inflows into the next window
+        self.__set_inflows(inflows, -1)
+
+        self.n_windows += 1
+
+        return time
+
+    def __exchange(self, times):
+        """Trade the histories at `times` over the connected ports.
+
+        Returns
+        -------
+        inflows: dict
+            {port: {attribute: array}}
+        """
+
+        module = self.module
+
+        inflows = dict()
+
+        for port in self.ports:
+
+            if not module.get_port(port[1]).connected_port:
+                continue
+
+            self.n_exchanges += 1
+
+            if port[0] == 'from':
+
+                (_, name, attributes) = port
+
+                module.send(times, name)
+
+                (check_times, data) = module.recv(name)
+                assert np.allclose(check_times, times, rtol=0.0, atol=1e-6)
+
+                inflows[name] = {attribute: np.asarray(data[key])
+                                 for (key, attribute) in attributes.items()}
+
+            else:
+
+                (_, name, phase, columns) = port
+
+                msg_times = module.recv(name)
+
+                if columns is None:
+                    data = phase
+                else:
+                    data = dict()
+                    for (key, column) in columns.items():
+                        if isinstance(column, str):
+                            data[key] = np.array([phase.get_value(column, msg_time)
+                                                  for msg_time in msg_times])
+                        else:
+                            data[key] = np.full(len(msg_times), column)
+
+                module.send((msg_times, data), name)
+
+        return inflows
+
+    def __get_inflows(self):
+
+        return {port[1]: {attribute: np.array([getattr(self.module, attribute)])
+                          for attribute in port[2].values()}
+                for port in self.ports if port[0] == 'from'}
+
+    def __set_inflows(self, inflows, k=0):
+
+        for attributes in inflows.values():
+            for (attribute, values) in attributes.items():
+                setattr(self.module, attribute, float(values[k]))
+
+    def __getstate__(self):
+        """The module's private step method does not pickle by name; windows
+           are not advanced after the run.
+        """
+
+        state = self.__dict__.copy()
+        state['step'] = None
+
+        return state
+
+    def __str__(self):
+
+        return 'PortWindow: %i steps x %i sweeps; %i windows, %i port exchanges; '\
+               'residual %.3e'%(self.n_steps, self.n_sweeps, self.n_windows,
+                                self.n_exchanges, self.residual)
+
+def _max_change(inflows, new_inflows):
+    """Largest relative change between two sets of inflow histories.
+    """
+
+    change = 0.0
+
+    for (port, attributes) in new_inflows.items():
+        for (attribute, values) in attributes.items():
+            old_values = inflows[port][attribute]
+            scale = max(np.max(np.abs(values)), 1e-30)
+            change = max(change, np.max(np.abs(values - old_values))/scale)
+
+    return change
@@ -56,7 +56,10 @@ from scipy.integrate import odeint
 import numpy as np
 
 from cortix import Module
-from cortix.support.phase_new import PhaseNew as Phase
+from history import PhaseHistory as Phase
+from history import reserve_histories
+from history import flush_histories
+from port_window import PortWindow
 from cortix import Quantity
 from cortix import Species
 
@@ -94,6 +97,11 @@ class Precipitation(Module):
         self.show_time = (False, 10.0*unit.second)
         self.save = True
 
+        # Windowed port exchange: (on/off, time steps per message, sweeps per
+        # window); the same in all modules of the network, see `port_window`
+        self.port_window = (False, 60, 1)
+        self.port_exchange = None
+
         self.log = logging.getLogger('cortix')
         self.__logit = True # flag indicating when to log
 
@@ -237,6 +245,12 @@ class Precipitation(Module):
 
         self.end_time = max(self.end_time, self.initial_time + self.time_step)
 
+        reserve_histories(self)
+
+        if self.port_window[0]:
+            self.port_exchange = PortWindow(self, self.__window_ports(), self.__step,
+                                            *self.port_window[1:])
+
         time = self.initial_time
 
         print_time = self.initial_time
@@ -258,6 +272,12 @@ class Precipitation(Module):
             else:
                 self.__logit = False
 
+            if self.port_window[0]:
+                # Evolve a window of time steps and communicate its information
+                #---------------------------------------------------------------
+                time = self.port_exchange.advance(time)
+                continue
+
             # Evolve one time step
             #---------------------
 
@@ -269,6 +289,11 @@ class Precipitation(Module):
 
         self.end_time = time # correct the final time if needed
 
+        flush_histories(self) # on-disk stores, if streamed
+
+        if self.port_window[0] and self.show_time[0]:
+            self.log.info(self.name+'::run(): '+str(self.port_exchange))
+
     def __call_ports(self, time):
 
         # Interactions in the uts-feed port
@@ -310,6 +335,17 @@ class Precipitation(Module):
 
             self.send((msg_time, product), 'adu-product')
 
+    def __window_ports(self):
+        """Ports of `__call_ports()`, in the same order, for the windowed
+           exchange; see `port_window.PortWindow`.
+        """
+
+        ports = list()
+        ports.append(('from', 'uts-feed', dict()))
+        ports.append(('to', 'adu-product', None, dict()))
+
+        return ports
+
     def __step(self, time=0.0):
         """Stepping Decantation-Filtration in time
         """
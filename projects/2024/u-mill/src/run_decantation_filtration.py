@@ -12,6 +12,7 @@ from cortix import Units as unit
 
 from leaching import Leaching
 from decantation_filtration import DecantationFiltration
+from shared_port import share_ports
 
 def main():
 
@@ -24,6 +25,11 @@ def main():
     end_time = 14.0*unit.day
     time_step = 10.0*unit.minute
     show_time = (True, unit.hour)
+    port_window = (False, 10, 3) # (on/off, time steps per message, sweeps)
+
+    # Port messages as records in shared memory instead of pickled through
+    # pipes (see `shared_port.SharedPort`): (on/off, message keys)
+    shared_ports = (False, ('mass-flowrate', 'mass-density', 'solids-massfrac'))
 
     plant = Cortix(use_mpi=False, splash=True) # System top level
 
@@ -37,6 +43,7 @@ def main():
     decant_filt.time_step = time_step
     decant_filt.end_time = end_time
     decant_filt.show_time = show_time
+    decant_filt.port_window = port_window
 
     plant_net.module(decant_filt)  # Add filtration module to network
 
@@ -50,6 +57,7 @@ def main():
         leaching.time_step = time_step
         leaching.end_time = end_time
         leaching.show_time = show_time
+        leaching.port_window = port_window
 
         plant_net.module(leaching)
 
@@ -65,6 +73,8 @@ def main():
 
     # Run
     if make_run:
+        if shared_ports[0] and plant.use_multiprocessing:
+            share_ports(plant_net, shared_ports[1])
         plant.run()  # Run network dynamics simulation
 
     plant.close()  # Properly shutdown Cortix
@@ -16,6 +16,7 @@ from decantation_filtration import DecantationFiltration
 from solvex import Solvex
 from precipitation import Precipitation
 from evaporation_calcination import EvaporationCalcination
+from history import stream_histories
 
 def main():
 
@@ -28,6 +29,10 @@ def main():
     time_step = 1*unit.second
     show_time = (True, 1*unit.minute)
 
+    # Stream the phase histories to on-disk stores during the run (see
+    # `history.PhaseHistory.stream_to()`): (on/off, directory)
+    history_stores = (False, 'histories')
+
     whte_mesa = Cortix(use_mpi=False, splash=True) # System top level
 
     white_mesa_network = whte_mesa.network = Network() # Network
@@ -125,6 +130,9 @@ def main():
             module.end_time = end_time
             module.show_time = show_time
 
+            if history_stores[0]:
+                stream_histories(module, history_stores[1])
+
         whte_mesa.run()  # Run network dynamics simulation
 
     # Cortix run closure
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment
+# https://cortix.org
+"""Check of the windowed port exchange: leaching and decantation-filtration with a
+   window of K time steps and enough sweeps reproduce the lockstep exchange"""
+
+import time
+
+import numpy as np
+
+from cortix import Cortix
+from cortix import Network
+from cortix import Units as unit
+
+from leaching import Leaching
+from decantation_filtration import DecantationFiltration
+
+def main():
+
+    # Preamble
+    end_time = 2.0*unit.day
+    time_step = 10.0*unit.minute
+    port_window = (True, 10, 3) # (on/off, time steps per message, sweeps)
+
+    # Runs
+    (lockstep, lockstep_time, _) = run((False,) + port_window[1:], end_time, time_step)
+    (windowed, windowed_time, exchanges) = run(port_window, end_time, time_step)
+
+    print('Lockstep wall clock time [s]: %.2f'%lockstep_time)
+    print('Window (%i steps x %i sweeps) wall clock time [s]: %.2f'%
+          (port_window[1], port_window[2], windowed_time))
+    for exchange in exchanges:
+        print('  ' + exchange)
+
+    # Agreement
+    print('\n%-48s %8s %8s'%('phase', 'rows', 'columns'))
+
+    for (name, df) in lockstep.items():
+
+        df_windowed = windowed[name]
+
+        print('%-48s %8i %8i'%(name, len(df), len(df.columns)))
+
+        assert len(df) > 1, '%s: no time steps run'%name
+
+        assert np.array_equal(df.index, df_windowed.index), '%s: time stamps'%name
+
+        for column in df.columns:
+            assert all(np.array_equal(value, value_windowed) for (value, value_windowed)
+                       in zip(df[column], df_windowed[column])), '%s: %s'%(name, column)
+
+    print('\nThe windowed exchange reproduces the lockstep exchange.')
+
+def run(port_window, end_time, time_step):
+    """Run leaching and decantation-filtration coupled with `port_window`.
+
+    Returns
+    -------
+    (histories, wall_time, exchanges): tuple
+        Phase histories {'module phase': data frame}, wall clock time, and the
+        port exchange summary of each module.
+    """
+
+    plant = Cortix(use_mpi=False, splash=False) # System top level
+
+    plant_net = plant.network = Network() # Network
+
+    decant_filt = DecantationFiltration()
+    decant_filt.name = 'Decantation-Filtration'
+
+    leaching = Leaching()
+    leaching.name = 'Leaching'
+
+    for module in (decant_filt, leaching):
+        module.time_step = time_step
+        module.end_time = end_time
+        module.show_time = (False, unit.hour)
+        module.port_window = port_window
+        plant_net.module(module)
+
+    plant_net.connect([leaching, 'pre-leach-product'], [decant_filt, 'std-feed'])
+    plant_net.connect([decant_filt, 'ccd-overflow'], [leaching, 'pre-leach-feed'])
+    plant_net.connect([leaching, 'acid-leach-product'], [decant_filt, 'ccd-feed'])
+    plant_net.connect([decant_filt, 'std-underflow'], [leaching, 'acid-leach-feed'])
+
+    start = time.time()
+    plant.run()
+    wall_time = time.time() - start
+
+    histories = dict()
+    exchanges = list()
+
+    for module in plant_net.modules:
+        for (name, phase) in vars(module).items():
+            if name.endswith('_phase'):
+                histories[module.name + ' ' + name] = phase.to_dataframe()
+        if port_window[0]:
+            exchanges.append('%s: %s'%(module.name, module.port_exchange))
+
+    plant.close()
+
+    return (histories, wall_time, exchanges)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is part of the Cortix toolkit environment.
+# https://cortix.org
+"""Shared-memory transport of port messages in multiprocessing runs.
+
+   A Cortix `Port` pickles every message into a `multiprocessing.Pipe`; for the
+   small per-step messages of the modules' `__call_ports()` (a time stamp, or a
+   time stamp and a dict of a few flow rates and densities) the pickling and
+   the pipe dominate the exchange. `SharedPort` writes these messages as one fixed-schema NumPy
+   record into a ring buffer in shared memory, one ring per direction of a
+   connection, and signals the other process with semaphores.
+
+   The schema is given by the message keys (`fields`), all numbers; keys may be
+   absent from a message and numbers arrive as `float`. Messages that do not fit
+   the schema (other keys or values, phases, the arrays of `port_window`) are
+   sent through the pipe of the port, in order with the records.
+
+   The record (see `_dtype()`) is all float64, so a slot is written and read
+   as a flat `memoryview` at the field offsets of the dtype: field access of
+   NumPy structured scalars costs more than pickling these small messages.
+
+   Use `share_ports()` on a network after its connections are made and before
+   it is run.
+"""
+
+import os
+import weakref
+
+import multiprocessing as multiproc
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from cortix import Port
+
+# Message kinds of a record
+_TIME = 0      # time stamp
+_DICT = 1      # (time stamp, dict of schema fields)
+_PIPE = 2      # message sent through the pipe
+
+# Words of a record (see `_dtype()`)
+_KIND_WORD = 0
+_TIME_WORD = 1
+
+class SharedPort(Port):
+    """Port with messages in shared-memory ring buffers.
+
+    Parameters
+    ----------
+    port: Port
+        Connected multiprocessing port to replace; keeps its name, id and pipe.
+    fields: tuple(str)
+        Message keys.
+    """
+
+    def __init__(self, port, fields):
+
+        assert not port.use_mpi, 'shared ports are for multiprocessing runs'
+
+        super().__init__(port.name, use_mpi=False)
+
+        self.id = port.id
+        self.pipe = port.pipe
+        self.fields = tuple(fields)
+
+        self.dtype = _dtype(self.fields)
+
+        # (key, word offset in the record)
+        self.__layout = [(name, self.dtype.fields[name][1]//8) for name in self.fields]
+
+        self.__names = frozenset(self.fields)
+
+        self.__out_ring = None
+        self.__in_ring = None
+
+    def share(self, port, n_slots=4):
+        """Connect to the shared port `port` at the other end of the pipe.
+        """
+
+        assert isinstance(port, SharedPort)
+        assert port.fields == self.fields, 'fields %r, %r'%(self.fields, port.fields)
+
+        self.connected_port = port
+        port.connected_port = self
+
+        self.__out_ring = _Ring(self.dtype, n_slots)
+        port.__out_ring = _Ring(self.dtype, n_slots)
+
+        self.__in_ring = port.__out_ring
+        port.__in_ring = self.__out_ring
+
+    def send(self, data, tag=None):
+        """Send data to the connected port; see `Port.send()`.
+        """
+
+        if not self.connected_port:
+            return
+
+        ring = self.__out_ring
+        base = ring.put()
+
+        on_pipe = not self.__encode(data, ring.words, base)
+
+        if on_pipe:
+            ring.words[base+_KIND_WORD] = _PIPE
+
+        ring.post()
+
+        if on_pipe: # after the record: the pipe may block until it is read
+            self.pipe.send(data)
+
+    def recv(self):
+        """Receive data from the connected port; see `Port.recv()`.
+        """
+
+        if not self.connected_port:
+            return None
+
+        ring = self.__in_ring
+        base = ring.get()
+
+        if ring.words[base+_KIND_WORD] == _PIPE:
+            data = self.pipe.recv()
+        else:
+            data = self.__decode(ring.words, base)
+
+        ring.release()
+
+        return data
+
+    def __encode(self, data, words, base):
+        """Write `data` into the record at `base`; False if it does not fit.
+        """
+
+        if _is_number(data):
+            words[base+_KIND_WORD] = _TIME
+            words[base+_TIME_WORD] = data
+            return True
+
+        if not (type(data) is tuple and len(data) == 2 and _is_number(data[0])):
+            return False
+
+        (time, payload) = data
+
+        if type(payload) is not dict or not self.__names.issuperset(payload):
+            return False
+
+        for (name, offset) in self.__layout:
+
+            offset += base
+
+            if name not in payload:
+                words[offset] = 0 # absent
+                continue
+
+            value = payload[name]
+
+            if not _is_number(value):
+                return False
+
+            words[offset] = 1
+            words[offset+1] = value
+
+        words[base+_KIND_WORD] = _DICT
+        words[base+_TIME_WORD] = time
+
+        return True
+
+    def __decode(self, words, base):
+
+        kind = words[base+_KIND_WORD]
+        time = words[base+_TIME_WORD]
+
+        if kind == _TIME:
+            return time
+
+        payload = dict()
+
+        for (name, offset) in self.__layout:
+
+            offset += base
+
+            if words[offset]:
+                payload[name] = words[offset+1]
+
+        return (time, payload)
+
+class _Ring:
+    """Single-producer, single-consumer ring of records in shared memory.
+
+    The writer and the reader each hold a copy (pickled into their process)
+    and advance their own slot index; `free` counts the slots the writer may
+    fill and `full` the slots the reader may read. `words` is the segment as
+    float64 words; slots are `n_words` apart.
+    """
+
+    def __init__(self, dtype, n_slots):
+
+        context = multiproc.get_context('spawn') # Cortix starts modules with spawn
+
+        self.n_words = dtype.itemsize//8
+        self.n_slots = n_slots
+
+        self.memory = shared_memory.SharedMemory(create=True,
+                                                 size=dtype.itemsize*n_slots)
+        self.free = context.Semaphore(n_slots)
+        self.full = context.Semaphore(0)
+
+        self.slot = 0
+        self.pid = os.getpid() # the creating process owns the segment
+
+        self.__map()
+
+    def put(self):
+        """First word of the next free slot; `post()` when written.
+        """
+
+        self.free.acquire()
+
+        return self.slot*self.n_words
+
+    def post(self):
+
+        self.slot = (self.slot + 1)%self.n_slots
+        self.full.release()
+
+    def get(self):
+        """First word of the next full slot; `release()` when read.
+        """
+
+        self.full.acquire()
+
+        return self.slot*self.n_words
+
+    def release(self):
+
+        self.slot = (self.slot + 1)%self.n_slots
+        self.free.release()
+
+    def __map(self):
+
+        self.words = self.memory.buf.cast('d')
+
+        # `words` is released before the segment is closed (and unlinked)
+        self.__views = [self.words]
+        weakref.finalize(self, _unlink, self.memory, self.__views, self.pid)
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        del state['words'] # view of the segment; rebuilt on unpickling
+        del state['_Ring__views']
+
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self.__map()
+
+def share_ports(network, fields, n_slots=4):
+    """Replace the connected ports of the modules of `network` by shared ports.
+
+    Parameters
+    ----------
+    network: Network
+        Multiprocessing network with its connections made, not yet run.
+    fields: tuple(str)
+        Message keys of all ports.
+    n_slots: int
+        Records per ring buffer.
+
+    Returns
+    -------
+    n_connections: int
+    """
+
+    assert n_slots >= 1
+
+    places = dict() # id of a connected port -> (module, index in module.ports)
+
+    for module in network.modules:
+        for (i, port) in enumerate(module.ports):
+            if port.connected_port and not isinstance(port, SharedPort):
+                places[id(port)] = (module, i)
+
+    n_connections = 0
+
+    for (module, i) in list(places.values()):
+
+        port = module.ports[i]
+
+        if isinstance(port, SharedPort): # shared as the other end
+            continue
+
+        if id(port.connected_port) not in places: # out of the network: keep the pipe
+            continue
+
+        (other_module, j) = places[id(port.connected_port)]
+
+        module.ports[i] = SharedPort(port, fields)
+        other_module.ports[j] = SharedPort(port.connected_port, fields)
+
+        module.ports[i].share(other_module.ports[j], n_slots)
+
+        n_connections += 1
+
+    return n_connections
+
+def _dtype(fields):
+    """Record of a message, all float64: kind, time stamp, then each field as a
+       flag (0 when absent, else 1) and its value.
+    """
+
+    columns = [('kind', np.float64), ('time', np.float64)]
+    columns += [(name, np.float64, (2,)) for name in fields]
+
+    return np.dtype(columns)
+
+def _is_number(value):
+    """Numbers sent in records: float (and NumPy float64) and int, not bool.
+    """
+
+    return isinstance(value, (float, int)) and not isinstance(value, bool)
+
+def _unlink(memory, views, pid):
+
+    for view in views:
+        view.release()
+
+    memory.close()
+
+    if os.getpid() == pid:
+        memory.unlink()
@@ -66,7 +66,10 @@ from scipy.integrate import odeint
 import numpy as np
 
 from cortix import Module
-from cortix.support.phase_new import PhaseNew as Phase
+from history import PhaseHistory as Phase
+from history import reserve_histories
+from history import flush_histories
+from port_window import PortWindow
 from cortix import Quantity
 from cortix import Species
 from cortix import Units as unit
@@ -103,6 +106,11 @@ class Solvex(Module):
         self.show_time = (False, 10.0*unit.second)
         self.save = True
 
+        # Windowed port exchange: (on/off, time steps per message, sweeps per
+        # window); the same in all modules of the network, see `port_window`
+        self.port_window = (False, 60, 1)
+        self.port_exchange = None
+
         self.log = logging.getLogger('cortix')
         self.__logit = True # flag indicating when to log
 
@@ -450,6 +458,12 @@ class Solvex(Module):
 
         self.end_time = max(self.end_time, self.initial_time + self.time_step)
 
+        reserve_histories(self)
+
+        if self.port_window[0]:
+            self.port_exchange = PortWindow(self, self.__window_ports(), self.__step,
+                                            *self.port_window[1:])
+
         time = self.initial_time
 
         print_time = self.initial_time
@@ -471,6 +485,12 @@ class Solvex(Module):
             else:
                 self.__logit = False
 
+            if self.port_window[0]:
+                # Evolve a window of time steps and communicate its information
+                #---------------------------------------------------------------
+                time = self.port_exchange.advance(time)
+                continue
+
             # Evolve one time step
             #---------------------
 
@@ -482,6 +502,11 @@ class Solvex(Module):
 
         self.end_time = time # correct the final time if needed
 
+        flush_histories(self) # on-disk stores, if streamed
+
+        if self.port_window[0] and self.show_time[0]:
+            self.log.info(self.name+'::run(): '+str(self.port_exchange))
+
     def __call_ports(self, time):
 
         # Interactions in the uranium-inflow port
@@ -541,6 +566,21 @@ class Solvex(Module):
 
             self.send((msg_time, raffinate), 'raffinate')
 
+    def __window_ports(self):
+        """Ports of `__call_ports()`, in the same order, for the windowed
+           exchange; see `port_window.PortWindow`.
+        """
+
+        product = {'mass-flowrate': 'mass-flowrate', 'mass-density': 'mass-density'}
+
+        ports = list()
+        ports.append(('from', 'extraction-feed', dict()))
+        ports.append(('from', 'stripping-feed', dict()))
+        ports.append(('to', 'product', self.stripping_product_phase, dict(product)))
+        ports.append(('to', 'raffinate', self.extraction_raffinate_phase, dict(product)))
+
+        return ports
+
     def __step(self, time=0.0):
         """Stepping Extraction in time
         """